@@ -0,0 +1,214 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from decimal import Decimal
+
+from sqlalchemy import func, or_, select
+
+from models import db, Autor, VendaDiaria, VendaDiariaAutor, VendaMensal, VendaMensalAutor
+
+# Análises de vendas por período (receita ao longo do tempo, tendências por
+# gênero e autores mais vendidos), equivalentes a sp_dashboard_vendas e
+# sp_analise_tendencias_genero de base.sql. As consultas leem apenas os
+# agregados mantidos pelo worker de rollup.py, nunca vendas e venda_itens:
+# os meses completos do período vêm das tabelas mensais e só os dias avulsos
+# das pontas (no máximo ~60) das diárias, então o custo cresce com o número
+# de meses, não com o de vendas. A receita por dia lê só as diárias, porque
+# o próprio resultado tem uma linha por dia. Os resultados ficam em um cache
+# por processo, com chave pela consulta, período e parâmetros, e refletem as
+# vendas já agregadas pelo worker.
+
+CONSULTAS = ('receita', 'generos', 'autores')
+GRANULARIDADES = ('dia', 'mes')
+
+
+class CacheAnalises:
+    """Cache LRU com expiração (TTL) dos resultados das análises, por processo"""
+
+    def __init__(self, maximo=256, ttl=300):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            expira_em, resultado = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return resultado
+
+    def guardar(self, chave, resultado):
+        if self.maximo <= 0:
+            return
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + self.ttl, resultado)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.maximo:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+
+cache_analises = CacheAnalises()
+
+
+def _dinheiro(valor):
+    return str(Decimal(str(valor or 0)).quantize(Decimal('0.01')))
+
+
+def _proximo_mes(data):
+    return (data.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def dividir_periodo(inicio, fim):
+    """Separa o período em meses completos (primeiro, último) e os intervalos de dias avulsos nas pontas"""
+    primeiro = inicio if inicio.day == 1 else _proximo_mes(inicio)
+    depois_ultimo = _proximo_mes(fim) if (fim + timedelta(days=1)).day == 1 else fim.replace(day=1)
+    if primeiro >= depois_ultimo:
+        return [(inicio, fim)], None
+    dias = []
+    if inicio < primeiro:
+        dias.append((inicio, primeiro - timedelta(days=1)))
+    if depois_ultimo <= fim:
+        dias.append((depois_ultimo, fim))
+    return dias, (primeiro, (depois_ultimo - timedelta(days=1)).replace(day=1))
+
+
+def _fontes(diaria, mensal, colunas, inicio, fim):
+    """Consultas que cobrem o período: dias avulsos na tabela diária, meses completos na mensal"""
+    dias, meses = dividir_periodo(inicio, fim)
+    consultas = []
+    if dias:
+        consultas.append(
+            select(*colunas(diaria)).where(or_(*[diaria.data.between(de, ate) for de, ate in dias]))
+        )
+    if meses:
+        consultas.append(select(*colunas(mensal)).where(mensal.mes.between(*meses)))
+    return consultas
+
+
+def receita_por_periodo(inicio, fim, granularidade='dia'):
+    """Itens, exemplares e receita por dia ou por mês (AAAA-MM) entre inicio e fim, inclusive"""
+    def colunas(tabela):
+        data = tabela.data if tabela is VendaDiaria else tabela.mes
+        return (data, func.sum(tabela.itens), func.sum(tabela.quantidade), func.sum(tabela.receita))
+
+    if granularidade == 'dia':
+        consultas = [select(*colunas(VendaDiaria)).where(VendaDiaria.data.between(inicio, fim))]
+    else:
+        consultas = _fontes(VendaDiaria, VendaMensal, colunas, inicio, fim)
+
+    periodos = {}
+    for consulta in consultas:
+        for data, itens, quantidade, receita in db.session.execute(consulta.group_by(consulta.selected_columns[0])):
+            periodo = data.isoformat() if granularidade == 'dia' else data.strftime('%Y-%m')
+            total = periodos.setdefault(periodo, [0, 0, Decimal('0')])
+            total[0] += itens or 0
+            total[1] += quantidade or 0
+            total[2] += Decimal(str(receita or 0))
+    return [
+        {'periodo': periodo, 'itens': itens, 'quantidade': quantidade, 'receita': _dinheiro(receita)}
+        for periodo, (itens, quantidade, receita) in sorted(periodos.items())
+    ]
+
+
+def _totais_generos(inicio, fim):
+    def colunas(tabela):
+        return (func.coalesce(tabela.genero, ''), func.sum(tabela.quantidade), func.sum(tabela.receita))
+
+    totais = {}
+    for consulta in _fontes(VendaDiaria, VendaMensal, colunas, inicio, fim):
+        for genero, quantidade, receita in db.session.execute(consulta.group_by(consulta.selected_columns[0])):
+            total = totais.setdefault(genero or None, [0, Decimal('0')])
+            total[0] += int(quantidade or 0)
+            total[1] += Decimal(str(receita or 0))
+    return totais
+
+
+def tendencias_generos(inicio, fim):
+    """Exemplares e receita por gênero, com o crescimento sobre o período anterior de mesma duração"""
+    atual = _totais_generos(inicio, fim)
+    duracao = fim - inicio
+    anterior = _totais_generos(inicio - duracao - timedelta(days=1), inicio - timedelta(days=1))
+
+    ordenados = sorted(atual.items(), key=lambda item: item[1][1], reverse=True)
+    resultado = []
+    for posicao, (genero, (quantidade, receita)) in enumerate(ordenados, 1):
+        quantidade_anterior = anterior.get(genero, (0, 0))[0]
+        # Mesma regra de sp_analise_tendencias_genero: sem vendas antes, 100%
+        crescimento = (
+            (quantidade - quantidade_anterior) / quantidade_anterior * 100 if quantidade_anterior else 100
+        )
+        # Empates recebem a mesma posição, como RANK()
+        if resultado and resultado[-1]['receita'] == _dinheiro(receita):
+            ranking = resultado[-1]['ranking']
+        else:
+            ranking = posicao
+        resultado.append({
+            'genero': genero,
+            'quantidade': quantidade,
+            'receita': _dinheiro(receita),
+            'quantidade_periodo_anterior': quantidade_anterior,
+            'crescimento_percentual': round(crescimento, 2),
+            'ranking': ranking
+        })
+    return resultado
+
+
+def principais_autores(inicio, fim, limite=10):
+    """Autores com maior receita no período (cada autor recebe a receita integral dos seus livros)"""
+    def colunas(tabela):
+        return (tabela.autor_id, tabela.genero, func.sum(tabela.quantidade), func.sum(tabela.receita))
+
+    totais = {}
+    for consulta in _fontes(VendaDiariaAutor, VendaMensalAutor, colunas, inicio, fim):
+        for autor_id, genero, quantidade, receita in db.session.execute(
+            consulta.group_by(*consulta.selected_columns[:2])
+        ):
+            total = totais.setdefault(autor_id, [0, Decimal('0'), {}])
+            receita = Decimal(str(receita or 0))
+            total[0] += int(quantidade or 0)
+            total[1] += receita
+            total[2][genero or None] = total[2].get(genero or None, 0) + receita
+
+    principais = sorted(totais.items(), key=lambda item: (-item[1][1], item[0]))[:limite]
+    nomes = dict(db.session.execute(
+        select(Autor.autor_id, Autor.nome).where(Autor.autor_id.in_([autor_id for autor_id, _ in principais]))
+    ).all()) if principais else {}
+    return [
+        {
+            'autor_id': autor_id,
+            'nome': nomes.get(autor_id),
+            'quantidade': quantidade,
+            'receita': _dinheiro(receita),
+            'generos': sorted(generos, key=generos.get, reverse=True)
+        }
+        for autor_id, (quantidade, receita, generos) in principais
+    ]
+
+
+def consultar(nome, inicio, fim, **parametros):
+    """Resultado da análise `nome` para o período, do cache ou calculado"""
+    chave = (nome, inicio, fim, tuple(sorted(parametros.items())))
+    resultado = cache_analises.obter(chave)
+    if resultado is None:
+        funcao = {'receita': receita_por_periodo, 'generos': tendencias_generos, 'autores': principais_autores}[nome]
+        resultado = funcao(inicio, fim, **parametros)
+        cache_analises.guardar(chave, resultado)
+    return resultado
+
+
+def init_app(app):
+    """Configura o tamanho e o TTL do cache a partir da configuração"""
+    cache_analises.maximo = app.config['ANALISES_CACHE_MAX']
+    cache_analises.ttl = app.config['ANALISES_CACHE_TTL']
+    cache_analises.limpar()
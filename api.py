@@ -0,0 +1,262 @@
+from datetime import date, datetime
+from decimal import Decimal
+from json.encoder import encode_basestring
+
+from flask import current_app
+from sqlalchemy import select
+
+from models import db, Autor, Livro, Cliente, Venda, VendaItem, livro_autor
+from paginacao import cursor_apos, filtro_cursor, ler_cursor
+
+# API JSON somente leitura (/api/v1/<recurso>) de autores, livros, clientes e vendas.
+#
+# As consultas selecionam só as colunas pedidas (?fields=titulo,isbn; a
+# chave primária sempre vem), sem carregar objetos do ORM. Relacionamentos
+# pedidos em ?include= são lidos com uma consulta por relacionamento para a
+# página inteira (IN com os ids da página) e aninhados em cada registro;
+# ?fields[<relacionamento>]= escolhe as colunas deles. A paginação é por
+# keyset (?cursor= com o proximo_cursor da resposta anterior), na mesma
+# ordem das listagens HTML.
+#
+# Cada linha é escrita direto como texto JSON: para cada combinação de
+# colunas é montado um modelo ('{"livro_id":%s,"titulo":%s}') e um
+# conversor por coluna, escolhido pelo tipo da coluna, sem dicionário
+# intermediário nem json.dumps por linha. Numeric sai como string (como na
+# exportação em JSON Lines), para não perder precisão; datas em ISO 8601.
+# As vendas são só as não arquivadas (arquivamento.py).
+
+
+def _inteiro(valor):
+    return 'null' if valor is None else str(valor)
+
+
+def _texto(valor):
+    return 'null' if valor is None else encode_basestring(valor)
+
+
+def _data(valor):
+    return 'null' if valor is None else '"' + valor.isoformat() + '"'
+
+
+def _decimal(valor):
+    return 'null' if valor is None else '"' + str(valor) + '"'
+
+
+def _booleano(valor):
+    return 'null' if valor is None else ('true' if valor else 'false')
+
+
+CONVERSORES = {int: _inteiro, str: _texto, date: _data, datetime: _data, Decimal: _decimal, bool: _booleano}
+
+
+class Codificador:
+    """Escreve linhas (tuplas) como objetos JSON com as colunas informadas, na mesma ordem"""
+
+    def __init__(self, colunas):
+        self.colunas = colunas
+        self.modelo = '{' + ','.join(encode_basestring(coluna.key) + ':%s' for coluna in colunas)
+        self.conversores = [CONVERSORES[coluna.type.python_type] for coluna in colunas]
+
+    def __call__(self, linha, extra=''):
+        """Objeto JSON da linha; `extra` são membros já codificados acrescentados ao final"""
+        return self.modelo % tuple([
+            converter(valor) for converter, valor in zip(self.conversores, linha)
+        ]) + extra + '}'
+
+
+class Inclusao:
+    """Relacionamento que pode ser incluído (?include=) nos registros de um recurso.
+
+    `consulta(colunas, ids)` retorna um SELECT cuja primeira coluna é o id
+    do registro de origem (valor de `origem`), seguida das colunas pedidas.
+    """
+
+    def __init__(self, campos, consulta, origem=None, unica=False):
+        self.campos = {coluna.key: coluna for coluna in campos}
+        self.consulta = consulta
+        self.origem = origem
+        self.unica = unica  # Um objeto (ou null) em vez de lista
+
+
+class Recurso:
+    def __init__(self, campos, chave, descendente=False, inclusoes=None):
+        self.campos = {coluna.key: coluna for coluna in campos}
+        self.id = campos[0]
+        self.chave = chave  # Ordem da paginação keyset
+        self.descendente = descendente
+        self.inclusoes = inclusoes or {}
+
+
+def _livros_dos_autores(colunas, ids):
+    return (
+        select(livro_autor.c.autor_id, *colunas)
+        .join(Livro, Livro.livro_id == livro_autor.c.livro_id)
+        .where(livro_autor.c.autor_id.in_(ids))
+        .order_by(livro_autor.c.autor_id, Livro.livro_id)
+    )
+
+
+def _autores_dos_livros(colunas, ids):
+    return (
+        select(livro_autor.c.livro_id, *colunas)
+        .join(Autor, Autor.autor_id == livro_autor.c.autor_id)
+        .where(livro_autor.c.livro_id.in_(ids))
+        .order_by(livro_autor.c.livro_id, Autor.autor_id)
+    )
+
+
+def _itens_das_vendas(colunas, ids):
+    return (
+        select(VendaItem.venda_id, *colunas)
+        .where(VendaItem.venda_id.in_(ids))
+        .order_by(VendaItem.venda_id, VendaItem.item_id)
+    )
+
+
+def _clientes_das_vendas(colunas, ids):
+    return select(Cliente.cliente_id, *colunas).where(Cliente.cliente_id.in_(ids))
+
+
+CAMPOS_AUTOR = (Autor.autor_id, Autor.nome, Autor.data_nascimento, Autor.nacionalidade)
+CAMPOS_LIVRO = (Livro.livro_id, Livro.titulo, Livro.isbn, Livro.data_publicacao, Livro.genero)
+CAMPOS_CLIENTE = (Cliente.cliente_id, Cliente.nome, Cliente.email, Cliente.data_cadastro)
+CAMPOS_ITEM = (VendaItem.item_id, VendaItem.livro_id, VendaItem.quantidade, VendaItem.preco_unitario)
+
+RECURSOS = {
+    'autores': Recurso(CAMPOS_AUTOR, (Autor.autor_id,), inclusoes={
+        'livros': Inclusao(CAMPOS_LIVRO, _livros_dos_autores),
+    }),
+    'livros': Recurso(CAMPOS_LIVRO, (Livro.livro_id,), inclusoes={
+        'autores': Inclusao(CAMPOS_AUTOR, _autores_dos_livros),
+    }),
+    'clientes': Recurso(CAMPOS_CLIENTE, (Cliente.cliente_id,)),
+    # Mais recentes primeiro, pelo índice (data_venda, venda_id)
+    'vendas': Recurso(
+        (Venda.venda_id, Venda.cliente_id, Venda.data_venda, Venda.valor_total),
+        (Venda.data_venda, Venda.venda_id), descendente=True,
+        inclusoes={
+            'itens': Inclusao(CAMPOS_ITEM, _itens_das_vendas),
+            'cliente': Inclusao(CAMPOS_CLIENTE, _clientes_das_vendas, origem=Venda.cliente_id, unica=True),
+        }
+    ),
+}
+
+
+# Inclusões possíveis em uma mesma requisição (uma consulta cada), para o orçamento de SQL das rotas
+MAX_INCLUSOES = max(len(recurso.inclusoes) for recurso in RECURSOS.values())
+
+
+def _escolher(disponiveis, pedidos, obrigatoria):
+    """Colunas pedidas (nomes separados por vírgula), com a chave primária sempre primeiro"""
+    if not pedidos:
+        return list(disponiveis.values())
+    nomes = [nome.strip() for nome in pedidos.split(',') if nome.strip()]
+    invalidos = [nome for nome in nomes if nome not in disponiveis]
+    if invalidos:
+        raise ValueError(f"Campos inválidos: {', '.join(invalidos)}; disponíveis: {', '.join(disponiveis)}")
+    colunas = [obrigatoria]
+    colunas += [disponiveis[nome] for nome in dict.fromkeys(nomes) if disponiveis[nome] is not obrigatoria]
+    return colunas
+
+
+def _preparar(recurso, campos, incluir, campos_inclusoes):
+    """(colunas, codificador, [(nome, inclusão, codificador)]) validados a partir dos parâmetros"""
+    colunas = _escolher(recurso.campos, campos, recurso.id)
+    nomes = [nome.strip() for nome in (incluir or '').split(',') if nome.strip()]
+    invalidos = [nome for nome in nomes if nome not in recurso.inclusoes]
+    if invalidos:
+        raise ValueError(f"Inclusões inválidas: {', '.join(invalidos)}; "
+                         f"disponíveis: {', '.join(recurso.inclusoes) or 'nenhuma'}")
+    desconhecidos = set(campos_inclusoes) - set(nomes)
+    if desconhecidos:
+        raise ValueError(f"fields[{', '.join(sorted(desconhecidos))}] sem o include correspondente")
+    inclusoes = []
+    for nome in dict.fromkeys(nomes):
+        inclusao = recurso.inclusoes[nome]
+        primeira = next(iter(inclusao.campos.values()))
+        inclusoes.append((nome, inclusao, Codificador(_escolher(inclusao.campos, campos_inclusoes.get(nome), primeira))))
+    return colunas, Codificador(colunas), inclusoes
+
+
+def _incluidos(linhas, posicao, inclusao, codificador):
+    """{id de origem: JSON já codificado} dos relacionamentos das linhas, em uma consulta"""
+    ids = {linha[posicao] for linha in linhas if linha[posicao] is not None}
+    if not ids:
+        return {}
+    por_origem = {}
+    for linha in db.session.execute(inclusao.consulta(codificador.colunas, ids)):
+        por_origem.setdefault(linha[0], []).append(codificador(linha[1:]))
+    if inclusao.unica:
+        return {origem: objetos[0] for origem, objetos in por_origem.items()}
+    return {origem: '[' + ','.join(objetos) + ']' for origem, objetos in por_origem.items()}
+
+
+def _codificar(linhas, colunas, codificador, inclusoes):
+    """Objetos JSON das linhas, com os relacionamentos incluídos aninhados"""
+    if not inclusoes:
+        return [codificador(linha) for linha in linhas]
+    membros = []
+    for nome, inclusao, codificador_inclusao in inclusoes:
+        origem = inclusao.origem if inclusao.origem is not None else colunas[0]
+        posicao = next(i for i, coluna in enumerate(colunas) if coluna is origem)
+        vazio = 'null' if inclusao.unica else '[]'
+        membros.append((encode_basestring(nome), posicao, vazio,
+                        _incluidos(linhas, posicao, inclusao, codificador_inclusao)))
+    return [
+        codificador(linha, ''.join(
+            ',' + chave + ':' + incluidos.get(linha[posicao], vazio)
+            for chave, posicao, vazio, incluidos in membros
+        ))
+        for linha in linhas
+    ]
+
+
+def _selecionadas(colunas, extras):
+    """Colunas do SELECT: as pedidas e, depois delas, as extras que ainda não estão entre elas"""
+    selecionadas = list(colunas)
+    for coluna in extras:
+        if coluna is not None and not any(coluna is existente for existente in selecionadas):
+            selecionadas.append(coluna)
+    return selecionadas
+
+
+def listar(nome, campos=None, incluir=None, campos_inclusoes=None, por_pagina=None, cursor=None):
+    """Página do recurso em JSON (texto): {"dados": [...], "proximo_cursor": ...}.
+
+    Levanta ValueError para parâmetros inválidos.
+    """
+    recurso = RECURSOS[nome]
+    colunas, codificador, inclusoes = _preparar(recurso, campos, incluir, campos_inclusoes or {})
+    config = current_app.config
+    por_pagina = max(1, min(por_pagina or config['API_POR_PAGINA'], config['PAGINACAO_MAX_POR_PAGINA']))
+
+    # Chave da paginação e origens das inclusões, mesmo fora do fieldset
+    selecionadas = _selecionadas(colunas, [*recurso.chave, *(inclusao.origem for _, inclusao, _ in inclusoes)])
+
+    ordem = [coluna.desc() if recurso.descendente else coluna.asc() for coluna in recurso.chave]
+    consulta = select(*selecionadas).order_by(*ordem).limit(por_pagina + 1)
+    if cursor:
+        lido = ler_cursor(cursor)
+        if lido is None:
+            raise ValueError('Cursor inválido')
+        consulta = consulta.where(filtro_cursor(lido, recurso.chave, recurso.descendente))
+
+    linhas = db.session.execute(consulta).all()
+    proximo = None
+    if len(linhas) > por_pagina:
+        linhas = linhas[:por_pagina]
+        proximo = cursor_apos(linhas[-1], recurso.chave)
+
+    objetos = _codificar(linhas, selecionadas, codificador, inclusoes)
+    return '{"dados":[' + ','.join(objetos) + '],"proximo_cursor":' + _texto(proximo) + '}'
+
+
+def obter(nome, id, campos=None, incluir=None, campos_inclusoes=None):
+    """Registro do recurso em JSON (texto): {"dados": {...}}; None se não existir"""
+    recurso = RECURSOS[nome]
+    colunas, codificador, inclusoes = _preparar(recurso, campos, incluir, campos_inclusoes or {})
+    selecionadas = _selecionadas(colunas, [inclusao.origem for _, inclusao, _ in inclusoes])
+    linha = db.session.execute(select(*selecionadas).where(recurso.id == id)).first()
+    if linha is None:
+        return None
+    return '{"dados":' + _codificar([linha], selecionadas, codificador, inclusoes)[0] + '}'
@@ -1,79 +1,141 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
-from datetime import datetime, date
+from flask import Blueprint, Flask, current_app, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context, abort
+from datetime import datetime, date, timedelta
 from decimal import Decimal
 from models import db, Usuario, Autor, Livro, Cliente, Venda, VendaItem, livro_autor
 from config import Config
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_wtf.csrf import CSRFProtect
+from sqlalchemy.orm import joinedload, selectinload
+from monitoramento import limite_consultas
+from roteamento import somente_leitura, metricas_pool
+from paginacao import paginar
+from estatisticas import obter_estatisticas, ajustar_estatisticas
+from identidades import carregar_identidade
+from senhas import SenhasOcupadas
+from importacao_vendas import importar_vendas, ler_csv, ler_jsonl
+from catalogo import resolver_autores, sincronizar_autores, importar_catalogo
+from sugestoes import sugerir_autores, sugerir_clientes, sugerir_livros
+from busca import buscar_livros
+from estoque import conferir_estoque, reservar_estoque, EstoqueInsuficiente
+from cache_http import condicional, fragmento
+from recomendacoes import recomendar_livros
+from exportacao import exportar, codificar, EXPORTACOES, FORMATOS
+from exclusao import excluir, EXCLUSOES
+from arquivamento import arquivar_vendas
+import analises
+import api
+import busca
+import cache_http
+import recomendacoes
+import identidades
+import monitoramento
+import log_requisicoes
+import particionamento
+import perfilamento
+import roteamento
+import rollup
+import limites_compartilhados  # Registra o esquema mmap:// no Flask-Limiter
+import io
 import os
+import click
 
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
-app = Flask(__name__)
-app.config.from_object(Config)
+# Extensões sem aplicação; ligadas a ela em create_app()
 csrf = CSRFProtect()
-csrf.init_app(app)
-
-# ✅ CORREÇÃO DO LIMITER - Opção 1 (Recomendada)
-limiter = Limiter(app=app, key_func=get_remote_address)
-
-db.init_app(app)
+limiter = Limiter(key_func=get_remote_address)
 
 # Configuração do Flask-Login
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+login_manager.login_view = 'editora.login'
 login_manager.login_message = 'Por favor, faça login para acessar esta página.'
 login_manager.login_message_category = 'info'
 
+# Rotas, comandos e manipuladores de erro (comandos direto em `flask <comando>`)
+bp = Blueprint('editora', __name__, cli_group=None)
+
+
+def create_app(config=Config):
+    """Cria a aplicação (usada pelo `flask` e pelo wsgi.py).
+
+    Não acessa o banco: tabelas e usuários iniciais são criados pelos
+    comandos `flask criar-tabelas` e `flask criar-usuarios-iniciais`.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config)
+    
+    # Contadores compartilhados entre os workers em um arquivo mapeado em memória
+    if not app.config.get('RATELIMIT_STORAGE_URI'):
+        app.config['RATELIMIT_STORAGE_URI'] = 'mmap://' + os.path.join(app.instance_path, 'limites.mmap')
+    csrf.init_app(app)
+    limiter.init_app(app)
+    
+    roteamento.configurar_engines(app)
+    db.init_app(app)
+    roteamento.init_app(app)
+    monitoramento.init_app(app)
+    identidades.init_app(app)
+    log_requisicoes.init_app(app)
+    perfilamento.init_app(app)
+    busca.init_app(app)
+    recomendacoes.init_app(app)
+    rollup.init_app(app)
+    analises.init_app(app)
+    cache_http.init_app(app)
+    login_manager.init_app(app)
+    
+    app.register_blueprint(bp)
+    return app
+
 @login_manager.user_loader
 def load_user(user_id):
-    return Usuario.query.get(int(user_id))
+    return carregar_identidade(int(user_id))
 
 def criar_usuarios_iniciais():
-    with app.app_context():
-        if Usuario.query.count() == 0:
-            try:
-                # Criar usuário admin
-                admin = Usuario(
-                    username='admin',
-                    email='admin@editora.com',
-                    is_admin=True
-                )
-                admin.set_password('admin123')
-                db.session.add(admin)
-                
-                # Criar usuário regular
-                usuario = Usuario(
-                    username='usuario',
-                    email='usuario@editora.com', 
-                    is_admin=False
-                )
-                usuario.set_password('senha123')
-                db.session.add(usuario)
-                
-                db.session.commit()
-                print("Usuários iniciais criados:")
-                print("Admin: admin / admin123")
-                print("Usuário: usuario / senha123")
-                
-            except Exception as e:
-                db.session.rollback()
-                print(f"Erro ao criar usuários: {e}")
-
-with app.app_context():
-    db.create_all()
-    criar_usuarios_iniciais()
+    """Cria o admin e um usuário comum se não houver usuários (requer contexto da aplicação)"""
+    if Usuario.query.count() == 0:
+        try:
+            # Criar usuário admin
+            admin = Usuario(
+                username='admin',
+                email='admin@editora.com',
+                is_admin=True
+            )
+            admin.set_password('admin123')
+            db.session.add(admin)
+            
+            # Criar usuário regular
+            usuario = Usuario(
+                username='usuario',
+                email='usuario@editora.com', 
+                is_admin=False
+            )
+            usuario.set_password('senha123')
+            db.session.add(usuario)
+            
+            db.session.commit()
+            print("Usuários iniciais criados:")
+            print("Admin: admin / admin123")
+            print("Usuário: usuario / senha123")
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"Erro ao criar usuários: {e}")
 
 # ===== ROTAS DE AUTENTICAÇÃO =====
+def servidor_ocupado(template):
+    """Resposta 503 quando o pool de senhas está saturado"""
+    flash('Servidor ocupado no momento. Tente novamente em alguns segundos.', 'error')
+    return render_template(template), 503, {'Retry-After': '2'}
 
-@app.route('/login', methods=['GET', 'POST'])
+
+@bp.route('/login', methods=['GET', 'POST'])
 @limiter.limit("5 per minute")  # Máximo 5 tentativas por minuto
 def login():
     """Página de login"""
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('editora.index'))
     
     if request.method == 'POST':
         username = request.form.get('username')
@@ -82,30 +144,39 @@ def login():
         
         usuario = Usuario.query.filter_by(username=username).first()
         
-        if usuario and usuario.check_password(password):
+        try:
+            senha_correta = usuario is not None and usuario.check_password(password)
+            # Parâmetros de hash alterados em SENHA_METODO: regrava com a senha já validada
+            if senha_correta and usuario.password_needs_rehash():
+                usuario.set_password(password)
+                db.session.commit()
+        except SenhasOcupadas:
+            return servidor_ocupado('login.html')
+        
+        if senha_correta:
             login_user(usuario, remember=remember)
             flash(f'Bem-vindo, {usuario.username}!', 'success')
-            return redirect(url_for('index'))
+            return redirect(url_for('editora.index'))
         else:
             flash('Usuário ou senha incorretos', 'error')
     
     return render_template('login.html')
 
-@app.route('/logout', methods=['POST'])
+@bp.route('/logout', methods=['POST'])
 @login_required
 def logout():
     """Logout do usuário"""
     username = current_user.username
     logout_user()
     flash(f'Até logo, {username}! Você foi desconectado com sucesso.', 'info')
-    return redirect(url_for('login'))
+    return redirect(url_for('editora.login'))
 
-@app.route('/registro', methods=['GET', 'POST'])
+@bp.route('/registro', methods=['GET', 'POST'])
 @limiter.limit("3 per minute")  # Adicionei rate limiting aqui também
 def registro():
     """Página de registro de novos usuários"""
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('editora.index'))
     
     if request.method == 'POST':
         username = request.form.get('username')
@@ -116,19 +187,19 @@ def registro():
         # Validações
         if not username or not email or not password:
             flash('Todos os campos são obrigatórios', 'error')
-            return redirect(url_for('registro'))
+            return redirect(url_for('editora.registro'))
         
         if password != confirm_password:
             flash('As senhas não coincidem', 'error')
-            return redirect(url_for('registro'))
+            return redirect(url_for('editora.registro'))
         
         if Usuario.query.filter_by(username=username).first():
             flash('Nome de usuário já existe', 'error')
-            return redirect(url_for('registro'))
+            return redirect(url_for('editora.registro'))
         
         if Usuario.query.filter_by(email=email).first():
             flash('Email já cadastrado', 'error')
-            return redirect(url_for('registro'))
+            return redirect(url_for('editora.registro'))
         
         # Criar novo usuário
         novo_usuario = Usuario(
@@ -136,18 +207,21 @@ def registro():
             email=email,
             is_admin=False
         )
-        novo_usuario.set_password(password)
+        try:
+            novo_usuario.set_password(password)
+        except SenhasOcupadas:
+            return servidor_ocupado('registro.html')
         
         db.session.add(novo_usuario)
         db.session.commit()
         
         flash('Conta criada com sucesso! Faça login para continuar.', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('editora.login'))
     
     return render_template('registro.html')
 
 # ===== ROTA DE TESTE DO LIMITER =====
-@app.route('/teste-limite')
+@bp.route('/teste-limite')
 @limiter.limit("3 per minute")
 def teste_limite():
     """Rota para testar se o rate limiting está funcionando"""
@@ -158,51 +232,49 @@ def teste_limite():
         "tentativas_restantes": "3 por minuto"
     })
 
-# ===== MIDDLEWARE PARA DEBUG =====
-@app.after_request
-def after_request(response):
-    """Middleware para debug do limiter"""
-    if response.status_code == 429:
-        print(f"🚫 RATE LIMIT ATINGIDO! IP: {request.remote_addr}")
-        print(f"📊 Path: {request.path}")
-    
-    # Log básico de todas as requisições
-    print(f"📨 {request.method} {request.path} - {response.status_code} - IP: {request.remote_addr}")
-    
-    return response
 # ===== ROTAS PROTEGIDAS =====
-@app.route('/')
+@bp.route('/')
 @login_required
+@somente_leitura
+@limite_consultas(2)
 def index():
     """Página inicial com estatísticas"""
-    total_autores = Autor.query.count()
-    total_livros = Livro.query.count()
-    total_clientes = Cliente.query.count()
-    total_vendas = db.session.query(db.func.sum(Venda.valor_total)).scalar() or 0
+    estatisticas = obter_estatisticas()
     
     return render_template('index.html',
-        total_autores=total_autores,
-        total_livros=total_livros,
-        total_clientes=total_clientes,
-        total_vendas=total_vendas
+        total_autores=estatisticas['total_autores'],
+        total_livros=estatisticas['total_livros'],
+        total_clientes=estatisticas['total_clientes'],
+        total_vendas=estatisticas['total_vendas']
     )
 
 # ===== ROTAS AUTORES =====
-@app.route('/autores')
+@bp.route('/autores')
 @login_required
+@somente_leitura
+@limite_consultas(4)
+@condicional('autores')
 def listar_autores():
     """Lista todos os autores com paginação"""
     pagina = request.args.get('pagina', 1, type=int)
     por_pagina = request.args.get('por_pagina', 10, type=int)
+    cursor = request.args.get('cursor')
     
-    autores = Autor.query.paginate(
-        page=pagina, 
-        per_page=por_pagina, 
-        error_out=False
-    )
-    return render_template('autores.html', autores=autores)
+    tabela = fragmento('fragmentos/autores.html', (pagina, por_pagina, cursor), lambda: {
+        'autores': paginar(Autor.query, (Autor.autor_id,), pagina, por_pagina, cursor)
+    })
+    return render_template('autores.html', tabela=tabela)
 
-@app.route('/autores/novo', methods=['GET', 'POST'])
+@bp.route('/autores/sugestoes')
+@login_required
+@limite_consultas(3)
+def sugestoes_autores():
+    """Sugestões de autores por nome para os campos de autocompletar (JSON)"""
+    termo = request.args.get('q', '')
+    limite = request.args.get('limite', 10, type=int)
+    return jsonify(sugerir_autores(termo, limite))
+
+@bp.route('/autores/novo', methods=['GET', 'POST'])
 @login_required
 def novo_autor():
     """Criar novo autor"""
@@ -213,7 +285,7 @@ def novo_autor():
         
         if not nome:
             flash('Nome é obrigatório', 'error')
-            return redirect(url_for('novo_autor'))
+            return redirect(url_for('editora.novo_autor'))
         
         autor = Autor(
             nome=nome,
@@ -222,13 +294,15 @@ def novo_autor():
         )
         db.session.add(autor)
         db.session.commit()
+        ajustar_estatisticas(total_autores=1)
         flash(f'Autor {nome} criado com sucesso!', 'success')
-        return redirect(url_for('listar_autores'))
+        return redirect(url_for('editora.listar_autores'))
     
     return render_template('novo_autor.html')
 
-@app.route('/autores/<int:id>/editar', methods=['GET', 'POST'])
+@bp.route('/autores/<int:id>/editar', methods=['GET', 'POST'])
 @login_required
+@condicional('autores')
 def editar_autor(id):
     """Editar autor existente"""
     autor = Autor.query.get_or_404(id)
@@ -240,36 +314,63 @@ def editar_autor(id):
         
         db.session.commit()
         flash('Autor atualizado com sucesso!', 'success')
-        return redirect(url_for('listar_autores'))
+        return redirect(url_for('editora.listar_autores'))
     
     return render_template('editar_autor.html', autor=autor)
 
-@app.route('/autores/<int:id>/deletar', methods=['POST'])
+@bp.route('/autores/<int:id>/deletar', methods=['POST'])
 @login_required
 def deletar_autor(id):
     """Deletar autor"""
-    autor = Autor.query.get_or_404(id)
-    db.session.delete(autor)
-    db.session.commit()
-    flash('Autor deletado com sucesso!', 'success')
-    return redirect(url_for('listar_autores'))
+    return excluir_um('autores', id, 'Autor deletado com sucesso!', 'editora.listar_autores')
 
 # ===== ROTAS LIVROS =====
-@app.route('/livros')
+@bp.route('/livros')
 @login_required
+@somente_leitura
+@limite_consultas(4)
+@condicional('livros')
 def listar_livros():
     """Lista todos os livros com paginação"""
     pagina = request.args.get('pagina', 1, type=int)
     por_pagina = request.args.get('por_pagina', 10, type=int)
+    cursor = request.args.get('cursor')
     
-    livros = Livro.query.paginate(
-        page=pagina, 
-        per_page=por_pagina, 
-        error_out=False
-    )
-    return render_template('livros.html', livros=livros)
+    tabela = fragmento('fragmentos/livros.html', (pagina, por_pagina, cursor), lambda: {
+        'livros': paginar(Livro.query, (Livro.livro_id,), pagina, por_pagina, cursor)
+    })
+    return render_template('livros.html', tabela=tabela)
+
+@bp.route('/livros/sugestoes')
+@login_required
+@limite_consultas(4)
+def sugestoes_livros():
+    """Sugestões de livros por título ou ISBN para os campos de autocompletar (JSON)"""
+    termo = request.args.get('q', '')
+    limite = request.args.get('limite', 10, type=int)
+    return jsonify(sugerir_livros(termo, limite))
 
-@app.route('/livros/novo', methods=['GET', 'POST'])
+@bp.route('/livros/busca')
+@login_required
+@limite_consultas(5)
+def buscar_livros_catalogo():
+    """Busca livros por título, gênero, ISBN ou autor, ordenados por relevância"""
+    termo = request.args.get('q', '').strip()
+    
+    livros = []
+    if termo:
+        resultados = buscar_livros(termo)
+        ids = [livro_id for livro_id, _ in resultados]
+        if ids:
+            por_id = {
+                livro.livro_id: livro
+                for livro in Livro.query.options(selectinload(Livro.autores)).filter(Livro.livro_id.in_(ids))
+            }
+            livros = [por_id[livro_id] for livro_id in ids if livro_id in por_id]
+    
+    return render_template('busca_livros.html', termo=termo, livros=livros)
+
+@bp.route('/livros/novo', methods=['GET', 'POST'])
 @login_required
 def novo_livro():
     """Criar novo livro"""
@@ -283,7 +384,7 @@ def novo_livro():
             
             if not titulo or not isbn:
                 flash('Título e ISBN são obrigatórios', 'error')
-                return redirect(url_for('novo_livro'))
+                return redirect(url_for('editora.novo_livro'))
             
             # Tratamento para data vazia
             data_publicacao_obj = None
@@ -292,7 +393,7 @@ def novo_livro():
                     data_publicacao_obj = datetime.strptime(data_publicacao, '%Y-%m-%d').date()
                 except ValueError:
                     flash('Formato de data inválido', 'error')
-                    return redirect(url_for('novo_livro'))
+                    return redirect(url_for('editora.novo_livro'))
             
             livro = Livro(
                 titulo=titulo,
@@ -301,26 +402,27 @@ def novo_livro():
                 genero=genero
             )
             
-            for autor_id in autores_ids:
-                autor = Autor.query.get(autor_id)
-                if autor:
-                    livro.autores.append(autor)
+            # Autores resolvidos com uma única consulta
+            ids = {int(autor_id) for autor_id in autores_ids if autor_id.isdigit()}
+            if ids:
+                livro.autores = Autor.query.filter(Autor.autor_id.in_(ids)).all()
             
             db.session.add(livro)
             db.session.commit()
+            ajustar_estatisticas(total_livros=1)
             flash(f'Livro {titulo} criado com sucesso!', 'success')
-            return redirect(url_for('listar_livros'))
+            return redirect(url_for('editora.listar_livros'))
         
-        autores = Autor.query.all()
-        return render_template('novo_livro.html', autores=autores)
+        return render_template('novo_livro.html')
     
     except Exception as e:
         print(f"Erro: {e}")
         flash(f'Erro ao processar a requisição: {str(e)}', 'error')
-        return redirect(url_for('listar_livros'))
+        return redirect(url_for('editora.listar_livros'))
 
-@app.route('/livros/<int:id>/editar', methods=['GET', 'POST'])
+@bp.route('/livros/<int:id>/editar', methods=['GET', 'POST'])
 @login_required
+@condicional('livros', 'livro_autor', 'autores')
 def editar_livro(id):
     """Editar livro existente"""
     livro = Livro.query.get_or_404(id)
@@ -331,46 +433,61 @@ def editar_livro(id):
         livro.data_publicacao = datetime.strptime(data_publicacao, '%Y-%m-%d').date() if data_publicacao else None
         livro.genero = request.form.get('genero')
         
-        livro.autores.clear()
+        # Aplica só a diferença nos vínculos livro_autor
         autores_ids = request.form.getlist('autores')
-        for autor_id in autores_ids:
-            autor = Autor.query.get(autor_id)
-            if autor:
-                livro.autores.append(autor)
+        sincronizar_autores(livro.livro_id, resolver_autores(autores_ids))
+        db.session.expire(livro, ['autores'])
         
         db.session.commit()
         flash('Livro atualizado com sucesso!', 'success')
-        return redirect(url_for('listar_livros'))
+        return redirect(url_for('editora.listar_livros'))
     
-    autores = Autor.query.all()
-    return render_template('editar_livro.html', livro=livro, autores=autores)
+    return render_template('editar_livro.html', livro=livro)
 
-@app.route('/livros/<int:id>/deletar', methods=['POST'])
+@bp.route('/livros/<int:id>/deletar', methods=['POST'])
 @login_required
 def deletar_livro(id):
     """Deletar livro"""
-    livro = Livro.query.get_or_404(id)
-    db.session.delete(livro)
-    db.session.commit()
-    flash('Livro deletado com sucesso!', 'success')
-    return redirect(url_for('listar_livros'))
+    return excluir_um('livros', id, 'Livro deletado com sucesso!', 'editora.listar_livros')
 
 # ===== ROTAS CLIENTES =====
-@app.route('/clientes')
+@bp.route('/clientes')
 @login_required
+@somente_leitura
+@limite_consultas(4)
+@condicional('clientes')
 def listar_clientes():
     """Lista todos os clientes com paginação"""
     pagina = request.args.get('pagina', 1, type=int)
     por_pagina = request.args.get('por_pagina', 10, type=int)
+    cursor = request.args.get('cursor')
     
-    clientes = Cliente.query.paginate(
-        page=pagina, 
-        per_page=por_pagina, 
-        error_out=False
-    )
-    return render_template('clientes.html', clientes=clientes)
+    tabela = fragmento('fragmentos/clientes.html', (pagina, por_pagina, cursor), lambda: {
+        'clientes': paginar(Cliente.query, (Cliente.cliente_id,), pagina, por_pagina, cursor)
+    })
+    return render_template('clientes.html', tabela=tabela)
 
-@app.route('/clientes/novo', methods=['GET', 'POST'])
+@bp.route('/clientes/sugestoes')
+@login_required
+@limite_consultas(3)
+def sugestoes_clientes():
+    """Sugestões de clientes por nome para os campos de autocompletar (JSON)"""
+    termo = request.args.get('q', '')
+    limite = request.args.get('limite', 10, type=int)
+    return jsonify(sugerir_clientes(termo, limite))
+
+@bp.route('/clientes/<int:id>/recomendacoes')
+@login_required
+def recomendacoes_cliente(id):
+    """Livros recomendados para o cliente (JSON)"""
+    cliente = Cliente.query.get_or_404(id)
+    k = request.args.get('k', 10, type=int)
+    return jsonify({
+        'cliente_id': cliente.cliente_id,
+        'recomendacoes': recomendar_livros(cliente.cliente_id, k)
+    })
+
+@bp.route('/clientes/novo', methods=['GET', 'POST'])
 @login_required
 def novo_cliente():
     """Criar novo cliente"""
@@ -380,18 +497,20 @@ def novo_cliente():
         
         if not nome or not email:
             flash('Nome e email são obrigatórios', 'error')
-            return redirect(url_for('novo_cliente'))
+            return redirect(url_for('editora.novo_cliente'))
         
         cliente = Cliente(nome=nome, email=email)
         db.session.add(cliente)
         db.session.commit()
+        ajustar_estatisticas(total_clientes=1)
         flash(f'Cliente {nome} criado com sucesso!', 'success')
-        return redirect(url_for('listar_clientes'))
+        return redirect(url_for('editora.listar_clientes'))
     
     return render_template('novo_cliente.html')
 
-@app.route('/clientes/<int:id>/editar', methods=['GET', 'POST'])
+@bp.route('/clientes/<int:id>/editar', methods=['GET', 'POST'])
 @login_required
+@condicional('clientes')
 def editar_cliente(id):
     """Editar cliente existente"""
     cliente = Cliente.query.get_or_404(id)
@@ -401,36 +520,55 @@ def editar_cliente(id):
         
         db.session.commit()
         flash('Cliente atualizado com sucesso!', 'success')
-        return redirect(url_for('listar_clientes'))
+        return redirect(url_for('editora.listar_clientes'))
     
     return render_template('editar_cliente.html', cliente=cliente)
 
-@app.route('/clientes/<int:id>/deletar', methods=['POST'])
+@bp.route('/clientes/<int:id>/deletar', methods=['POST'])
 @login_required
 def deletar_cliente(id):
     """Deletar cliente"""
-    cliente = Cliente.query.get_or_404(id)
-    db.session.delete(cliente)
-    db.session.commit()
-    flash('Cliente deletado com sucesso!', 'success')
-    return redirect(url_for('listar_clientes'))
+    return excluir_um('clientes', id, 'Cliente deletado com sucesso!', 'editora.listar_clientes')
 
 # ===== ROTAS VENDAS =====
-@app.route('/vendas')
+@bp.route('/vendas')
 @login_required
+@somente_leitura
+@limite_consultas(5)
+@condicional('vendas', 'clientes', 'venda_itens')
 def listar_vendas():
     """Lista todas as vendas com paginação"""
     pagina = request.args.get('pagina', 1, type=int)
     por_pagina = request.args.get('por_pagina', 10, type=int)
+    cursor = request.args.get('cursor')
     
-    vendas = Venda.query.paginate(
-        page=pagina, 
-        per_page=por_pagina, 
-        error_out=False
+    tabela = fragmento('fragmentos/vendas.html', (pagina, por_pagina, cursor),
+                       lambda: pagina_vendas(pagina, por_pagina, cursor))
+    return render_template('vendas.html', tabela=tabela)
+
+def pagina_vendas(pagina, por_pagina, cursor):
+    """Página de vendas e a quantidade de itens de cada uma, para o fragmento da listagem"""
+    # Mais recentes primeiro; cliente carregado no mesmo SELECT da página (evita N+1 no template)
+    vendas = paginar(
+        Venda.query.options(joinedload(Venda.cliente)),
+        (Venda.data_venda, Venda.venda_id),
+        pagina, por_pagina, cursor,
+        descendente=True
     )
-    return render_template('vendas.html', vendas=vendas)
+    
+    # Quantidade de itens por venda em uma única consulta agregada
+    itens_por_venda = {}
+    venda_ids = [venda.venda_id for venda in vendas.items]
+    if venda_ids:
+        itens_por_venda = dict(
+            db.session.query(VendaItem.venda_id, db.func.count(VendaItem.item_id))
+            .filter(VendaItem.venda_id.in_(venda_ids))
+            .group_by(VendaItem.venda_id)
+            .all()
+        )
+    return {'vendas': vendas, 'itens_por_venda': itens_por_venda}
 
-@app.route('/vendas/nova', methods=['GET', 'POST'])
+@bp.route('/vendas/nova', methods=['GET', 'POST'])
 @login_required
 def nova_venda():
     """Criar nova venda"""
@@ -440,7 +578,7 @@ def nova_venda():
         
         if not cliente_id or not data_venda:
             flash('Cliente e data são obrigatórios', 'error')
-            return redirect(url_for('nova_venda'))
+            return redirect(url_for('editora.nova_venda'))
         
         venda = Venda(
             cliente_id=cliente_id,
@@ -451,7 +589,23 @@ def nova_venda():
         quantidades = request.form.getlist('quantidade')
         precos = request.form.getlist('preco')
         
+        # Confere todos os livros informados com uma única consulta
+        ids_informados = {livro_id for livro_id in livro_ids if livro_id}
+        ids_numericos = {int(livro_id) for livro_id in ids_informados if livro_id.isdigit()}
+        ids_encontrados = set(db.session.scalars(
+            db.select(Livro.livro_id).where(Livro.livro_id.in_(ids_numericos))
+        )) if ids_numericos else set()
+        if len(ids_encontrados) != len(ids_informados):
+            flash('Livro inválido na venda', 'error')
+            return redirect(url_for('editora.nova_venda'))
+        
+        # Quantidade negativa devolveria exemplares ao estoque
+        if any(quantidade and not (quantidade.isdigit() and int(quantidade) > 0) for quantidade in quantidades):
+            flash('Quantidade deve ser um número positivo', 'error')
+            return redirect(url_for('editora.nova_venda'))
+        
         valor_total = Decimal('0')
+        exemplares = {}
         for livro_id, quantidade, preco in zip(livro_ids, quantidades, precos):
             if livro_id and quantidade and preco:
                 item = VendaItem(
@@ -461,62 +615,404 @@ def nova_venda():
                 )
                 venda.itens.append(item)
                 valor_total += Decimal(quantidade) * Decimal(preco)
+                exemplares[int(livro_id)] = exemplares.get(int(livro_id), 0) + int(quantidade)
         
         venda.valor_total = valor_total
-        db.session.add(venda)
+        try:
+            conferir_estoque(exemplares)
+            db.session.add(venda)
+            # Último passo antes do commit: as linhas de estoque ficam travadas o mínimo possível
+            reservar_estoque(exemplares)
+        except EstoqueInsuficiente as e:
+            db.session.rollback()
+            titulos = dict(db.session.execute(
+                db.select(Livro.livro_id, Livro.titulo).where(Livro.livro_id.in_(e.faltas))
+            ).all())
+            for livro_id, (pedido, disponivel) in sorted(e.faltas.items()):
+                flash(f'Estoque insuficiente para "{titulos.get(livro_id, livro_id)}": '
+                      f'pedido {pedido}, disponível {disponivel}', 'error')
+            return render_template('nova_venda.html'), 409
         db.session.commit()
+        ajustar_estatisticas(total_vendas=valor_total)
         flash('Venda criada com sucesso!', 'success')
-        return redirect(url_for('listar_vendas'))
+        return redirect(url_for('editora.listar_vendas'))
     
-    clientes = Cliente.query.all()
-    livros = Livro.query.all()
-    return render_template('nova_venda.html', clientes=clientes, livros=livros)
+    return render_template('nova_venda.html')
 
-@app.route('/vendas/<int:id>/deletar', methods=['POST'])
+@bp.route('/vendas/<int:id>/deletar', methods=['POST'])
 @login_required
 def deletar_venda(id):
     """Deletar venda"""
-    venda = Venda.query.get_or_404(id)
-    db.session.delete(venda)
-    db.session.commit()
-    flash('Venda deletada com sucesso!', 'success')
-    return redirect(url_for('listar_vendas'))
+    return excluir_um('vendas', id, 'Venda deletada com sucesso!', 'editora.listar_vendas')
+
+@bp.route('/vendas/importar', methods=['POST'])
+@login_required
+def importar_vendas_lote():
+    """Importa vendas em lote (JSON Lines ou CSV) e retorna o relatório em JSON"""
+    arquivo = request.files.get('arquivo')
+    if arquivo:
+        padrao = 'csv' if (arquivo.filename or '').lower().endswith('.csv') else 'jsonl'
+        formato = request.form.get('formato') or padrao
+        conteudo = arquivo.stream
+    else:
+        padrao = 'csv' if request.mimetype == 'text/csv' else 'jsonl'
+        formato = request.args.get('formato') or padrao
+        conteudo = io.BufferedReader(request.stream)
+    
+    linhas = io.TextIOWrapper(conteudo, encoding='utf-8', newline='')
+    leitor = ler_csv if formato == 'csv' else ler_jsonl
+    relatorio = importar_vendas(leitor(linhas), current_app.config['IMPORTACAO_TAMANHO_LOTE'])
+    return jsonify(relatorio.to_dict())
+
+# ===== EXCLUSÕES =====
+def excluir_um(tipo, id, mensagem, destino):
+    """Exclusão de um registro pelas rotas /<tipo>/<id>/deletar, com as mesmas regras da exclusão em lote"""
+    relatorio = excluir(tipo, [id])
+    if id in relatorio.nao_encontrados:
+        abort(404)
+    if id in relatorio.bloqueados:
+        flash(f'Não foi possível excluir: {relatorio.bloqueados[id]}', 'error')
+    else:
+        flash(mensagem, 'success')
+    return redirect(url_for(destino))
+
+@bp.route('/<tipo>/deletar', methods=['POST'])
+@login_required
+def deletar_em_lote(tipo):
+    """Exclui autores, livros, clientes ou vendas em lote e retorna o relatório em JSON.
+
+    Ids no campo de formulário `ids` (repetido) ou em JSON: {"ids": [1, 2, 3]}.
+    """
+    if tipo not in EXCLUSOES:
+        return jsonify({'erro': 'Exclusão inválida'}), 404
+    if request.is_json:
+        dados = request.get_json(silent=True)
+        ids = dados.get('ids') if isinstance(dados, dict) else None
+    else:
+        ids = request.form.getlist('ids')
+    try:
+        if not isinstance(ids, list):
+            raise TypeError
+        ids = [int(id) for id in ids]
+    except (TypeError, ValueError):
+        return jsonify({'erro': 'ids deve ser uma lista de números inteiros'}), 400
+    if not ids or len(ids) > current_app.config['EXCLUSAO_MAX_IDS']:
+        return jsonify({'erro': f"Informe de 1 a {current_app.config['EXCLUSAO_MAX_IDS']} ids"}), 400
+    relatorio = excluir(tipo, ids, current_app.config['EXCLUSAO_TAMANHO_LOTE'])
+    return jsonify(relatorio.to_dict())
+
+# ===== EXPORTAÇÕES =====
+def ler_data(valor):
+    """Converte 'AAAA-MM-DD' em date; vazio retorna None"""
+    return datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+
+@bp.route('/exportar/<tipo>')
+@login_required
+@somente_leitura
+def exportar_dados(tipo):
+    """Exportação completa (vendas, clientes ou catalogo) em CSV ou JSON Lines, transmitida em blocos"""
+    formato = request.args.get('formato', 'csv')
+    if tipo not in EXPORTACOES or formato not in FORMATOS:
+        return jsonify({'erro': 'Exportação ou formato inválido'}), 404
+    try:
+        inicio = ler_data(request.args.get('inicio'))
+        fim = ler_data(request.args.get('fim'))
+    except ValueError:
+        return jsonify({'erro': 'Datas devem estar no formato AAAA-MM-DD'}), 400
+    comprimir = request.args.get('gzip') == '1'
+    
+    blocos = exportar(
+        tipo, formato, inicio, fim,
+        yield_per=current_app.config['EXPORTACAO_YIELD_PER'],
+        tamanho_bloco=current_app.config['EXPORTACAO_TAMANHO_BLOCO']
+    )
+    nome = f'{tipo}.{formato}' + ('.gz' if comprimir else '')
+    if comprimir:
+        mimetype = 'application/gzip'
+    else:
+        mimetype = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+    resposta = Response(stream_with_context(codificar(blocos, comprimir)), mimetype=mimetype)
+    resposta.headers['Content-Disposition'] = f'attachment; filename="{nome}"'
+    resposta.headers['X-Accel-Buffering'] = 'no'  # Não acumular a resposta no proxy
+    return resposta
+
+# ===== ANÁLISES =====
+def periodo_analise():
+    """Período (inicio, fim) dos parâmetros; padrão: os últimos ANALISES_PERIODO_PADRAO dias"""
+    fim = ler_data(request.args.get('fim')) or date.today()
+    inicio = ler_data(request.args.get('inicio')) or fim - timedelta(days=current_app.config['ANALISES_PERIODO_PADRAO'])
+    if inicio > fim:
+        raise ValueError('inicio posterior a fim')
+    return inicio, fim
+
+@bp.route('/analises/<consulta>')
+@login_required
+@somente_leitura
+def analise_vendas(consulta):
+    """Receita no tempo, tendências por gênero ou autores mais vendidos no período (JSON)"""
+    if consulta not in analises.CONSULTAS:
+        return jsonify({'erro': 'Análise inválida'}), 404
+    try:
+        inicio, fim = periodo_analise()
+    except ValueError:
+        return jsonify({'erro': 'Datas devem estar no formato AAAA-MM-DD, com inicio até fim'}), 400
+    
+    parametros = {}
+    if consulta == 'receita':
+        parametros['granularidade'] = request.args.get('granularidade', 'dia')
+        if parametros['granularidade'] not in analises.GRANULARIDADES:
+            return jsonify({'erro': 'Granularidade deve ser dia ou mes'}), 400
+    elif consulta == 'autores':
+        limite = request.args.get('limite', 10, type=int)
+        parametros['limite'] = max(1, min(limite, current_app.config['ANALISES_LIMITE_MAX']))
+    
+    return jsonify({
+        'inicio': inicio.isoformat(),
+        'fim': fim.isoformat(),
+        **parametros,
+        'dados': analises.consultar(consulta, inicio, fim, **parametros)
+    })
+
+# ===== API JSON =====
+def parametros_api():
+    """fields, include e fields[<relacionamento>] da query string"""
+    campos_inclusoes = {
+        chave[7:-1]: valor for chave, valor in request.args.items()
+        if chave.startswith('fields[') and chave.endswith(']')
+    }
+    return {
+        'campos': request.args.get('fields'),
+        'incluir': request.args.get('include'),
+        'campos_inclusoes': campos_inclusoes
+    }
+
+@bp.route('/api/v1/<recurso>')
+@login_required
+@somente_leitura
+@limite_consultas(2 + api.MAX_INCLUSOES)  # Usuário, registros e uma por inclusão
+def api_listar(recurso):
+    """Página de autores, livros, clientes ou vendas (JSON), com paginação por cursor"""
+    if recurso not in api.RECURSOS:
+        return jsonify({'erro': 'Recurso inválido'}), 404
+    try:
+        corpo = api.listar(
+            recurso, por_pagina=request.args.get('por_pagina', type=int),
+            cursor=request.args.get('cursor'), **parametros_api()
+        )
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
+    return Response(corpo, mimetype='application/json')
+
+@bp.route('/api/v1/<recurso>/<int:id>')
+@login_required
+@somente_leitura
+@limite_consultas(2 + api.MAX_INCLUSOES)  # Usuário, registros e uma por inclusão
+def api_obter(recurso, id):
+    """Um registro de autores, livros, clientes ou vendas (JSON)"""
+    if recurso not in api.RECURSOS:
+        return jsonify({'erro': 'Recurso inválido'}), 404
+    try:
+        corpo = api.obter(recurso, id, **parametros_api())
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
+    if corpo is None:
+        return jsonify({'erro': 'Registro não encontrado'}), 404
+    return Response(corpo, mimetype='application/json')
+
+# ===== MÉTRICAS =====
+@bp.route('/metricas/pool')
+@login_required
+def metricas_pool_banco():
+    """Uso e tempo de espera dos pools de conexão (apenas administradores)"""
+    if not current_user.is_admin:
+        abort(403)
+    return jsonify(metricas_pool())
+
+@bp.route('/metrics')
+@login_required
+def metricas_prometheus():
+    """Latência por rota, SQL e pools no formato do Prometheus (apenas administradores)"""
+    if not current_user.is_admin:
+        abort(403)
+    return Response(perfilamento.exportar_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/metricas/perfilamento', methods=['POST'])
+@login_required
+def alternar_perfilamento():
+    """Liga ou desliga o perfilamento em todos os workers (apenas administradores)"""
+    if not current_user.is_admin:
+        abort(403)
+    ativo = request.form.get('ativo', request.args.get('ativo')) == '1'
+    perfilamento.interruptor.definir(current_app, ativo)
+    return jsonify({'ativo': ativo})
 
 # ===== ROTA PARA PERFIL DO USUÁRIO =====
-@app.route('/perfil')
+@bp.route('/perfil')
 @login_required
 def perfil():
     """Página de perfil do usuário"""
     return render_template('perfil.html', usuario=current_user)
 
+# ===== COMANDOS CLI =====
+@bp.cli.command('criar-tabelas')
+def criar_tabelas_cli():
+    """Cria as tabelas e os índices dos modelos que ainda não existem no banco"""
+    db.create_all()
+    # create_all só cria os índices junto com tabelas novas
+    for tabela in db.metadata.sorted_tables:
+        for indice in tabela.indexes:
+            indice.create(db.engine, checkfirst=True)
+    click.echo('Tabelas criadas.')
+
+@bp.cli.command('criar-usuarios-iniciais')
+def criar_usuarios_iniciais_cli():
+    """Cria os usuários admin e usuario quando o banco não tem nenhum"""
+    criar_usuarios_iniciais()
+
+@bp.cli.command('importar-vendas')
+@click.argument('caminho', type=click.Path(exists=True, dir_okay=False))
+@click.option('--formato', type=click.Choice(['jsonl', 'csv']), help='Padrão: pela extensão do arquivo')
+@click.option('--lote', type=int, default=None, help='Vendas por transação')
+def importar_vendas_cli(caminho, formato, lote):
+    """Importa vendas de um arquivo JSON Lines ou CSV"""
+    formato = formato or ('csv' if caminho.lower().endswith('.csv') else 'jsonl')
+    leitor = ler_csv if formato == 'csv' else ler_jsonl
+    with open(caminho, encoding='utf-8', newline='') as arquivo:
+        relatorio = importar_vendas(leitor(arquivo), lote or current_app.config['IMPORTACAO_TAMANHO_LOTE'])
+    
+    for erro in relatorio.to_dict()['erros']:
+        click.echo(f"Linha {erro['linha']}: {erro['erro']}", err=True)
+    click.echo(f'{relatorio.vendas} vendas e {relatorio.itens} itens importados '
+               f'(R$ {relatorio.valor_total:.2f}); {len(relatorio.erros)} erros')
+
+@bp.cli.command('importar-catalogo')
+@click.argument('caminho', type=click.Path(exists=True, dir_okay=False))
+@click.option('--lote', type=int, default=None, help='Livros por transação')
+def importar_catalogo_cli(caminho, lote):
+    """Importa livros e autores de um CSV (titulo,isbn,data_publicacao,genero,autores)"""
+    with open(caminho, encoding='utf-8', newline='') as arquivo:
+        relatorio = importar_catalogo(arquivo, lote or current_app.config['CATALOGO_TAMANHO_LOTE'])
+    
+    for erro in relatorio.to_dict()['erros']:
+        click.echo(f"Linha {erro['linha']}: {erro['erro']}", err=True)
+    click.echo(f'{relatorio.inseridos} livros inseridos, {relatorio.atualizados} atualizados, '
+               f'{relatorio.autores_criados} autores criados; {len(relatorio.erros)} erros')
+
+@bp.cli.command('exportar')
+@click.argument('tipo', type=click.Choice(list(EXPORTACOES)))
+@click.argument('caminho', type=click.Path(dir_okay=False, allow_dash=True))
+@click.option('--formato', type=click.Choice(FORMATOS), help='Padrão: pela extensão do arquivo')
+@click.option('--inicio', type=click.DateTime(['%Y-%m-%d']), help='Data de venda inicial (AAAA-MM-DD)')
+@click.option('--fim', type=click.DateTime(['%Y-%m-%d']), help='Data de venda final (AAAA-MM-DD)')
+@click.option('--gzip', 'comprimir', is_flag=True, help='Comprimir em gzip (padrão para arquivos .gz)')
+def exportar_cli(tipo, caminho, formato, inicio, fim, comprimir):
+    """Exporta vendas, clientes ou catalogo para CSV ou JSON Lines ('-' para a saída padrão)"""
+    nome = caminho.lower()
+    comprimir = comprimir or nome.endswith('.gz')
+    formato = formato or ('jsonl' if nome.removesuffix('.gz').endswith('.jsonl') else 'csv')
+    blocos = exportar(
+        tipo, formato,
+        inicio.date() if inicio else None,
+        fim.date() if fim else None,
+        yield_per=current_app.config['EXPORTACAO_YIELD_PER'],
+        tamanho_bloco=current_app.config['EXPORTACAO_TAMANHO_BLOCO']
+    )
+    with click.open_file(caminho, 'wb') as saida:
+        for dados in codificar(blocos, comprimir):
+            saida.write(dados)
+
+@bp.cli.command('perfilamento')
+@click.argument('acao', type=click.Choice(['ligar', 'desligar', 'status']))
+def perfilamento_cli(acao):
+    """Liga, desliga ou mostra o perfilamento de SQL (vale para todos os workers)"""
+    if acao != 'status':
+        perfilamento.interruptor.definir(current_app, acao == 'ligar')
+    ativo = perfilamento.interruptor.ativo(current_app)
+    click.echo(f"Perfilamento {'ligado' if ativo else 'desligado'}")
+
+@bp.cli.command('rollup-processar')
+@click.option('--lote', type=int, default=None, help='Eventos do outbox por transação')
+@click.option('--continuo', is_flag=True, help='Continua aguardando novos eventos')
+def rollup_processar_cli(lote, continuo):
+    """Agrega as vendas pendentes nas métricas, na segmentação e nos agregados diários"""
+    rollup.executar_worker(lote or current_app.config['ROLLUP_TAMANHO_LOTE'], continuo, click.echo)
+
+@bp.cli.command('rollup-verificar')
+@click.option('--corrigir', is_flag=True, help='Recalcula as tabelas do zero se houver divergência')
+def rollup_verificar_cli(corrigir):
+    """Compara as tabelas derivadas de vendas com um recálculo completo"""
+    relatorio = rollup.verificar()
+    click.echo(f"{relatorio.pop('eventos_pendentes')} eventos pendentes no outbox")
+    for tabela, resultado in relatorio.items():
+        click.echo(f"{tabela}: {resultado['verificados']} verificados, {resultado['divergentes']} divergentes")
+        for exemplo in resultado['exemplos']:
+            click.echo(f"  {exemplo['id']}: esperado {exemplo['esperado']}, atual {exemplo['atual']}", err=True)
+
+    divergentes = sum(resultado['divergentes'] for resultado in relatorio.values())
+    if divergentes and corrigir:
+        rollup.reconstruir()
+        click.echo('Tabelas recalculadas.')
+    elif divergentes:
+        raise SystemExit(1)
+
+@bp.cli.command('vendas-particionar')
+@click.option('--meses', type=int, default=None, help='Meses futuros com partição criada')
+def vendas_particionar_cli(meses):
+    """Converte vendas em tabela particionada por mês de data_venda (PostgreSQL)"""
+    try:
+        particionamento.particionar_vendas(meses or current_app.config['VENDAS_PARTICOES_FUTURAS'])
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    click.echo('Tabela vendas particionada.')
+
+@bp.cli.command('vendas-particoes')
+@click.option('--meses', type=int, default=None, help='Meses futuros com partição criada')
+def vendas_particoes_cli(meses):
+    """Cria as partições de vendas dos próximos meses (rodar periodicamente)"""
+    if not particionamento.vendas_particionada():
+        raise click.ClickException('vendas não é uma tabela particionada')
+    criadas = particionamento.criar_particoes(meses or current_app.config['VENDAS_PARTICOES_FUTURAS'])
+    click.echo(f"Partições criadas: {', '.join(criadas) or 'nenhuma'}")
+
+@bp.cli.command('vendas-arquivar')
+@click.option('--meses', type=int, default=None, help='Vendas mais antigas que isso vão para o arquivo')
+@click.option('--lote', type=int, default=None, help='Vendas por transação')
+def vendas_arquivar_cli(meses, lote):
+    """Move as vendas antigas e seus itens para vendas_arquivo e venda_itens_arquivo"""
+    config = current_app.config
+    limite = rollup.meses_atras(date.today(), meses or config['ARQUIVO_HORIZONTE_MESES']).replace(day=1)
+    total = arquivar_vendas(limite, lote or config['ARQUIVO_TAMANHO_LOTE'], click.echo)
+    click.echo(f'{total} vendas anteriores a {limite.isoformat()} arquivadas.')
+    if particionamento.vendas_particionada():
+        removidas = particionamento.remover_particoes_vazias(limite)
+        criadas = particionamento.criar_particoes(config['VENDAS_PARTICOES_FUTURAS'])
+        click.echo(f"Partições removidas: {', '.join(removidas) or 'nenhuma'}; "
+                   f"criadas: {', '.join(criadas) or 'nenhuma'}")
+
 # ===== MANIPULADOR DE ERRO 401 =====
-@app.errorhandler(401)
+@bp.app_errorhandler(401)
 def unauthorized_error(error):
     flash('Você precisa fazer login para acessar esta página.', 'error')
-    return redirect(url_for('login'))
+    return redirect(url_for('editora.login'))
 
-from flask import render_template
 
 # ===== MANIPULADORES DE ERRO =====
-@app.errorhandler(429)
+@bp.app_errorhandler(429)
 def too_many_requests(error):
     """Página personalizada para erro 429 - Too Many Requests"""
     # Extrai informações do erro
     retry_after = getattr(error, 'retry_after', 60)  # Default 60 segundos
     limit = getattr(error, 'description', 'Limite excedido')
     
-    # Log do erro
-    print(f"Rate Limit Atingido - IP: {request.remote_addr} - Path: {request.path}")
-    
     return render_template('429.html', 
                          retry_after=retry_after,
                          limit=limit), 429
 
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template('404.html'), 404
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     return render_template('500.html'), 500
@@ -529,4 +1025,8 @@ if __name__ == '__main__':
     print("   - /registro: 3 registros por minuto") 
     print("   - /teste-limite: 3 acessos por minuto")
     print(" Acesse http://127.0.0.1:5000/teste-limite para testar")
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        criar_usuarios_iniciais()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,74 @@
+from datetime import datetime
+
+from sqlalchemy import delete, insert, literal, select, union_all
+
+from models import db, Venda, VendaItem, VendaArquivada, VendaItemArquivado
+from paginacao import invalidar_contagem
+
+# Arquivamento das vendas antigas.
+#
+# `flask vendas-arquivar` move as vendas com data_venda anterior ao
+# horizonte (ARQUIVO_HORIZONTE_MESES) e seus itens para vendas_arquivo e
+# venda_itens_arquivo, em lotes de uma transação cada. As tabelas quentes
+# (e, no PostgreSQL particionado, as partições recentes) ficam só com o
+# período em uso pela listagem, pelo cadastro e pelas exclusões.
+#
+# O arquivamento não grava eventos de rollup: os agregados diários e
+# mensais de /analises, metricas_autores e segmentacao_clientes continuam
+# contando as vendas arquivadas. Os recálculos completos de rollup.py, o
+# total do dashboard e a exportação de vendas leem vendas e arquivo juntos
+# (historico_vendas() e historico_itens()).
+
+
+def historico_vendas():
+    """vendas UNION ALL vendas_arquivo, com as colunas de vendas"""
+    arquivo = VendaArquivada.__table__
+    return union_all(
+        select(Venda.venda_id, Venda.cliente_id, Venda.data_venda, Venda.valor_total),
+        select(arquivo.c.venda_id, arquivo.c.cliente_id, arquivo.c.data_venda, arquivo.c.valor_total),
+    ).subquery('vendas_historico')
+
+
+def historico_itens():
+    """venda_itens UNION ALL venda_itens_arquivo, com as colunas de venda_itens"""
+    arquivo = VendaItemArquivado.__table__
+    return union_all(
+        select(VendaItem.item_id, VendaItem.venda_id, VendaItem.livro_id, VendaItem.quantidade,
+               VendaItem.preco_unitario),
+        select(arquivo.c.item_id, arquivo.c.venda_id, arquivo.c.livro_id, arquivo.c.quantidade,
+               arquivo.c.preco_unitario),
+    ).subquery('venda_itens_historico')
+
+
+def arquivar_vendas(limite, tamanho_lote=5000, informar=print):
+    """Move as vendas com data_venda < limite, e seus itens, para o arquivo; retorna quantas"""
+    vendas, itens = Venda.__table__, VendaItem.__table__
+    arquivo, arquivo_itens = VendaArquivada.__table__, VendaItemArquivado.__table__
+    total = 0
+    while True:
+        venda_ids = db.session.scalars(
+            select(vendas.c.venda_id).where(vendas.c.data_venda < limite)
+            .order_by(vendas.c.venda_id).limit(tamanho_lote)
+        ).all()
+        if not venda_ids:
+            break
+        # data_venda no filtro: no PostgreSQL particionado, só as partições antigas são lidas
+        lote = (vendas.c.venda_id.in_(venda_ids), vendas.c.data_venda < limite)
+        agora = literal(datetime.utcnow(), db.DateTime)
+        db.session.execute(insert(arquivo).from_select(
+            ['venda_id', 'cliente_id', 'data_venda', 'valor_total', 'arquivado_em'],
+            select(vendas.c.venda_id, vendas.c.cliente_id, vendas.c.data_venda, vendas.c.valor_total, agora)
+            .where(*lote)
+        ))
+        db.session.execute(insert(arquivo_itens).from_select(
+            ['item_id', 'venda_id', 'livro_id', 'quantidade', 'preco_unitario'],
+            select(itens.c.item_id, itens.c.venda_id, itens.c.livro_id, itens.c.quantidade, itens.c.preco_unitario)
+            .where(itens.c.venda_id.in_(venda_ids))
+        ))
+        db.session.execute(delete(itens).where(itens.c.venda_id.in_(venda_ids)))
+        db.session.execute(delete(vendas).where(*lote))
+        db.session.commit()
+        total += len(venda_ids)
+        informar(f'{total} vendas arquivadas')
+    invalidar_contagem(Venda.__tablename__)
+    return total
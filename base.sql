@@ -44,18 +44,67 @@ CREATE TABLE vendas (
 );
 
 -- Tabela de detalhes de cada venda
-CREATE TABLE vendas_item (
-    venda_item_id SERIAL PRIMARY KEY,
+CREATE TABLE venda_itens (
+    item_id SERIAL PRIMARY KEY,
     venda_id INTEGER REFERENCES vendas(venda_id),
     livro_id INTEGER REFERENCES livros(livro_id),
     quantidade INTEGER NOT NULL CHECK (quantidade > 0),
     preco_unitario NUMERIC(10, 2) NOT NULL CHECK (preco_unitario >= 0)
 );
 
+-- Índices dos caminhos de acesso (os mesmos declarados em models.py): o
+-- PostgreSQL não indexa chaves estrangeiras, e sem eles relatórios,
+-- funções, carregamento de relacionamentos e a checagem das FKs nas
+-- exclusões varrem as tabelas inteiras (conferido por benchmarks/planos.py)
+CREATE INDEX ix_vendas_cliente_id ON vendas (cliente_id);
+CREATE INDEX ix_vendas_data_venda ON vendas (data_venda, venda_id);
+CREATE INDEX ix_venda_itens_venda_id ON venda_itens (venda_id);
+CREATE INDEX ix_venda_itens_livro_id ON venda_itens (livro_id);
+CREATE INDEX ix_livro_autor_autor_id ON livro_autor (autor_id);
+
+-- Bancos criados com versões anteriores deste script, em que a tabela de
+-- itens se chamava vendas_item (a aplicação sempre usou venda_itens):
+-- ALTER TABLE vendas_item RENAME TO venda_itens;
+-- ALTER TABLE venda_itens RENAME COLUMN venda_item_id TO item_id;
+-- ALTER SEQUENCE vendas_item_venda_item_id_seq RENAME TO venda_itens_item_id_seq;
+-- e então os CREATE INDEX acima (ou `flask criar-tabelas`) e as funções abaixo.
+
+-- Vendas antigas e seus itens, movidos de vendas e venda_itens por
+-- `flask vendas-arquivar` (arquivamento.py). Sem chaves estrangeiras: a
+-- exclusão de clientes e livros com vendas arquivadas é bloqueada pela
+-- aplicação (exclusao.py). A exportação, o total do dashboard e os
+-- recálculos dos agregados leem vendas e arquivo juntos; as funções deste
+-- script leem só as vendas não arquivadas.
+CREATE TABLE vendas_arquivo (
+    venda_id INTEGER PRIMARY KEY,
+    cliente_id INTEGER NOT NULL,
+    data_venda DATE NOT NULL,
+    valor_total NUMERIC(10, 2) NOT NULL,
+    arquivado_em TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+CREATE INDEX ix_vendas_arquivo_cliente_id ON vendas_arquivo (cliente_id);
+CREATE INDEX ix_vendas_arquivo_data_venda ON vendas_arquivo (data_venda);
+
+CREATE TABLE venda_itens_arquivo (
+    item_id INTEGER PRIMARY KEY,
+    venda_id INTEGER NOT NULL,
+    livro_id INTEGER NOT NULL,
+    quantidade INTEGER NOT NULL,
+    preco_unitario NUMERIC(10, 2) NOT NULL
+);
+CREATE INDEX ix_venda_itens_arquivo_venda_id ON venda_itens_arquivo (venda_id);
+CREATE INDEX ix_venda_itens_arquivo_livro_id ON venda_itens_arquivo (livro_id);
+
+-- Particionamento de vendas por mês de data_venda: converta a tabela acima
+-- com `flask vendas-particionar` (particionamento.py) e agende
+-- `flask vendas-particoes` para criar as partições dos próximos meses. A
+-- chave primária passa a (venda_id, data_venda) e a FK
+-- venda_itens.venda_id -> vendas é removida.
+
 
 -- Tabela para controle de estoque (se não existir)
 CREATE TABLE estoque (
-    livro_id INTEGER PRIMARY KEY REFERENCES livros(livro_id),
+    livro_id INTEGER PRIMARY KEY REFERENCES livros(livro_id) ON DELETE CASCADE,
     quantidade INTEGER NOT NULL DEFAULT 0 CHECK (quantidade >= 0),
     estoque_minimo INTEGER NOT NULL DEFAULT 10,
     data_atualizacao TIMESTAMP WITH TIME ZONE DEFAULT NOW()
@@ -63,7 +112,7 @@ CREATE TABLE estoque (
 
 -- Tabela para métricas de autores
 CREATE TABLE metricas_autores (
-    autor_id INTEGER REFERENCES autores(autor_id),
+    autor_id INTEGER REFERENCES autores(autor_id) ON DELETE CASCADE,
     total_vendas INTEGER DEFAULT 0,
     receita_total NUMERIC(15,2) DEFAULT 0,
     livros_publicados INTEGER DEFAULT 0,
@@ -73,7 +122,7 @@ CREATE TABLE metricas_autores (
 
 -- Tabela para segmentação de clientes
 CREATE TABLE segmentacao_clientes (
-    cliente_id INTEGER REFERENCES clientes(cliente_id),
+    cliente_id INTEGER REFERENCES clientes(cliente_id) ON DELETE CASCADE,
     segmento VARCHAR(20) CHECK (segmento IN ('VIP', 'Regular', 'Inativo', 'Novo')),
     total_compras INTEGER DEFAULT 0,
     valor_total_gasto NUMERIC(15,2) DEFAULT 0,
@@ -82,6 +131,70 @@ CREATE TABLE segmentacao_clientes (
     PRIMARY KEY (cliente_id)
 );
 
+-- Outbox das vendas ainda não agregadas em metricas_autores e
+-- segmentacao_clientes (consumido por `flask rollup-processar`)
+CREATE TABLE rollup_eventos (
+    evento_id BIGSERIAL PRIMARY KEY,
+    venda_id INTEGER NOT NULL,
+    cliente_id INTEGER NOT NULL,
+    data_venda DATE NOT NULL,
+    valor_total NUMERIC(10, 2) NOT NULL,
+    livro_id INTEGER,
+    quantidade INTEGER NOT NULL DEFAULT 0,
+    preco_unitario NUMERIC(10, 2) NOT NULL DEFAULT 0,
+    sinal SMALLINT NOT NULL CHECK (sinal IN (1, -1)),
+    registrado_em TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+CREATE INDEX ix_rollup_eventos_cliente_id ON rollup_eventos (cliente_id);
+CREATE INDEX ix_rollup_eventos_venda_id ON rollup_eventos (venda_id);
+
+-- Vendas agregadas por dia e por mês, mantidas pelo mesmo worker (base de /analises)
+CREATE TABLE vendas_diarias (
+    data DATE,
+    livro_id INTEGER REFERENCES livros(livro_id) ON DELETE CASCADE,
+    genero VARCHAR(50),
+    itens INTEGER NOT NULL DEFAULT 0,
+    quantidade INTEGER NOT NULL DEFAULT 0,
+    receita NUMERIC(15,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (data, livro_id)
+);
+
+CREATE TABLE vendas_diarias_autores (
+    data DATE,
+    autor_id INTEGER REFERENCES autores(autor_id) ON DELETE CASCADE,
+    genero VARCHAR(50) DEFAULT '',
+    quantidade INTEGER NOT NULL DEFAULT 0,
+    receita NUMERIC(15,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (data, autor_id, genero)
+);
+
+-- Os mesmos totais por mês (mes = primeiro dia do mês), para períodos longos
+CREATE TABLE vendas_mensais (
+    mes DATE,
+    genero VARCHAR(50) DEFAULT '',
+    itens INTEGER NOT NULL DEFAULT 0,
+    quantidade INTEGER NOT NULL DEFAULT 0,
+    receita NUMERIC(15,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (mes, genero)
+);
+
+CREATE TABLE vendas_mensais_autores (
+    mes DATE,
+    autor_id INTEGER REFERENCES autores(autor_id) ON DELETE CASCADE,
+    genero VARCHAR(50) DEFAULT '',
+    quantidade INTEGER NOT NULL DEFAULT 0,
+    receita NUMERIC(15,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (mes, autor_id, genero)
+);
+
+-- Versão de cada tabela, incrementada no commit das transações da aplicação
+-- que a alteram; base dos ETags e do cache de fragmentos (cache_http.py)
+CREATE TABLE versoes_tabelas (
+    tabela VARCHAR(63) PRIMARY KEY,
+    versao BIGINT NOT NULL DEFAULT 1,
+    alterado_em TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
 -- Tabela de histórico de preços
 CREATE TABLE historico_precos (
     historico_id SERIAL PRIMARY KEY,
@@ -93,6 +206,32 @@ CREATE TABLE historico_precos (
 );
 
 
+-- Índices para os campos de autocompletar
+-- Prefixo: lower(coluna) LIKE 'termo%'
+CREATE INDEX ix_autores_nome_lower ON autores (lower(nome) varchar_pattern_ops);
+CREATE INDEX ix_livros_titulo_lower ON livros (lower(titulo) varchar_pattern_ops);
+CREATE INDEX ix_clientes_nome_lower ON clientes (lower(nome) varchar_pattern_ops);
+
+-- Trecho: lower(coluna) LIKE '%termo%' (requer a extensão pg_trgm)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX ix_autores_nome_trgm ON autores USING gin (lower(nome) gin_trgm_ops);
+CREATE INDEX ix_livros_titulo_trgm ON livros USING gin (lower(titulo) gin_trgm_ops);
+CREATE INDEX ix_clientes_nome_trgm ON clientes USING gin (lower(nome) gin_trgm_ops);
+
+
+-- Busca textual no catálogo (/livros/busca), sem diferenciar acentos
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE TEXT SEARCH CONFIGURATION portugues_sem_acento (COPY = portuguese);
+ALTER TEXT SEARCH CONFIGURATION portugues_sem_acento
+    ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem;
+
+CREATE INDEX ix_livros_busca ON livros USING gin (
+    (setweight(to_tsvector('portugues_sem_acento', titulo), 'A') ||
+     setweight(to_tsvector('portugues_sem_acento', COALESCE(genero, '')), 'C'))
+);
+CREATE INDEX ix_autores_busca ON autores USING gin (to_tsvector('portugues_sem_acento', nome));
+
+
 ---=== Inicio da criação das funções ===---
 
 DROP FUNCTION IF EXISTS sp_controle_estoque_alertas();
@@ -117,7 +256,7 @@ BEGIN
         END as status,
         COALESCE((
             SELECT SUM(vi.quantidade)::INTEGER
-            FROM vendas_item vi
+            FROM venda_itens vi
             JOIN vendas v ON vi.venda_id = v.venda_id
             WHERE vi.livro_id = l.livro_id
             AND v.data_venda >= CURRENT_DATE - INTERVAL '30 days'
@@ -159,7 +298,7 @@ BEGIN
     FROM autores a
     LEFT JOIN livro_autor la ON a.autor_id = la.autor_id
     LEFT JOIN livros l ON la.livro_id = l.livro_id
-    LEFT JOIN vendas_item vi ON l.livro_id = vi.livro_id
+    LEFT JOIN venda_itens vi ON l.livro_id = vi.livro_id
     LEFT JOIN vendas v ON vi.venda_id = v.venda_id
     WHERE (p_data_inicio IS NULL OR v.data_venda >= p_data_inicio)
       AND (p_data_fim IS NULL OR v.data_venda <= p_data_fim)
@@ -187,21 +326,21 @@ BEGIN
         l.titulo::VARCHAR(200) as livro_titulo,
         a.nome::VARCHAR(100) as autor_nome,
         l.genero::VARCHAR(50) as genero,
-        (SELECT AVG(preco_unitario)::NUMERIC(10,2) FROM vendas_item WHERE livro_id = l.livro_id) as preco_medio,
+        (SELECT AVG(preco_unitario)::NUMERIC(10,2) FROM venda_itens WHERE livro_id = l.livro_id) as preco_medio,
         'Mesmo autor'::VARCHAR(100) as motivo_recomendacao
     FROM livros l
     JOIN livro_autor la ON l.livro_id = la.livro_id
     JOIN autores a ON la.autor_id = a.autor_id
     WHERE la.autor_id IN (
         SELECT DISTINCT la2.autor_id
-        FROM vendas_item vi
+        FROM venda_itens vi
         JOIN vendas v ON vi.venda_id = v.venda_id
         JOIN livro_autor la2 ON vi.livro_id = la2.livro_id
         WHERE v.cliente_id = p_cliente_id
     )
     AND l.livro_id NOT IN (
         SELECT vi.livro_id
-        FROM vendas_item vi
+        FROM venda_itens vi
         JOIN vendas v ON vi.venda_id = v.venda_id
         WHERE v.cliente_id = p_cliente_id
     )
@@ -213,21 +352,21 @@ BEGIN
         l.titulo::VARCHAR(200) as livro_titulo,
         a.nome::VARCHAR(100) as autor_nome,
         l.genero::VARCHAR(50) as genero,
-        (SELECT AVG(preco_unitario)::NUMERIC(10,2) FROM vendas_item WHERE livro_id = l.livro_id) as preco_medio,
+        (SELECT AVG(preco_unitario)::NUMERIC(10,2) FROM venda_itens WHERE livro_id = l.livro_id) as preco_medio,
         'Mesmo gênero'::VARCHAR(100) as motivo_recomendacao
     FROM livros l
     JOIN livro_autor la ON l.livro_id = la.livro_id
     JOIN autores a ON la.autor_id = a.autor_id
     WHERE l.genero IN (
         SELECT DISTINCT l2.genero::VARCHAR(50)
-        FROM vendas_item vi
+        FROM venda_itens vi
         JOIN vendas v ON vi.venda_id = v.venda_id
         JOIN livros l2 ON vi.livro_id = l2.livro_id
         WHERE v.cliente_id = p_cliente_id
     )
     AND l.livro_id NOT IN (
         SELECT vi.livro_id
-        FROM vendas_item vi
+        FROM venda_itens vi
         JOIN vendas v ON vi.venda_id = v.venda_id
         WHERE v.cliente_id = p_cliente_id
     )
@@ -256,7 +395,7 @@ BEGIN
             l.genero::VARCHAR(50) as genero,
             SUM(vi.quantidade)::INTEGER as vendas_atual,
             SUM(vi.quantidade * vi.preco_unitario)::NUMERIC(15,2) as receita_atual
-        FROM vendas_item vi
+        FROM venda_itens vi
         JOIN vendas v ON vi.venda_id = v.venda_id
         JOIN livros l ON vi.livro_id = l.livro_id
         WHERE v.data_venda >= CURRENT_DATE - (p_meses || ' months')::INTERVAL
@@ -267,7 +406,7 @@ BEGIN
             l.genero::VARCHAR(50) as genero,
             SUM(vi.quantidade)::INTEGER as vendas_anterior,
             SUM(vi.quantidade * vi.preco_unitario)::NUMERIC(15,2) as receita_anterior
-        FROM vendas_item vi
+        FROM venda_itens vi
         JOIN vendas v ON vi.venda_id = v.venda_id
         JOIN livros l ON vi.livro_id = l.livro_id
         WHERE v.data_venda >= CURRENT_DATE - (p_meses * 2 || ' months')::INTERVAL
@@ -302,14 +441,14 @@ RETURNS TABLE (
     descricao TEXT
 ) AS $$
 BEGIN
+    -- BETWEEN com COALESCE em vez de (p IS NULL OR ...): usa ix_vendas_data_venda
     RETURN QUERY
     SELECT 
         'Total Vendas'::VARCHAR(100) as metricas,
         COALESCE(SUM(v.valor_total), 0)::NUMERIC(15,2) as valor,
         'Soma total de todas as vendas'::TEXT as descricao
     FROM vendas v
-    WHERE (p_data_inicio IS NULL OR v.data_venda >= p_data_inicio)
-      AND (p_data_fim IS NULL OR v.data_venda <= p_data_fim)
+    WHERE v.data_venda BETWEEN COALESCE(p_data_inicio, '-infinity'::DATE) AND COALESCE(p_data_fim, 'infinity'::DATE)
     
     UNION ALL
     
@@ -318,8 +457,7 @@ BEGIN
         COALESCE(AVG(v.valor_total), 0)::NUMERIC(15,2),
         'Valor médio por venda'::TEXT
     FROM vendas v
-    WHERE (p_data_inicio IS NULL OR v.data_venda >= p_data_inicio)
-      AND (p_data_fim IS NULL OR v.data_venda <= p_data_fim)
+    WHERE v.data_venda BETWEEN COALESCE(p_data_inicio, '-infinity'::DATE) AND COALESCE(p_data_fim, 'infinity'::DATE)
     
     UNION ALL
     
@@ -328,19 +466,17 @@ BEGIN
         COALESCE(COUNT(DISTINCT v.cliente_id), 0)::NUMERIC(15,2),
         'Clientes que realizaram compras'::TEXT
     FROM vendas v
-    WHERE (p_data_inicio IS NULL OR v.data_venda >= p_data_inicio)
-      AND (p_data_fim IS NULL OR v.data_venda <= p_data_fim)
+    WHERE v.data_venda BETWEEN COALESCE(p_data_inicio, '-infinity'::DATE) AND COALESCE(p_data_fim, 'infinity'::DATE)
     
     UNION ALL
     
     SELECT 
         'Livros Mais Vendidos'::VARCHAR(100),
-        COALESCE(COUNT(vi.venda_item_id), 0)::NUMERIC(15,2),
+        COALESCE(COUNT(vi.item_id), 0)::NUMERIC(15,2),
         'Total de itens vendidos'::TEXT
-    FROM vendas_item vi
+    FROM venda_itens vi
     JOIN vendas v ON vi.venda_id = v.venda_id
-    WHERE (p_data_inicio IS NULL OR v.data_venda >= p_data_inicio)
-      AND (p_data_fim IS NULL OR v.data_venda <= p_data_fim);
+    WHERE v.data_venda BETWEEN COALESCE(p_data_inicio, '-infinity'::DATE) AND COALESCE(p_data_fim, 'infinity'::DATE);
 END;
 $$ LANGUAGE plpgsql;
 
@@ -361,6 +497,8 @@ END;
 $$ LANGUAGE plpgsql;
 
 -- Função do trigger tg_atualizar_estoque_venda 
+-- A aplicação já baixa o estoque ao criar a venda (estoque.py), com
+-- decremento condicional; não crie este trigger junto com ela.
 CREATE OR REPLACE FUNCTION fn_atualizar_estoque_venda()
 RETURNS TRIGGER AS $$
 BEGIN
@@ -458,6 +596,17 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Os dois triggers acima recalculam as métricas linha a linha. Por padrão
+-- (ROLLUP_MODO=outbox) a aplicação grava as vendas em rollup_eventos e o
+-- worker de rollup.py agrega em lote; só crie os triggers com
+-- ROLLUP_MODO=gatilhos, nunca os dois ao mesmo tempo.
+-- CREATE TRIGGER tg_atualizar_metricas_autor
+--     AFTER INSERT ON venda_itens
+--     FOR EACH ROW EXECUTE FUNCTION fn_atualizar_metricas_autor();
+-- CREATE TRIGGER tg_atualizar_segmentacao_cliente
+--     AFTER INSERT ON vendas
+--     FOR EACH ROW EXECUTE FUNCTION fn_atualizar_segmentacao_cliente();
+
 
 -- ======================================================================
 -- 3. Inserção de Dados
@@ -504,7 +653,7 @@ INSERT INTO vendas (cliente_id, data_venda, valor_total) VALUES
 (4, '2025-04-12', 35.90),
 (2, '2025-05-01', 35.90);
 
-INSERT INTO vendas_item (venda_id, livro_id, quantidade, preco_unitario) VALUES
+INSERT INTO venda_itens (venda_id, livro_id, quantidade, preco_unitario) VALUES
 (1, 1, 1, 35.90),
 (2, 2, 1, 59.80),
 (3, 3, 2, 35.95),
@@ -593,4 +742,4 @@ CREATE TABLE backup_livros AS SELECT * FROM livros;
 CREATE TABLE backup_livro_autor AS SELECT * FROM livro_autor;
 CREATE TABLE backup_clientes AS SELECT * FROM clientes;
 CREATE TABLE backup_vendas AS SELECT * FROM vendas;
-CREATE TABLE backup_vendas_item AS SELECT * FROM vendas_item;
+CREATE TABLE backup_venda_itens AS SELECT * FROM venda_itens;
@@ -0,0 +1,96 @@
+"""Benchmark das análises de vendas (/analises) sobre os agregados diários.
+
+Semeia vendas ao longo de cinco anos, reconstrói os agregados com
+rollup.reconstruir() e mede, para períodos de 30 dias a cinco anos:
+  - direto: a mesma agregação feita sobre vendas e venda_itens;
+  - agregados: a rota lendo as tabelas diárias e mensais, sem cache;
+  - cache: a rota com o resultado já em cache.
+
+Uso: python -m benchmarks.analises [vendas] [repeticoes] [livros] [autores]
+"""
+import os
+import statistics
+import sys
+from datetime import date, timedelta
+
+os.environ.setdefault('LOG_AMOSTRAGEM', '0')
+
+from sqlalchemy import func, select
+
+from benchmarks.comum import preparar_app, login, cronometrar
+from benchmarks.dados import semear_catalogo, semear_vendas
+
+PERIODOS = (30, 365, 1825)  # Dias
+FIM = date(2024, 12, 30)
+
+
+def consultas_diretas(inicio, fim):
+    """Equivalente das três análises calculado sobre as tabelas de vendas"""
+    from models import db, Livro, Venda, VendaItem, livro_autor
+    receita = func.sum(VendaItem.quantidade * VendaItem.preco_unitario)
+    periodo = Venda.data_venda.between(inicio, fim)
+    db.session.execute(
+        select(Venda.data_venda, func.count(), func.sum(VendaItem.quantidade), receita)
+        .select_from(Venda).join(VendaItem, VendaItem.venda_id == Venda.venda_id)
+        .where(periodo).group_by(Venda.data_venda)
+    ).all()
+    db.session.execute(
+        select(Livro.genero, func.sum(VendaItem.quantidade), receita)
+        .select_from(Venda).join(VendaItem, VendaItem.venda_id == Venda.venda_id)
+        .join(Livro, Livro.livro_id == VendaItem.livro_id)
+        .where(periodo).group_by(Livro.genero)
+    ).all()
+    db.session.execute(
+        select(livro_autor.c.autor_id, receita)
+        .select_from(Venda).join(VendaItem, VendaItem.venda_id == Venda.venda_id)
+        .join(livro_autor, livro_autor.c.livro_id == VendaItem.livro_id)
+        .where(periodo).group_by(livro_autor.c.autor_id).order_by(receita.desc()).limit(10)
+    ).all()
+
+
+def main():
+    vendas = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    repeticoes = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    livros = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+    autores = int(sys.argv[4]) if len(sys.argv) > 4 else 200
+    app = preparar_app()
+    app.config['PERFILAMENTO_SQL_LENTA_MS'] = float('inf')
+
+    import analises
+    import rollup
+    with app.app_context():
+        semear_catalogo(livros, autores)
+        semear_vendas(vendas, 5000, inicio=FIM - timedelta(days=1824), dias=1825)
+        rollup.reconstruir()
+
+    cliente = app.test_client()
+    login(cliente)
+    rotas = ('receita?granularidade=mes', 'generos', 'autores')
+
+    print(f'{vendas} vendas em 5 anos, {livros} livros, {autores} autores; mediana de {repeticoes} execuções das três análises\n')
+    print(f'{"período":>8} {"direto":>10} {"agregados":>10} {"cache":>10}')
+    for dias in PERIODOS:
+        inicio = FIM - timedelta(days=dias - 1)
+        parametros = f'inicio={inicio.isoformat()}&fim={FIM.isoformat()}'
+
+        with app.app_context():
+            direto = statistics.median(cronometrar(lambda: consultas_diretas(inicio, FIM), repeticoes))
+
+        def todas():
+            for rota in rotas:
+                separador = '&' if '?' in rota else '?'
+                resposta = cliente.get(f'/analises/{rota}{separador}{parametros}')
+                assert resposta.status_code == 200, resposta.status_code
+
+        def sem_cache():
+            analises.cache_analises.limpar()
+            todas()
+
+        agregados = statistics.median(cronometrar(sem_cache, repeticoes))
+        todas()
+        em_cache = statistics.median(cronometrar(todas, repeticoes))
+        print(f'{dias:>6} d {direto:8.2f}ms {agregados:8.2f}ms {em_cache:8.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
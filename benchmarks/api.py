@@ -0,0 +1,147 @@
+"""Benchmark da API JSON (api.py) contra a renderização das listagens HTML.
+
+Duas medidas:
+  - serialização: as mesmas linhas já carregadas escritas por
+    render_template (fragmento da listagem), por json.dumps com um dicionário
+    por linha (como Usuario.to_dict) e pelo Codificador da API; em linhas/s;
+  - requisição: listagem HTML (fragmento fora do cache) contra a rota da API
+    com o mesmo tamanho de página, incluindo autores dos livros e itens e
+    cliente das vendas; mediana em ms e consultas SQL.
+Antes das medidas, confere o orçamento de consultas (limite_consultas) das
+rotas da API com TESTING ligado, em todas as combinações de ?include=,
+na listagem e em um registro, com o cache de identidades vazio.
+
+Uso: python -m benchmarks.api [livros] [vendas] [repeticoes]
+"""
+import json
+import os
+from itertools import combinations
+import statistics
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+
+os.environ.setdefault('LOG_AMOSTRAGEM', '0')
+
+from flask import render_template
+from sqlalchemy import select
+
+from benchmarks.comum import preparar_app, login, cronometrar, registrar_consultas
+from benchmarks.dados import semear_catalogo, semear_vendas
+
+
+def _valor(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return str(valor) if isinstance(valor, Decimal) else valor
+
+
+def orcamento(app, cliente):
+    """Todas as combinações de inclusões dentro do limite de consultas das rotas"""
+    import api
+    from identidades import cache_identidades
+    from models import db
+
+    app.testing = True  # verificar_orcamento levanta OrcamentoSQLExcedido
+    try:
+        for nome, recurso in api.RECURSOS.items():
+            with app.app_context():
+                id = db.session.scalar(select(recurso.id).limit(1))
+            for quantidade in range(len(recurso.inclusoes) + 1):
+                for inclusoes in combinations(recurso.inclusoes, quantidade):
+                    consulta = f'?include={",".join(inclusoes)}' if inclusoes else ''
+                    for rota in (f'/api/v1/{nome}{consulta}', f'/api/v1/{nome}/{id}{consulta}'):
+                        cache_identidades.limpar()  # Conta também a consulta do usuário
+                        assert cliente.get(rota).status_code == 200, rota
+    finally:
+        app.testing = False
+    print('ok  orçamento de consultas da API em todas as combinações de include\n')
+
+
+def serializacao(app, por_pagina, repeticoes):
+    import api
+    from models import db, Livro
+    from paginacao import paginar
+
+    colunas = list(api.RECURSOS['livros'].campos.values())
+    codificador = api.Codificador(colunas)
+    with app.test_request_context():
+        livros = paginar(Livro.query, (Livro.livro_id,), 1, por_pagina)
+        linhas = db.session.execute(select(*colunas).limit(por_pagina)).all()
+        chaves = [coluna.key for coluna in colunas]
+        livros.pages  # Contagem feita fora da medição
+
+        funcoes = {
+            'render_template (fragmento)': lambda: render_template(
+                'fragmentos/livros.html', livros=livros, csrf_fragmento=''),
+            'json.dumps (dict por linha)': lambda: json.dumps([
+                {chave: _valor(getattr(livro, chave)) for chave in chaves} for livro in livros.items
+            ], ensure_ascii=False),
+            'api.Codificador': lambda: '[' + ','.join(codificador(linha) for linha in linhas) + ']',
+        }
+        print(f'Serialização de {len(linhas)} livros (mediana de {repeticoes})')
+        for nome, funcao in funcoes.items():
+            funcao()
+            tempo = statistics.median(cronometrar(funcao, repeticoes))
+            print(f'  {nome:<30} {tempo:8.3f}ms {len(linhas) / tempo * 1000:12,.0f} linhas/s')
+
+
+def requisicoes(app, cliente, consultas, por_pagina, repeticoes):
+    import cache_http
+
+    def html(rota):
+        def requisitar():
+            cache_http.cache_fragmentos.limpar()  # Mede consulta e renderização
+            assert cliente.get(rota).status_code == 200
+        return requisitar
+
+    def json_api(rota):
+        def requisitar():
+            assert cliente.get(rota).status_code == 200
+        return requisitar
+
+    pares = (
+        ('livros', html(f'/livros?por_pagina={por_pagina}'),
+         json_api(f'/api/v1/livros?por_pagina={por_pagina}')),
+        ('livros + autores', html(f'/livros?por_pagina={por_pagina}'),
+         json_api(f'/api/v1/livros?por_pagina={por_pagina}&include=autores')),
+        ('vendas + itens, cliente', html(f'/vendas?por_pagina={por_pagina}'),
+         json_api(f'/api/v1/vendas?por_pagina={por_pagina}&include=itens,cliente')),
+        ('vendas (fields=valor_total)', html(f'/vendas?por_pagina={por_pagina}'),
+         json_api(f'/api/v1/vendas?por_pagina={por_pagina}&fields=valor_total')),
+    )
+    print(f'\nRequisições com {por_pagina} registros (mediana de {repeticoes})')
+    print(f'  {"":<30} {"HTML":>20} {"API":>20}')
+    for nome, *funcoes in pares:
+        linha = []
+        for funcao in funcoes:
+            funcao()
+            consultas.clear()
+            linha += [statistics.median(cronometrar(funcao, repeticoes)), max(consultas)]
+        print('  {:<30} {:8.2f}ms ({} SQL) {:11.2f}ms ({} SQL)'.format(nome, *linha))
+
+
+def main():
+    livros = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    vendas = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    repeticoes = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    app = preparar_app()
+    app.config['PERFILAMENTO_SQL_LENTA_MS'] = float('inf')
+    consultas = registrar_consultas(app)
+
+    with app.app_context():
+        semear_catalogo(livros, max(livros // 10, 1))
+        semear_vendas(vendas, 2000)
+    por_pagina = app.config['PAGINACAO_MAX_POR_PAGINA']
+
+    cliente = app.test_client()
+    login(cliente)
+    cliente.get('/livros')  # Descarta a mensagem flash do login
+
+    orcamento(app, cliente)
+    serializacao(app, por_pagina, repeticoes)
+    requisicoes(app, cliente, consultas, por_pagina, repeticoes)
+
+
+if __name__ == '__main__':
+    main()
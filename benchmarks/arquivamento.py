@@ -0,0 +1,152 @@
+"""Benchmark e verificação do arquivamento de vendas antigas (arquivamento.py).
+
+Semeia cinco anos de vendas até hoje, recalcula as tabelas derivadas e
+arquiva as vendas anteriores ao horizonte (ARQUIVO_HORIZONTE_MESES).
+Confere que o arquivamento não muda o que é lido do histórico:
+  - exportação de vendas idêntica (mesmo conteúdo, mesma ordem);
+  - total do dashboard e análises de /analises iguais;
+  - rollup.verificar() sem divergências, também depois de excluir pelo ORM
+    vendas recentes de clientes com vendas arquivadas (recálculo do
+    cliente no worker).
+Mede a listagem de vendas e a exportação do último mês antes e depois.
+No PostgreSQL com vendas particionada (`flask vendas-particionar`), as
+partições esvaziadas são removidas como em `flask vendas-arquivar`.
+
+Uso: python -m benchmarks.arquivamento [vendas] [clientes] [repeticoes]
+"""
+import hashlib
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+os.environ.setdefault('LOG_AMOSTRAGEM', '0')
+
+from sqlalchemy import func, select
+
+from benchmarks.comum import preparar_app, login, cronometrar
+from benchmarks.dados import semear_catalogo, semear_vendas
+
+
+def verificar(condicao, mensagem):
+    if not condicao:
+        raise SystemExit(f'FALHOU: {mensagem}')
+    print(f'ok  {mensagem}')
+
+
+def resumo_exportacao(inicio=None, fim=None):
+    """(linhas, hash) da exportação de vendas em CSV"""
+    from exportacao import exportar
+    linhas, digest = 0, hashlib.blake2b()
+    for bloco in exportar('vendas', 'csv', inicio, fim):
+        linhas += bloco.count('\n')
+        digest.update(bloco.encode())
+    return linhas, digest.hexdigest()
+
+
+def historico(inicio, fim):
+    """Resultados que não podem mudar com o arquivamento"""
+    import analises
+    from estatisticas import _calcular
+    return {
+        'exportacao': resumo_exportacao(),
+        'dashboard': _calcular(),
+        'receita mensal': analises.receita_por_periodo(inicio, fim, 'mes'),
+        'gêneros': analises.tendencias_generos(inicio, fim),
+        'autores': analises.principais_autores(inicio, fim),
+    }
+
+
+def divergencias():
+    import rollup
+    relatorio = rollup.verificar()
+    pendentes = relatorio.pop('eventos_pendentes')
+    return pendentes, sum(resultado['divergentes'] for resultado in relatorio.values())
+
+
+def medir(app, cliente, repeticoes):
+    import cache_http
+
+    def listar(rota):
+        cache_http.cache_fragmentos.limpar()  # Mede a consulta, não o fragmento em cache
+        assert cliente.get(rota).status_code == 200
+
+    ultimo_mes = date.today() - timedelta(days=30)
+    with app.app_context():
+        exportacao = statistics.median(cronometrar(lambda: resumo_exportacao(ultimo_mes), max(repeticoes // 10, 1)))
+    return {
+        'listagem (página 1)': statistics.median(cronometrar(
+            lambda: listar('/vendas?por_pagina=50'), repeticoes)),
+        'listagem (página 20)': statistics.median(cronometrar(
+            lambda: listar('/vendas?pagina=20&por_pagina=50'), repeticoes)),
+        'exportação (30 dias)': exportacao,
+    }
+
+
+def main():
+    vendas = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    clientes = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    repeticoes = int(sys.argv[3]) if len(sys.argv) > 3 else 30
+    app = preparar_app()
+    app.config['PERFILAMENTO_SQL_LENTA_MS'] = float('inf')
+    hoje = date.today()
+
+    import particionamento
+    import rollup
+    from arquivamento import arquivar_vendas
+    from models import db, Venda, VendaArquivada, VendaItemArquivado
+    with app.app_context():
+        semear_catalogo(5000, 500)
+        semear_vendas(vendas, clientes, inicio=hoje - timedelta(days=1824), dias=1825)
+        rollup.reconstruir()
+        primeira = db.session.scalar(select(func.min(Venda.data_venda)))
+        antes = historico(primeira, hoje)
+
+    cliente = app.test_client()
+    login(cliente)
+    cliente.get('/vendas')  # Descarta a mensagem flash do login
+    tempos_antes = medir(app, cliente, repeticoes)
+
+    with app.app_context():
+        limite = rollup.meses_atras(hoje, app.config['ARQUIVO_HORIZONTE_MESES']).replace(day=1)
+        inicio = time.perf_counter()
+        arquivadas = arquivar_vendas(limite, app.config['ARQUIVO_TAMANHO_LOTE'], informar=lambda _: None)
+        duracao = time.perf_counter() - inicio
+        if particionamento.vendas_particionada():
+            print(f'Partições removidas: {len(particionamento.remover_particoes_vazias(limite))}')
+        restantes = db.session.scalar(select(func.count()).select_from(Venda))
+        print(f'{db.session.get_bind().dialect.name}: {arquivadas} de {vendas} vendas anteriores a {limite} '
+              f'arquivadas em {duracao:.1f}s ({arquivadas / duracao:.0f} vendas/s)\n')
+
+        verificar(restantes + arquivadas == vendas and
+                  db.session.scalar(select(func.min(Venda.data_venda))) >= limite,
+                  'vendas quentes só com o período recente')
+        verificar(db.session.scalar(select(func.count()).select_from(VendaArquivada)) == arquivadas and
+                  db.session.scalar(select(func.count()).select_from(VendaItemArquivado)) > 0,
+                  'vendas e itens copiados para o arquivo')
+        depois = historico(primeira, hoje)
+        for chave in antes:
+            verificar(antes[chave] == depois[chave], f'{chave} igual antes e depois do arquivamento')
+        verificar(divergencias() == (0, 0), 'rollup.verificar() sem divergências após o arquivamento')
+
+        # Exclusões recentes de clientes com vendas arquivadas: o worker recalcula o cliente pelo histórico
+        com_arquivo = select(VendaArquivada.cliente_id)
+        removidas = db.session.scalars(
+            select(Venda).where(Venda.cliente_id.in_(com_arquivo)).order_by(Venda.venda_id.desc()).limit(20)
+        ).all()
+        for venda in removidas:
+            db.session.delete(venda)
+        db.session.commit()
+        while rollup.processar_lote(app.config['ROLLUP_TAMANHO_LOTE']):
+            pass
+        verificar(divergencias() == (0, 0), f'rollup.verificar() sem divergências após excluir {len(removidas)} vendas')
+
+    tempos_depois = medir(app, cliente, repeticoes)
+    print(f'\n{"mediana de " + str(repeticoes) + " requisições":<28} {"antes":>10} {"depois":>10}')
+    for nome, tempo in tempos_antes.items():
+        print(f'{nome:<28} {tempo:8.2f}ms {tempos_depois[nome]:8.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
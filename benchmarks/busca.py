@@ -0,0 +1,59 @@
+"""Benchmark da busca no catálogo (/livros/busca) com um catálogo sintético.
+
+Mede a construção do índice em memória e a latência das consultas (p50,
+p95, p99). Com DATABASE_URL apontando para um PostgreSQL preparado com
+base.sql, mede o caminho de busca textual do PostgreSQL.
+
+Uso: python -m benchmarks.busca [livros] [consultas]
+"""
+import random
+import statistics
+import sys
+import time
+
+from benchmarks.comum import preparar_app, cronometrar
+from benchmarks.dados import semear_catalogo, PALAVRAS, SOBRENOMES, GENEROS
+
+CONSULTAS = (
+    [f'{a} {b}' for a in PALAVRAS[:10] for b in PALAVRAS[10:20]]
+    + [palavra[:3] for palavra in PALAVRAS]
+    + [sobrenome.lower().replace('é', 'e') for sobrenome in SOBRENOMES]
+    + [genero.lower() for genero in GENEROS]
+    + ['9780000012345', 'solidao', 'coracao do sertao']
+)
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def main():
+    livros = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    consultas = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    app = preparar_app()
+
+    from busca import buscar_livros, busca_catalogo, _usa_postgres
+    with app.app_context():
+        inicio = time.perf_counter()
+        semear_catalogo(livros=livros, autores=max(livros // 20, 10))
+        print(f'Catálogo: {livros} livros semeados em {time.perf_counter() - inicio:.1f} s')
+
+        modo = 'PostgreSQL (texto completo)' if _usa_postgres() else 'índice em memória'
+        if not _usa_postgres():
+            inicio = time.perf_counter()
+            busca_catalogo.reconstruir()
+            print(f'Construção do índice: {(time.perf_counter() - inicio) * 1000:.0f} ms')
+
+        aleatorio = random.Random(1)
+        termos = [aleatorio.choice(CONSULTAS) for _ in range(consultas)]
+        iterador = iter(termos)
+        tempos = cronometrar(lambda: buscar_livros(next(iterador)), consultas)
+
+    print(f'Busca ({modo}), {consultas} consultas:')
+    print(f'  p50 {percentil(tempos, 50):.2f} ms | p95 {percentil(tempos, 95):.2f} ms | '
+          f'p99 {percentil(tempos, 99):.2f} ms | média {statistics.mean(tempos):.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Benchmark do cache HTTP condicional e do cache de fragmentos (cache_http.py).
+
+Mede as listagens de livros e vendas em três situações:
+  - completa: fragmento fora do cache (paginação consultada e renderizada);
+  - fragmento: fragmento em cache, página montada sem consultar a listagem;
+  - 304: navegador revalidando com If-None-Match, sem consultar nem renderizar.
+Em seguida confere que uma gravação invalida ETag e fragmento, que mensagens
+flash não são servidas do cache e que o token CSRF injetado no fragmento
+compartilhado é o de cada sessão e é aceito pelo formulário de exclusão.
+
+Uso: python -m benchmarks.cache_http [livros] [vendas] [repeticoes]
+"""
+import os
+import re
+import statistics
+import sys
+
+os.environ.setdefault('LOG_AMOSTRAGEM', '0')
+
+from sqlalchemy import func
+
+from benchmarks.comum import preparar_app, login, cronometrar, registrar_consultas
+from benchmarks.dados import semear_catalogo, semear_vendas
+
+
+def verificar(condicao, mensagem):
+    if not condicao:
+        raise SystemExit(f'FALHOU: {mensagem}')
+    print(f'ok  {mensagem}')
+
+
+def medir(app, cliente, rota, repeticoes, consultas):
+    import cache_http
+
+    def completa():
+        cache_http.cache_fragmentos.limpar()
+        assert cliente.get(rota).status_code == 200
+
+    def fragmento():
+        assert cliente.get(rota).status_code == 200
+
+    etag = cliente.get(rota).headers['ETag']
+
+    def revalidacao():
+        assert cliente.get(rota, headers={'If-None-Match': etag}).status_code == 304
+
+    linha = [rota]
+    for funcao in (completa, fragmento, revalidacao):
+        funcao()
+        consultas.clear()
+        linha.append(statistics.median(cronometrar(funcao, repeticoes)))
+        linha.append(max(consultas))
+    print('{:<32} {:7.2f}ms ({} SQL)     {:7.2f}ms ({} SQL)     {:7.2f}ms ({} SQL)'.format(*linha))
+
+
+def main():
+    livros = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    vendas = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    repeticoes = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    app = preparar_app()
+    app.config['PERFILAMENTO_SQL_LENTA_MS'] = float('inf')
+    consultas = registrar_consultas(app)
+
+    from models import db, Livro, VendaItem
+    with app.app_context():
+        semear_catalogo(livros, max(livros // 10, 1))
+        semear_vendas(vendas, 2000)
+        livro_id = db.session.scalar(db.select(func.min(Livro.livro_id)))  # Primeira linha da página 1
+        excluido_id = db.session.scalar(  # Sem vendas, pode ser excluído
+            db.select(func.min(Livro.livro_id)).where(~Livro.livro_id.in_(db.select(VendaItem.livro_id)))
+        )
+
+    cliente = app.test_client()
+    login(cliente)
+    cliente.get('/livros')  # Descarta a mensagem flash do login
+
+    print(f'{livros} livros, {vendas} vendas; mediana de {repeticoes} requisições\n')
+    print(f'{"rota":<32} {"completa":<20} {"fragmento":<20} {"304":<20}')
+    for rota in ('/livros?pagina=50&por_pagina=50', '/vendas?por_pagina=50', '/autores', '/clientes'):
+        medir(app, cliente, rota, repeticoes, consultas)
+    print()
+
+    # Gravação pelo ORM invalida ETag e fragmento
+    rota = '/livros?pagina=1&por_pagina=10'
+    antes = cliente.get(rota)
+    cliente.post(f'/livros/{livro_id}/editar', data={'titulo': 'Título alterado', 'isbn': '', 'genero': ''})
+    com_flash = cliente.get(rota)
+    verificar('Livro atualizado com sucesso!' in com_flash.get_data(as_text=True), 'mensagem flash exibida após a edição')
+    verificar(com_flash.headers.get('ETag') is None and 'no-store' in com_flash.headers['Cache-Control'],
+              'página com flash sai sem validadores e com no-store')
+    depois = cliente.get(rota, headers={'If-None-Match': antes.headers['ETag']})
+    verificar(depois.status_code == 200 and depois.headers['ETag'] != antes.headers['ETag'],
+              'edição do livro muda o ETag da listagem')
+    texto = depois.get_data(as_text=True)
+    verificar('Título alterado' in texto and 'Livro atualizado' not in texto,
+              'fragmento renderizado de novo e flash exibido uma única vez')
+    verificar(cliente.get(rota, headers={'If-Modified-Since': depois.headers['Last-Modified']}).status_code == 304,
+              'If-Modified-Since com a última alteração responde 304')
+
+    # Tokens CSRF por sessão dentro do fragmento compartilhado
+    app.config['WTF_CSRF_ENABLED'] = True
+    tokens = []
+    for sessao in (cliente, app.test_client()):
+        if sessao is not cliente:
+            pagina = sessao.get('/login').get_data(as_text=True)
+            token = re.search(r'name="csrf_token" value="([^"]+)"', pagina).group(1)
+            sessao.post('/login', data={'username': 'admin', 'password': 'admin123', 'csrf_token': token})
+            sessao.get(rota)  # Descarta a mensagem flash do login
+        pagina = sessao.get(rota).get_data(as_text=True)
+        tokens.append(re.findall(r'name="csrf_token" value="([^"]+)"', pagina))
+    verificar(all(tokens[0]) and '<!--csrf-->' not in pagina, 'marcador substituído pelo token em todos os formulários')
+    verificar(set(tokens[0]).isdisjoint(tokens[1]), 'sessões diferentes recebem tokens diferentes do mesmo fragmento')
+    verificar(cliente.post(f'/livros/{excluido_id}/deletar').status_code == 400, 'exclusão sem token recusada')
+    resposta = cliente.post(f'/livros/{excluido_id}/deletar', data={'csrf_token': tokens[0][0]})
+    verificar(resposta.status_code == 302, 'token do fragmento aceito pela exclusão')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+"""Teste de carga de todas as rotas com um catálogo sintético.
+
+Semeia autores, livros (com vários autores), clientes e vendas com itens
+(benchmarks/dados.py) no banco de DATABASE_URL, ou em um SQLite temporário,
+e sobe a aplicação em um servidor HTTP com threads. Cada rota é exercitada
+por clientes concorrentes, uma rota por vez. Para cada uma são medidos:
+latência p50/p95/p99, vazão e consultas SQL por requisição. As rotas de
+exclusão ficam de fora para não alterar o conjunto de dados entre as rotas.
+
+O resultado é gravado em JSON (por padrão em benchmarks/resultados/) e
+duas execuções podem ser comparadas com --comparar.
+
+Uso:
+    python -m benchmarks.carga [--livros N] [--vendas N] [--concorrencia N] [--requisicoes N] [--saida ARQ]
+    python -m benchmarks.carga --comparar antes.json depois.json
+"""
+import argparse
+import http.cookiejar
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, namedtuple
+from datetime import date, datetime, timedelta
+
+os.environ.setdefault('LOG_AMOSTRAGEM', '0')
+
+from werkzeug.serving import make_server
+
+from benchmarks.comum import preparar_app, registrar_consultas, percentil
+from benchmarks.dados import semear_catalogo, semear_vendas, PALAVRAS
+
+RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resultados')
+INICIO_VENDAS = date(2020, 1, 1)
+
+# caminho e dados podem ser funções de (aleatorio, amostras), sorteadas a cada requisição
+Rota = namedtuple('Rota', 'nome metodo caminho dados status autenticada', defaults=(None, 200, True))
+
+
+class SemRedirecionamento(urllib.request.HTTPRedirectHandler):
+    """Mede o 302 em si, sem seguir para a página de destino"""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def abrir_sessao(base, username='admin', password='admin123'):
+    """Opener sem redirecionamentos, com cookie de sessão já autenticado"""
+    opener = urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), SemRedirecionamento
+    )
+    status = requisitar(opener, base + '/login', {'username': username, 'password': password})
+    assert status == 302, f'Falha no login do benchmark ({status})'
+    return opener
+
+
+def requisitar(opener, url, dados=None):
+    """Executa a requisição (POST se houver dados) e retorna o status HTTP"""
+    corpo = urllib.parse.urlencode(dados, doseq=True).encode() if dados is not None else None
+    try:
+        with opener.open(url, data=corpo) as resposta:
+            resposta.read()
+            return resposta.status
+    except urllib.error.HTTPError as erro:
+        erro.read()
+        return erro.code
+
+
+def montar_rotas(amostras):
+    """Rotas exercitadas, com páginas e registros escolhidos pelo tamanho do banco"""
+    def pagina(total, por_pagina):
+        return max(1, total // por_pagina // 2)  # Página do meio (OFFSET alto)
+
+    def listas(caminho, total):
+        return [
+            Rota(f'GET {caminho} p1x10', 'GET', f'{caminho}?pagina=1&por_pagina=10'),
+            Rota(f'GET {caminho} p1x100', 'GET', f'{caminho}?pagina=1&por_pagina=100'),
+            Rota(f'GET {caminho} meio x20', 'GET', f'{caminho}?pagina={pagina(total, 20)}&por_pagina=20'),
+        ]
+
+    def sorteio(chave, modelo):
+        return lambda aleatorio, amostras: modelo.format(aleatorio.choice(amostras[chave]))
+
+    def nova_venda(aleatorio, amostras):
+        livros = aleatorio.sample(amostras['livros'], aleatorio.randint(1, 3))
+        return {
+            'cliente_id': aleatorio.choice(amostras['clientes']),
+            'data_venda': date.today().isoformat(),
+            'livro_id': livros,
+            'quantidade': [aleatorio.randint(1, 3) for _ in livros],
+            'preco': [f'{aleatorio.randint(1990, 12990) / 100:.2f}' for _ in livros],
+        }
+
+    def exportacao(aleatorio, amostras):
+        dia = INICIO_VENDAS + timedelta(days=aleatorio.randrange(amostras['dias']))
+        return f'/exportar/vendas?inicio={dia}&fim={dia + timedelta(days=6)}'
+
+    totais = amostras['totais']
+    return [
+        Rota('POST /login', 'POST', '/login',
+             lambda aleatorio, amostras: {'username': 'usuario', 'password': 'senha123'},
+             status=302, autenticada=False),
+        Rota('GET /login', 'GET', '/login', autenticada=False),
+        Rota('GET / (dashboard)', 'GET', '/'),
+        *listas('/autores', totais['autores']),
+        *listas('/livros', totais['livros']),
+        *listas('/clientes', totais['clientes']),
+        *listas('/vendas', totais['vendas']),
+        Rota('GET /livros/busca', 'GET',
+             lambda aleatorio, amostras: '/livros/busca?q=' + urllib.parse.quote(aleatorio.choice(PALAVRAS))),
+        Rota('GET /autores/sugestoes', 'GET', '/autores/sugestoes?q=Ana'),
+        Rota('GET /livros/sugestoes', 'GET',
+             lambda aleatorio, amostras: '/livros/sugestoes?q=' + urllib.parse.quote(aleatorio.choice(PALAVRAS))),
+        Rota('GET /clientes/sugestoes', 'GET', '/clientes/sugestoes?q=Mar'),
+        Rota('GET /clientes/<id>/recomendacoes', 'GET', sorteio('clientes', '/clientes/{}/recomendacoes')),
+        Rota('GET /autores/novo', 'GET', '/autores/novo'),
+        Rota('GET /livros/novo', 'GET', '/livros/novo'),
+        Rota('GET /clientes/novo', 'GET', '/clientes/novo'),
+        Rota('GET /vendas/nova', 'GET', '/vendas/nova'),
+        Rota('GET /autores/<id>/editar', 'GET', sorteio('autores', '/autores/{}/editar')),
+        Rota('GET /livros/<id>/editar', 'GET', sorteio('livros', '/livros/{}/editar')),
+        Rota('GET /clientes/<id>/editar', 'GET', sorteio('clientes', '/clientes/{}/editar')),
+        Rota('POST /vendas/nova', 'POST', '/vendas/nova', nova_venda, status=302),
+        Rota('GET /exportar/vendas (7 dias)', 'GET', exportacao),
+        Rota('GET /metricas/pool', 'GET', '/metricas/pool'),
+    ]
+
+
+def preparar_dados(app, argumentos):
+    """Semeia o banco se estiver vazio e sorteia os registros usados nas rotas"""
+    from models import db, Autor, Livro, Cliente, Venda
+
+    with app.app_context():
+        if not db.session.scalar(db.select(db.func.count()).select_from(Livro)):
+            inicio = time.perf_counter()
+            semear_catalogo(argumentos.livros, argumentos.autores, argumentos.semente)
+            semear_vendas(argumentos.vendas, argumentos.clientes, argumentos.semente,
+                          inicio=INICIO_VENDAS, dias=argumentos.dias)
+            print(f'Dados sintéticos semeados em {time.perf_counter() - inicio:.1f} s')
+
+        aleatorio = random.Random(argumentos.semente)
+        amostras = {'totais': {}, 'dias': argumentos.dias}
+        for chave, coluna in (
+            ('autores', Autor.autor_id),
+            ('livros', Livro.livro_id),
+            ('clientes', Cliente.cliente_id),
+            ('vendas', Venda.venda_id),
+        ):
+            ids = db.session.scalars(db.select(coluna)).all()
+            amostras['totais'][chave] = len(ids)
+            amostras[chave] = aleatorio.sample(ids, min(len(ids), 1000))
+        amostras['banco'] = db.engine.dialect.name
+    return amostras
+
+
+def medir_rota(base, rota, amostras, contagens, concorrencia, requisicoes, aquecimento, semente):
+    """Executa a rota com `concorrencia` clientes e resume latência, vazão e SQL"""
+    def preparar(aleatorio):
+        caminho = rota.caminho(aleatorio, amostras) if callable(rota.caminho) else rota.caminho
+        dados = rota.dados(aleatorio, amostras) if callable(rota.dados) else rota.dados
+        return base + caminho, dados
+
+    def novo_opener():
+        if rota.autenticada:
+            return abrir_sessao(base)
+        return urllib.request.build_opener(SemRedirecionamento)
+
+    aleatorio = random.Random(semente)
+    openers = [novo_opener() for _ in range(concorrencia)]
+    for _ in range(aquecimento):
+        requisitar(openers[0], *preparar(aleatorio))
+
+    # Sessões abertas antes: daqui em diante só as requisições medidas passam pelo after_request
+    inicio_contagens = len(contagens)
+    latencias, status = [], Counter()
+    lock = threading.Lock()
+
+    def cliente(indice, quantidade):
+        aleatorio = random.Random(semente * 1000 + indice)
+        medidas, codigos = [], Counter()
+        for _ in range(quantidade):
+            url, dados = preparar(aleatorio)
+            inicio = time.perf_counter()
+            codigo = requisitar(openers[indice], url, dados)
+            medidas.append((time.perf_counter() - inicio) * 1000)
+            codigos[codigo] += 1
+        with lock:
+            latencias.extend(medidas)
+            status.update(codigos)
+
+    divisao = [requisicoes // concorrencia + (i < requisicoes % concorrencia) for i in range(concorrencia)]
+    threads = [threading.Thread(target=cliente, args=(i, quantidade)) for i, quantidade in enumerate(divisao)]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duracao = time.perf_counter() - inicio
+
+    consultas = contagens[inicio_contagens:]
+    return {
+        'metodo': rota.metodo,
+        'requisicoes': len(latencias),
+        'erros': sum(quantidade for codigo, quantidade in status.items() if codigo != rota.status),
+        'status': {str(codigo): quantidade for codigo, quantidade in sorted(status.items())},
+        'p50_ms': round(percentil(latencias, 50), 2),
+        'p95_ms': round(percentil(latencias, 95), 2),
+        'p99_ms': round(percentil(latencias, 99), 2),
+        'media_ms': round(sum(latencias) / len(latencias), 2) if latencias else None,
+        'max_ms': round(max(latencias), 2) if latencias else None,
+        'vazao_rps': round(len(latencias) / duracao, 1) if duracao else None,
+        'sql_por_requisicao': round(sum(consultas) / len(consultas), 2) if consultas else None,
+        'sql_max': max(consultas) if consultas else None,
+    }
+
+
+def commit_atual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(RESULTADOS)
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar(argumentos):
+    app = preparar_app()
+    contagens = registrar_consultas(app)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    amostras = preparar_dados(app, argumentos)
+    rotas = [
+        rota for rota in montar_rotas(amostras)
+        if not argumentos.rotas or any(trecho in rota.nome for trecho in argumentos.rotas)
+    ]
+
+    servidor = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{servidor.server_port}'
+    print(f"Banco {amostras['banco']}: " + ', '.join(f'{total} {chave}' for chave, total in amostras['totais'].items()))
+    print(f'{argumentos.concorrencia} clientes concorrentes, {argumentos.requisicoes} requisições por rota\n')
+    print(f'{"rota":<36} {"p50":>8} {"p95":>8} {"p99":>8} {"req/s":>8} {"SQL/req":>8} {"erros":>6}')
+
+    resultados = {}
+    try:
+        for rota in rotas:
+            resultado = medir_rota(
+                base, rota, amostras, contagens, argumentos.concorrencia,
+                argumentos.requisicoes, argumentos.aquecimento, argumentos.semente
+            )
+            resultados[rota.nome] = resultado
+            sql = resultado['sql_por_requisicao']
+            print(f'{rota.nome:<36} {resultado["p50_ms"]:8.1f} {resultado["p95_ms"]:8.1f} '
+                  f'{resultado["p99_ms"]:8.1f} {resultado["vazao_rps"]:8.1f} '
+                  f'{"-" if sql is None else f"{sql:.1f}":>8} {resultado["erros"]:6d}')
+    finally:
+        servidor.shutdown()
+
+    relatorio = {
+        'momento': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit_atual(),
+        'banco': amostras['banco'],
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'dados': amostras['totais'],
+        'parametros': {
+            'concorrencia': argumentos.concorrencia,
+            'requisicoes': argumentos.requisicoes,
+            'aquecimento': argumentos.aquecimento,
+            'semente': argumentos.semente,
+        },
+        'rotas': resultados,
+    }
+    saida = argumentos.saida or os.path.join(
+        RESULTADOS, f'carga-{datetime.now():%Y%m%d-%H%M%S}.json'
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+    print(f'\nResultado gravado em {saida}')
+    return relatorio
+
+
+def comparar(caminho_antes, caminho_depois):
+    """Diferenças por rota entre duas execuções (positivo = piorou)"""
+    with open(caminho_antes, encoding='utf-8') as arquivo:
+        antes = json.load(arquivo)
+    with open(caminho_depois, encoding='utf-8') as arquivo:
+        depois = json.load(arquivo)
+    for relatorio, caminho in ((antes, caminho_antes), (depois, caminho_depois)):
+        print(f"{caminho}: commit {relatorio.get('commit')}, {relatorio['banco']}, {relatorio['dados']}")
+
+    def variacao(anterior, atual):
+        if anterior is None or atual is None:
+            return '-'
+        if not anterior:
+            return f'{atual - anterior:+.1f}'
+        return f'{(atual - anterior) / anterior * 100:+.0f}%'
+
+    print(f'\n{"rota":<36} {"p50":>14} {"p95":>14} {"p99":>14} {"req/s":>14} {"SQL/req":>10}')
+    for nome, atual in depois['rotas'].items():
+        anterior = antes['rotas'].get(nome)
+        if anterior is None:
+            print(f'{nome:<36} (nova)')
+            continue
+        colunas = [
+            f'{atual[campo]:.1f} ({variacao(anterior[campo], atual[campo])})'
+            for campo in ('p50_ms', 'p95_ms', 'p99_ms', 'vazao_rps')
+        ]
+        sql = variacao(anterior['sql_por_requisicao'], atual['sql_por_requisicao'])
+        print(f'{nome:<36} ' + ' '.join(f'{coluna:>14}' for coluna in colunas) + f' {sql:>10}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga das rotas da aplicação')
+    parser.add_argument('--livros', type=int, default=20000)
+    parser.add_argument('--autores', type=int, default=2000)
+    parser.add_argument('--clientes', type=int, default=5000)
+    parser.add_argument('--vendas', type=int, default=50000)
+    parser.add_argument('--dias', type=int, default=1825, help='Período das vendas a partir de 2020-01-01')
+    parser.add_argument('--concorrencia', type=int, default=8, help='Clientes simultâneos por rota')
+    parser.add_argument('--requisicoes', type=int, default=200, help='Requisições medidas por rota')
+    parser.add_argument('--aquecimento', type=int, default=5, help='Requisições descartadas antes de medir')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--rota', dest='rotas', action='append', help='Mede só rotas com este trecho no nome')
+    parser.add_argument('--saida', help='Arquivo JSON do resultado')
+    parser.add_argument('--comparar', nargs=2, metavar=('ANTES', 'DEPOIS'), help='Compara dois resultados')
+    argumentos = parser.parse_args()
+
+    if argumentos.comparar:
+        comparar(*argumentos.comparar)
+    else:
+        executar(argumentos)
+
+
+if __name__ == '__main__':
+    main()
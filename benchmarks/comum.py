@@ -0,0 +1,58 @@
+"""Utilitários compartilhados pelos benchmarks.
+
+Os benchmarks usam um banco SQLite temporário, a menos que DATABASE_URL
+esteja definida no ambiente.
+"""
+import os
+import tempfile
+import time
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+
+from monitoramento import consultas_na_requisicao
+
+
+def preparar_app():
+    """Cria a aplicação configurada para benchmark (sem CSRF e sem rate limit), com tabelas e usuários"""
+    from app import create_app, criar_usuarios_iniciais, limiter
+    from models import db
+    app = create_app()
+    app.config.update(WTF_CSRF_ENABLED=False, RATELIMIT_ENABLED=False)
+    limiter.enabled = False  # A configuração só é lida na inicialização do Limiter
+    with app.app_context():
+        db.create_all()
+        criar_usuarios_iniciais()
+    return app
+
+
+def registrar_consultas(app):
+    """Acumula o número de consultas SQL de cada requisição na lista retornada"""
+    contagens = []
+
+    @app.after_request
+    def _registrar(response):
+        contagens.append(consultas_na_requisicao())
+        return response
+
+    return contagens
+
+
+def login(cliente, username='admin', password='admin123'):
+    resposta = cliente.post('/login', data={'username': username, 'password': password})
+    assert resposta.status_code == 302, 'Falha no login do benchmark'
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))] if ordenados else float('nan')
+
+
+def cronometrar(funcao, repeticoes):
+    """Executa a função várias vezes e retorna os tempos em milissegundos"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos
@@ -0,0 +1,95 @@
+"""Geração de dados sintéticos compatíveis com models.py para os benchmarks"""
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from sqlalchemy import insert
+
+from models import db, Autor, Livro, Cliente, Venda, VendaItem, livro_autor
+
+PALAVRAS = (
+    'amor', 'solidão', 'coração', 'memórias', 'sertão', 'cidade', 'noite', 'mar',
+    'tempo', 'história', 'caminho', 'guerra', 'paz', 'sombra', 'luz', 'jardim',
+    'viagem', 'segredo', 'ilha', 'estrela', 'lágrimas', 'verão', 'inverno', 'destino',
+    'canção', 'rio', 'montanha', 'poeta', 'saudade', 'ciência', 'máquina', 'império',
+    'fundação', 'ação', 'razão', 'emoção', 'família', 'herança', 'pássaro', 'pão'
+)
+NOMES = ('Ana', 'João', 'Maria', 'José', 'Clarice', 'Érico', 'Cecília', 'Graciliano',
+         'Raquel', 'Jorge', 'Lygia', 'Antônio', 'Conceição', 'Mário', 'Hilda', 'Rubem')
+SOBRENOMES = ('Silva', 'Souza', 'Lispector', 'Veríssimo', 'Meireles', 'Ramos', 'Queiroz',
+              'Amado', 'Telles', 'Évora', 'Andrade', 'Hilst', 'Fonseca', 'Araújo', 'Guimarães')
+GENEROS = ('Romance', 'Ficção Científica', 'Poesia', 'Fantasia', 'Biografia', 'História',
+           'Realismo Mágico', 'Distopia', 'Ensaio', 'Infantil')
+
+
+def semear_catalogo(livros=100000, autores=5000, semente=42, lote=5000):
+    """Insere autores, livros e vínculos livro_autor (1 a 3 autores por livro)"""
+    aleatorio = random.Random(semente)
+    autor_ids = db.session.scalars(
+        insert(Autor).returning(Autor.autor_id, sort_by_parameter_order=True),
+        [
+            {'nome': f'{aleatorio.choice(NOMES)} {aleatorio.choice(SOBRENOMES)} {i}'}
+            for i in range(autores)
+        ]
+    ).all()
+
+    for inicio in range(0, livros, lote):
+        quantidade = min(lote, livros - inicio)
+        livro_ids = db.session.scalars(
+            insert(Livro).returning(Livro.livro_id, sort_by_parameter_order=True),
+            [
+                {
+                    'titulo': ' '.join(aleatorio.choices(PALAVRAS, k=aleatorio.randint(2, 5))).capitalize(),
+                    'isbn': f'978{inicio + i:010d}',
+                    'genero': aleatorio.choice(GENEROS)
+                }
+                for i in range(quantidade)
+            ]
+        ).all()
+        db.session.execute(insert(livro_autor), [
+            {'livro_id': livro_id, 'autor_id': autor_id}
+            for livro_id in livro_ids
+            for autor_id in aleatorio.sample(autor_ids, aleatorio.randint(1, 3))
+        ])
+        db.session.commit()
+    return autor_ids
+
+
+def semear_vendas(vendas=100000, clientes=5000, semente=42, lote=5000, inicio=date(2020, 1, 1), dias=1825):
+    """Insere clientes e vendas com 1 a 4 itens sobre os livros já cadastrados"""
+    aleatorio = random.Random(semente)
+    livro_ids = db.session.scalars(db.select(Livro.livro_id)).all()
+    cliente_ids = db.session.scalars(
+        insert(Cliente).returning(Cliente.cliente_id, sort_by_parameter_order=True),
+        [
+            {'nome': f'{aleatorio.choice(NOMES)} {aleatorio.choice(SOBRENOMES)}',
+             'email': f'cliente{i}@exemplo.com.br'}
+            for i in range(clientes)
+        ]
+    ).all()
+
+    for inicio_lote in range(0, vendas, lote):
+        quantidade = min(lote, vendas - inicio_lote)
+        itens_por_venda = []
+        for _ in range(quantidade):
+            itens_por_venda.append([
+                {'livro_id': livro_id, 'quantidade': aleatorio.randint(1, 3),
+                 'preco_unitario': Decimal(aleatorio.randint(1990, 12990)) / 100}
+                for livro_id in aleatorio.sample(livro_ids, aleatorio.randint(1, 4))
+            ])
+        venda_ids = db.session.scalars(
+            insert(Venda).returning(Venda.venda_id, sort_by_parameter_order=True),
+            [
+                {'cliente_id': aleatorio.choice(cliente_ids),
+                 'data_venda': inicio + timedelta(days=aleatorio.randrange(dias)),
+                 'valor_total': sum(i['quantidade'] * i['preco_unitario'] for i in itens)}
+                for itens in itens_por_venda
+            ]
+        ).all()
+        db.session.execute(insert(VendaItem), [
+            dict(item, venda_id=venda_id)
+            for venda_id, itens in zip(venda_ids, itens_por_venda)
+            for item in itens
+        ])
+        db.session.commit()
+    return cliente_ids
@@ -0,0 +1,115 @@
+"""Teste de concorrência da reserva de estoque em /vendas/nova (estoque.py).
+
+Sobe a aplicação em um servidor HTTP com threads e dispara vendas em
+paralelo, cada cliente com a sua sessão:
+  - best-seller: todas as vendas pedem 1 exemplar do mesmo livro, com menos
+    estoque que pedidos;
+  - dois livros: metade das vendas informa os itens na ordem A, B e metade
+    na ordem B, A (sem a baixa em ordem de livro_id, deadlock no PostgreSQL).
+Confere que nenhuma venda foi aceita sem estoque (302 = vendida, 409 =
+esgotado, qualquer outro status é erro), que o estoque final é o inicial
+menos os exemplares vendidos e que nunca fica negativo.
+
+Uso: python -m benchmarks.estoque [vendas] [concorrencia] [estoque]
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('LOG_AMOSTRAGEM', '0')
+
+from sqlalchemy import func, insert, select
+from werkzeug.serving import make_server
+
+from benchmarks.carga import abrir_sessao, requisitar
+from benchmarks.comum import preparar_app, percentil
+from benchmarks.dados import semear_catalogo, semear_vendas
+
+
+def disparar(base, sessoes, formularios):
+    """Envia os formulários em paralelo (uma sessão por thread); retorna status e latências em ms"""
+    def enviar(indice):
+        inicio = time.perf_counter()
+        status = requisitar(sessoes[indice % len(sessoes)], base + '/vendas/nova', formularios[indice])
+        return status, (time.perf_counter() - inicio) * 1000
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(len(sessoes)) as executor:
+        resultados = list(executor.map(enviar, range(len(formularios))))
+    return resultados, time.perf_counter() - inicio
+
+
+def main():
+    vendas = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    concorrencia = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    estoque_inicial = int(sys.argv[3]) if len(sys.argv) > 3 else vendas // 2
+    app = preparar_app()
+    app.config['PERFILAMENTO_SQL_LENTA_MS'] = float('inf')
+
+    from models import db, Cliente, Estoque, Livro, VendaItem
+    with app.app_context():
+        semear_catalogo(100, 20)
+        semear_vendas(0, 100)
+        dialeto = db.session.get_bind().dialect.name
+        cliente_ids = db.session.scalars(select(Cliente.cliente_id)).all()
+        livro_a, livro_b, livro_c = db.session.scalars(select(Livro.livro_id).order_by(Livro.livro_id).limit(3)).all()
+        db.session.execute(insert(Estoque), [
+            {'livro_id': livro_id, 'quantidade': estoque_inicial} for livro_id in (livro_a, livro_b, livro_c)
+        ])
+        db.session.commit()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    servidor = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{servidor.server_port}'
+    sessoes = [abrir_sessao(base) for _ in range(concorrencia)]
+
+    def formulario(indice, livros):
+        return {
+            'cliente_id': cliente_ids[indice % len(cliente_ids)], 'data_venda': '2025-01-10',
+            'livro_id': livros, 'quantidade': ['1'] * len(livros), 'preco': ['39.90'] * len(livros)
+        }
+
+    cenarios = (
+        ('best-seller', (livro_a,), [formulario(i, [livro_a]) for i in range(vendas)]),
+        ('dois livros', (livro_b, livro_c), [
+            formulario(i, [livro_b, livro_c] if i % 2 else [livro_c, livro_b]) for i in range(vendas)
+        ]),
+    )
+    print(f'Banco {dialeto}: {vendas} vendas por cenário, {concorrencia} clientes, estoque inicial {estoque_inicial}\n')
+    print(f'{"cenário":<12} {"vendidas":>8} {"esgotado":>8} {"erros":>6} {"vendas/s":>9} {"p50":>8} {"p95":>8}  estoque')
+    falhas = 0
+    try:
+        for nome, livros, formularios in cenarios:
+            resultados, duracao = disparar(base, sessoes, formularios)
+            status = Counter(codigo for codigo, _ in resultados)
+            latencias = [latencia for _, latencia in resultados]
+            with app.app_context():
+                finais = dict(db.session.execute(
+                    select(Estoque.livro_id, Estoque.quantidade).where(Estoque.livro_id.in_(livros))
+                ).all())
+                vendidos = dict(db.session.execute(
+                    select(VendaItem.livro_id, func.sum(VendaItem.quantidade))
+                    .where(VendaItem.livro_id.in_(livros)).group_by(VendaItem.livro_id)
+                ).all())
+            erros = len(resultados) - status[302] - status[409]
+            esperado = min(vendas, estoque_inicial)
+            consistente = all(
+                finais[livro_id] == estoque_inicial - vendidos.get(livro_id, 0) >= 0 for livro_id in livros
+            ) and status[302] == esperado and not erros
+            falhas += not consistente
+            print(f'{nome:<12} {status[302]:8d} {status[409]:8d} {erros:6d} {len(resultados) / duracao:9.1f} '
+                  f'{percentil(latencias, 50):6.1f}ms {percentil(latencias, 95):6.1f}ms  '
+                  f'{finais} {"ok" if consistente else "INCONSISTENTE"}')
+    finally:
+        servidor.shutdown()
+    if falhas:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
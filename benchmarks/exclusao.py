@@ -0,0 +1,194 @@
+"""Benchmark e verificação da exclusão em lote (exclusao.py, POST /<tipo>/deletar).
+
+Mede a exclusão de vendas pelo ORM, uma a uma (db.session.delete, como as
+rotas deletar_* faziam), contra o POST em lote, e confere as regras:
+  - vendas: arquivadas bloqueadas, inexistentes relatadas, itens excluídos,
+    outbox gravado (rollup.verificar() sem divergências após o worker) e
+    total do dashboard ajustado;
+  - livros: com vendas (inclusive só arquivadas) bloqueados; os demais
+    saem com vínculos e estoque;
+  - clientes: com vendas (inclusive só arquivadas) bloqueados; os demais
+    saem com a segmentação;
+  - autores: saem com vínculos e métricas;
+  - a contagem em cache de cada listagem é descartada, a listagem de livros
+    muda de ETag e as rotas de um registro seguem as mesmas regras (livro
+    com vendas não é excluído);
+  - ids inválidos e corpo JSON que não é um objeto são recusados (400).
+
+Uso: python -m benchmarks.exclusao [vendas] [excluidas]
+"""
+import os
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+os.environ.setdefault('LOG_AMOSTRAGEM', '0')
+
+from sqlalchemy import func, insert, select
+
+from benchmarks.comum import preparar_app, login
+from benchmarks.dados import semear_catalogo, semear_vendas
+
+
+def verificar(condicao, mensagem):
+    if not condicao:
+        raise SystemExit(f'FALHOU: {mensagem}')
+    print(f'ok  {mensagem}')
+
+
+def contar(consulta):
+    from models import db
+    return db.session.scalar(select(func.count()).select_from(consulta.subquery()))
+
+
+def excluir_em_lote(cliente, tipo, **corpo):
+    """POST /<tipo>/deletar depois de abrir a listagem; confere que a contagem em cache foi descartada"""
+    import paginacao
+    cliente.get(f'/{tipo}')
+    em_cache = tipo in paginacao._contagens
+    relatorio = cliente.post(f'/{tipo}/deletar', **corpo).get_json()
+    verificar(em_cache and tipo not in paginacao._contagens, f'{tipo}: contagem da listagem descartada')
+    return relatorio
+
+
+def sem_divergencias():
+    import rollup
+    from flask import current_app
+    while rollup.processar_lote(current_app.config['ROLLUP_TAMANHO_LOTE']):
+        pass
+    relatorio = rollup.verificar()
+    relatorio.pop('eventos_pendentes')
+    return not any(resultado['divergentes'] for resultado in relatorio.values())
+
+
+def main():
+    vendas = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    excluidas = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    app = preparar_app()
+    app.config['PERFILAMENTO_SQL_LENTA_MS'] = float('inf')
+
+    import rollup
+    from arquivamento import arquivar_vendas
+    from estatisticas import _calcular, invalidar_estatisticas, obter_estatisticas
+    from models import (
+        db, Autor, Cliente, Estoque, Livro, MetricaAutor, SegmentacaoCliente, Venda, VendaArquivada,
+        VendaItem, VendaItemArquivado, livro_autor
+    )
+    hoje = date.today()
+    with app.app_context():
+        semear_catalogo(5000, 500)
+        semear_vendas(vendas, 2000, inicio=hoje - timedelta(days=1824), dias=1825)
+        # Livros e clientes sem vendas, para excluir
+        novos = db.session.scalars(insert(Livro).returning(Livro.livro_id), [
+            {'titulo': f'Sem vendas {i}', 'isbn': f'979{i:010d}'} for i in range(20)
+        ]).all()
+        autor = db.session.scalar(select(func.min(Autor.autor_id)))
+        db.session.execute(insert(livro_autor), [{'livro_id': livro_id, 'autor_id': autor} for livro_id in novos])
+        db.session.execute(insert(Cliente), [
+            {'nome': f'Sem compras {i}', 'email': f'sem.compras{i}@exemplo.com.br'} for i in range(20)
+        ])
+        db.session.execute(insert(Estoque).from_select(['livro_id', 'quantidade'], select(Livro.livro_id, 50)))
+        db.session.commit()
+        rollup.reconstruir()
+        arquivar_vendas(rollup.meses_atras(hoje, 24).replace(day=1), informar=lambda _: None)
+        recentes = db.session.scalars(select(Venda.venda_id).order_by(Venda.venda_id.desc())).all()
+        arquivada = db.session.scalar(select(func.min(VendaArquivada.venda_id)))
+
+    cliente = app.test_client()
+    login(cliente)
+    cliente.get('/livros')  # Descarta a mensagem flash do login
+
+    # ORM, uma a uma (comportamento anterior de deletar_venda)
+    with app.app_context():
+        inicio = time.perf_counter()
+        for venda_id in recentes[:excluidas]:
+            db.session.delete(db.session.get(Venda, venda_id))
+            db.session.commit()
+        orm = time.perf_counter() - inicio
+        invalidar_estatisticas()  # O laço acima não ajusta o cache do dashboard
+        obter_estatisticas()
+
+    lote = recentes[excluidas:2 * excluidas]
+    inicio = time.perf_counter()
+    resposta = cliente.post('/vendas/deletar', json={'ids': lote + [arquivada, 10 ** 9]})
+    em_lote = time.perf_counter() - inicio
+    relatorio = resposta.get_json()
+    print(f'{excluidas} vendas: ORM uma a uma {orm:.2f}s ({excluidas / orm:.0f}/s), '
+          f'POST em lote {em_lote:.2f}s ({excluidas / em_lote:.0f}/s)\n')
+
+    with app.app_context():
+        verificar(relatorio['total_excluidos'] == len(lote) and relatorio['nao_encontrados'] == [10 ** 9] and
+                  relatorio['bloqueados'] == [{'id': arquivada, 'motivo': 'Venda arquivada'}],
+                  'vendas: excluídas, arquivada bloqueada e inexistente relatada')
+        verificar(contar(select(VendaItem.item_id).where(VendaItem.venda_id.in_(lote))) == 0,
+                  'vendas: itens excluídos')
+        verificar(sem_divergencias(), 'vendas: rollup.verificar() sem divergências após o worker')
+        verificar(obter_estatisticas()['total_vendas'] == Decimal(_calcular()['total_vendas']) / 100,
+                  'vendas: total do dashboard ajustado')
+
+        vendidos = db.session.scalars(select(VendaItem.livro_id).distinct().limit(20)).all()
+        vendidos += db.session.scalars(  # Só com vendas arquivadas
+            select(VendaItemArquivado.livro_id).distinct()
+            .where(VendaItemArquivado.livro_id.not_in(select(VendaItem.livro_id))).limit(5)
+        ).all()
+        sem_vendas = db.session.scalars(
+            select(Livro.livro_id).where(Livro.livro_id.not_in(select(VendaItem.livro_id)),
+                                         Livro.livro_id.not_in(select(VendaItemArquivado.livro_id))).limit(20)
+        ).all()
+        com_compras = db.session.scalars(select(Venda.cliente_id).distinct().limit(20)).all()
+        com_compras += db.session.scalars(
+            select(VendaArquivada.cliente_id).distinct()
+            .where(VendaArquivada.cliente_id.not_in(select(Venda.cliente_id))).limit(5)
+        ).all()
+        sem_compras = db.session.scalars(
+            select(Cliente.cliente_id).where(Cliente.cliente_id.not_in(select(Venda.cliente_id)),
+                                             Cliente.cliente_id.not_in(select(VendaArquivada.cliente_id))).limit(20)
+        ).all()
+        autores = db.session.scalars(select(MetricaAutor.autor_id).limit(20)).all()
+
+    etag = cliente.get('/livros').headers['ETag']
+    relatorio = excluir_em_lote(cliente, 'livros', data={'ids': vendidos + sem_vendas})
+    with app.app_context():
+        verificar(sorted(relatorio['excluidos']) == sorted(sem_vendas) and
+                  {bloqueio['id'] for bloqueio in relatorio['bloqueados']} == set(vendidos),
+                  f'livros: {len(sem_vendas)} excluídos, {len(vendidos)} com vendas bloqueados')
+        verificar(contar(select(livro_autor).where(livro_autor.c.livro_id.in_(sem_vendas))) == 0 and
+                  contar(select(Estoque.livro_id).where(Estoque.livro_id.in_(sem_vendas))) == 0,
+                  'livros: vínculos e estoque excluídos')
+    verificar(cliente.get('/livros', headers={'If-None-Match': etag}).status_code == 200,
+              'livros: listagem com novo ETag')
+
+    relatorio = excluir_em_lote(cliente, 'clientes', json={'ids': com_compras + sem_compras})
+    with app.app_context():
+        verificar(sorted(relatorio['excluidos']) == sorted(sem_compras) and
+                  relatorio['total_bloqueados'] == len(com_compras),
+                  f'clientes: {len(sem_compras)} excluídos, {len(com_compras)} com vendas bloqueados')
+        verificar(contar(select(SegmentacaoCliente.cliente_id)
+                         .where(SegmentacaoCliente.cliente_id.in_(sem_compras))) == 0,
+                  'clientes: segmentação excluída')
+
+    relatorio = excluir_em_lote(cliente, 'autores', json={'ids': autores})
+    with app.app_context():
+        verificar(relatorio['total_excluidos'] == len(autores) and
+                  contar(select(Autor.autor_id).where(Autor.autor_id.in_(autores))) == 0 and
+                  contar(select(livro_autor).where(livro_autor.c.autor_id.in_(autores))) == 0 and
+                  contar(select(MetricaAutor.autor_id).where(MetricaAutor.autor_id.in_(autores))) == 0,
+                  'autores: excluídos com vínculos e métricas')
+        verificar(sem_divergencias(), 'rollup.verificar() sem divergências ao final')
+        calculados = _calcular()
+        verificar(obter_estatisticas() == {**calculados, 'total_vendas': Decimal(calculados['total_vendas']) / 100},
+                  'dashboard igual ao recálculo')
+
+    resposta = cliente.post(f'/livros/{vendidos[0]}/deletar')
+    verificar(resposta.status_code == 302 and 'Livro com vendas' in cliente.get('/livros').get_data(as_text=True),
+              'rota de um livro: livro com vendas não é excluído e o motivo é exibido')
+    verificar(cliente.post(f'/vendas/{lote[0]}/deletar').status_code == 404, 'rota de uma venda: 404 se já excluída')
+    verificar(cliente.post('/vendas/deletar', json={'ids': ['x']}).status_code == 400, 'ids inválidos recusados')
+    verificar(cliente.post('/vendas/deletar', json=[1, 2]).status_code == 400 and
+              cliente.post('/vendas/deletar', json={'ids': '12'}).status_code == 400,
+              'corpo JSON sem a lista de ids recusado')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Benchmark das exportações em streaming (/exportar/<tipo>).
+
+Mede o tempo até o primeiro byte, o tempo total e o crescimento do RSS
+durante cada exportação. Ao final, compara com a montagem do CSV completo
+em memória (o que a exportação em streaming evita).
+
+Uso: python -m benchmarks.exportacao [vendas] [livros]
+"""
+import csv
+import io
+import os
+import resource
+import sys
+import time
+
+from benchmarks.comum import preparar_app, login
+from benchmarks.dados import semear_catalogo, semear_vendas
+
+
+def rss_mb():
+    """RSS atual do processo (Linux); nos demais sistemas, o pico registrado"""
+    try:
+        with open('/proc/self/statm') as arquivo:
+            return int(arquivo.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def medir(cliente, url):
+    base = rss_mb()
+    pico = base
+    inicio = time.perf_counter()
+    resposta = cliente.get(url, buffered=False)
+    primeiro_byte = None
+    tamanho = 0
+    for bloco in resposta.response:
+        if primeiro_byte is None:
+            primeiro_byte = time.perf_counter() - inicio
+        tamanho += len(bloco)
+        pico = max(pico, rss_mb())
+    resposta.close()
+    total = time.perf_counter() - inicio
+    print(f'{url:<50} TTFB {primeiro_byte * 1000:8.1f} ms | total {total:6.2f} s | '
+          f'{tamanho / 2 ** 20:7.1f} MB | RSS +{pico - base:5.1f} MB')
+
+
+def main():
+    vendas = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    livros = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    app = preparar_app()
+
+    with app.app_context():
+        semear_catalogo(livros=livros, autores=max(livros // 20, 10))
+        semear_vendas(vendas=vendas, clientes=max(vendas // 20, 10))
+    print(f'Dados: {vendas} vendas, {livros} livros\n')
+
+    cliente = app.test_client()
+    login(cliente)
+    for url in (
+        '/exportar/vendas?inicio=2024-01-01&fim=2024-01-31',
+        '/exportar/vendas?inicio=2024-01-01&fim=2024-12-31',
+        '/exportar/vendas',
+        '/exportar/vendas?formato=jsonl',
+        '/exportar/vendas?gzip=1',
+        '/exportar/clientes',
+        '/exportar/catalogo',
+    ):
+        medir(cliente, url)
+
+    # Referência: mesmo conteúdo de /exportar/vendas montado em memória
+    from exportacao import _vendas, COLUNAS_VENDAS
+    with app.app_context():
+        base = rss_mb()
+        inicio = time.perf_counter()
+        linhas = list(_vendas(None, None, app.config['EXPORTACAO_YIELD_PER']))
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer, lineterminator='\n')
+        escritor.writerow(COLUNAS_VENDAS)
+        escritor.writerows(linhas)
+        conteudo = buffer.getvalue().encode('utf-8')
+        total = time.perf_counter() - inicio
+        print(f'\n{"vendas em memória (referência)":<50} TTFB {total * 1000:8.1f} ms | '
+              f'total {total:6.2f} s | {len(conteudo) / 2 ** 20:7.1f} MB | RSS +{rss_mb() - base:5.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Benchmark do cache de identidades do user_loader.
+
+Compara consultas SQL e latência por requisição autenticada com o cache
+desativado e ativado, e confere a invalidação entre workers: uma alteração
+confirmada em outro processo (is_admin removido) vale na requisição
+seguinte, com a identidade ainda no cache local; uma alteração desfeita
+(rollback) não invalida o cache.
+
+Uso: python -m benchmarks.identidades [repeticoes]
+"""
+import multiprocessing
+import statistics
+import sys
+
+from benchmarks.comum import preparar_app, registrar_consultas, login, cronometrar
+
+
+def medir(app, contagens, maximo, repeticoes):
+    from identidades import cache_identidades
+    cache_identidades.maximo = maximo
+    cache_identidades.limpar()
+
+    cliente = app.test_client()
+    login(cliente)
+    cliente.get('/')  # Aquece o cache de estatísticas
+    contagens.clear()
+    tempos = cronometrar(lambda: cliente.get('/'), repeticoes)
+    return statistics.mean(contagens), statistics.median(tempos)
+
+
+def verificar(condicao, mensagem):
+    if not condicao:
+        raise SystemExit(f'FALHOU: {mensagem}')
+    print(f'ok  {mensagem}')
+
+
+def alterar_admin(app, is_admin):
+    """Altera o admin em outro processo (outro worker, com o próprio cache)"""
+    def alterar():
+        from models import db, Usuario
+        with app.app_context():
+            usuario = db.session.execute(db.select(Usuario).filter_by(username='admin')).scalar_one()
+            usuario.is_admin = is_admin
+            db.session.commit()
+
+    filho = multiprocessing.get_context('fork').Process(target=alterar)
+    filho.start()
+    filho.join()
+    assert filho.exitcode == 0, 'Falha ao alterar o usuário no outro processo'
+
+
+def invalidacao(app, contagens):
+    from identidades import cache_identidades
+    from models import db, Usuario
+    cache_identidades.maximo = app.config['IDENTIDADES_CACHE_MAX']
+    cache_identidades.limpar()
+
+    cliente = app.test_client()
+    login(cliente)
+    cliente.get('/')
+    verificar(cliente.get('/metricas/pool').status_code == 200, 'admin acessa /metricas/pool')
+
+    with app.app_context():
+        usuario = db.session.execute(db.select(Usuario).filter_by(username='admin')).scalar_one()
+        usuario.is_admin = False
+        db.session.flush()
+        db.session.rollback()
+    contagens.clear()
+    cliente.get('/metricas/pool')
+    verificar(contagens == [0], 'alteração desfeita não invalida o cache (requisição sem consultas)')
+
+    alterar_admin(app, False)
+    verificar(cliente.get('/metricas/pool').status_code == 403,
+              'is_admin removido em outro processo vale na requisição seguinte')
+    alterar_admin(app, True)
+    verificar(cliente.get('/metricas/pool').status_code == 200, 'is_admin restaurado em outro processo')
+    print()
+
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    app = preparar_app()
+    contagens = registrar_consultas(app)
+    invalidacao(app, contagens)
+
+    sem_cache = medir(app, contagens, 0, repeticoes)
+    com_cache = medir(app, contagens, app.config['IDENTIDADES_CACHE_MAX'], repeticoes)
+
+    print(f'GET / x{repeticoes}')
+    print(f'  sem cache: {sem_cache[0]:.2f} consultas/req, mediana {sem_cache[1]:.3f} ms')
+    print(f'  com cache: {com_cache[0]:.2f} consultas/req, mediana {com_cache[1]:.3f} ms')
+    print(f'  diferença: {sem_cache[0] - com_cache[0]:.2f} consultas/req')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Benchmark da inicialização a frio de um worker.
+
+Cada medição roda em um interpretador novo (como um worker recém-iniciado)
+e separa o tempo de importar app.py, de create_app() e da primeira
+requisição (GET /login). Também confere que numpy/scipy não são carregados
+antes da primeira recomendação.
+
+Termina com código 1 se a mediana de importação + create_app() passar da
+meta (em ms).
+
+Uso: python -m benchmarks.inicializacao [execucoes] [meta_ms]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+import benchmarks.comum  # noqa: F401 (DATABASE_URL temporária, herdada pelos subprocessos)
+
+META_MS = 700  # Flask + SQLAlchemy sozinhos levam ~550 ms na máquina de referência
+
+WORKER = """
+import json, sys, time
+inicio = time.perf_counter()
+from app import create_app
+importado = time.perf_counter()
+app = create_app()
+criado = time.perf_counter()
+resposta = app.test_client().get('/login')
+respondido = time.perf_counter()
+assert resposta.status_code == 200, resposta.status_code
+print(json.dumps({
+    'importacao': (importado - inicio) * 1000,
+    'create_app': (criado - importado) * 1000,
+    'primeira_requisicao': (respondido - criado) * 1000,
+    'numpy': 'numpy' in sys.modules,
+    'scipy': 'scipy' in sys.modules,
+}))
+"""
+
+
+def medir():
+    ambiente = dict(os.environ, LOG_AMOSTRAGEM='0')
+    ambiente.setdefault('RATELIMIT_STORAGE_URI', 'mmap://' + os.path.join(tempfile.mkdtemp(), 'limites.mmap'))
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    saida = subprocess.run(
+        [sys.executable, '-c', WORKER], cwd=raiz, env=ambiente,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def main():
+    execucoes = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    meta = float(sys.argv[2]) if len(sys.argv) > 2 else META_MS
+
+    medicoes = [medir() for _ in range(execucoes)]
+    for etapa in ('importacao', 'create_app', 'primeira_requisicao'):
+        tempos = sorted(medicao[etapa] for medicao in medicoes)
+        print(f'{etapa:<20} mediana {statistics.median(tempos):7.1f} ms | máx {tempos[-1]:7.1f} ms')
+
+    inicializacao = statistics.median(medicao['importacao'] + medicao['create_app'] for medicao in medicoes)
+    carregados = [nome for nome in ('numpy', 'scipy') if any(medicao[nome] for medicao in medicoes)]
+    print(f'\nimportação + create_app(): {inicializacao:.1f} ms (meta: {meta:.0f} ms)')
+    print('numpy/scipy carregados na inicialização: ' + (', '.join(carregados) or 'nenhum'))
+    if inicializacao > meta or carregados:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
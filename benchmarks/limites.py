@@ -0,0 +1,88 @@
+"""Benchmark do armazenamento de rate limit compartilhado (mmap://).
+
+1. Custo de hit() por chamada, comparando memory:// e mmap://, com janela
+   fixa e móvel.
+2. Vários processos enviando POST /login ao mesmo tempo, do mesmo IP: com
+   mmap:// o total aceito deve ser o limite da rota (5 por minuto), e não
+   5 vezes o número de processos. A verificação falha se o total for outro.
+
+Uso: python -m benchmarks.limites [repeticoes] [processos] [tentativas_por_processo]
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+
+os.environ.setdefault(
+    'RATELIMIT_STORAGE_URI', 'mmap://' + os.path.join(tempfile.mkdtemp(), 'limites.mmap')
+)
+
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter, MovingWindowRateLimiter
+
+import limites_compartilhados  # noqa: F401 (registra mmap://)
+from benchmarks.comum import preparar_app, cronometrar
+
+LIMITE_LOGIN = 5  # @limiter.limit("5 per minute") de /login
+
+
+def microbenchmark(repeticoes):
+    limite = parse('1000000 per minute')
+    limite_movel = parse('60 per minute')
+    for uri in ('memory://', os.environ['RATELIMIT_STORAGE_URI']):
+        armazenamento = storage_from_string(uri)
+        for nome, estrategia, item in (
+            ('janela fixa', FixedWindowRateLimiter(armazenamento), limite),
+            ('janela móvel', MovingWindowRateLimiter(armazenamento), limite_movel),
+        ):
+            chaves = iter(range(repeticoes))
+            tempos = cronometrar(lambda: estrategia.hit(item, 'ip', str(next(chaves) % 500)), repeticoes)
+            tempos.sort()
+            print(f'{uri.split(":")[0]:<7} {nome:<13} hit() p50 {tempos[len(tempos) // 2] * 1000:6.1f} µs | '
+                  f'p99 {tempos[int(len(tempos) * 0.99)] * 1000:6.1f} µs')
+        armazenamento.reset()
+
+
+def tentar_logins(app, tentativas, fila):
+    cliente = app.test_client()
+    aceitas = 0
+    for _ in range(tentativas):
+        resposta = cliente.post('/login', data={'username': 'inexistente', 'password': 'x'})
+        aceitas += resposta.status_code != 429
+    fila.put(aceitas)
+
+
+def concorrencia(processos, tentativas):
+    app = preparar_app()
+    from app import limiter
+    limiter.enabled = True
+    limiter.reset()
+
+    contexto = multiprocessing.get_context('fork')
+    fila = contexto.Queue()
+    filhos = [contexto.Process(target=tentar_logins, args=(app, tentativas, fila)) for _ in range(processos)]
+    for filho in filhos:
+        filho.start()
+    aceitas = sum(fila.get() for _ in filhos)
+    for filho in filhos:
+        filho.join()
+    print(f'\n{processos} processos x {tentativas} POST /login ({app.config["RATELIMIT_STORAGE_URI"].split(":")[0]}): '
+          f'{aceitas} aceitas, {processos * tentativas - aceitas} bloqueadas '
+          f'(limite da rota: {LIMITE_LOGIN} por minuto)')
+    esperadas = min(LIMITE_LOGIN, processos * tentativas)
+    if aceitas != esperadas:
+        raise SystemExit(f'FALHOU: {aceitas} tentativas aceitas entre os processos, esperado {esperadas}')
+    print(f'ok  limite compartilhado entre os {processos} processos')
+
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    processos = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    tentativas = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    microbenchmark(repeticoes)
+    concorrencia(processos, tentativas)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Verificação do orçamento de consultas SQL das rotas (monitoramento.limite_consultas).
+
+Com TESTING ligado, verificar_orcamento levanta OrcamentoSQLExcedido
+quando uma rota passa do seu limite. Renderiza o dashboard, as listagens
+(primeira página, página por número e página seguinte pelo cursor), as
+sugestões, a busca e a API JSON (listagem e registro, com todas as
+inclusões) com várias linhas por página. Antes de cada requisição os
+caches são esvaziados (identidades, fragmentos, contagens e estatísticas),
+para contar o pior caso. Um N+1 introduzido em um template ou em uma
+consulta faz esta verificação falhar.
+
+Uso: python -m benchmarks.orcamento [livros] [vendas] [por_pagina]
+"""
+import os
+import re
+import sys
+
+os.environ.setdefault('LOG_AMOSTRAGEM', '0')
+
+from benchmarks.comum import preparar_app, login, registrar_consultas
+from benchmarks.dados import semear_catalogo, semear_vendas
+
+
+def limpar_caches(app):
+    import cache_http
+    import paginacao
+    from estatisticas import invalidar_estatisticas
+    from identidades import cache_identidades
+    cache_identidades.limpar()
+    cache_http.cache_fragmentos.limpar()
+    paginacao._contagens.clear()
+    with app.app_context():
+        invalidar_estatisticas()
+
+
+def rotas(cliente, por_pagina):
+    """Rotas com orçamento, incluindo a página seguinte das listagens com cursor"""
+    import api
+    listagens = [f'/{nome}?por_pagina={por_pagina}' for nome in ('autores', 'livros', 'clientes', 'vendas')]
+    yield '/'
+    for rota in listagens:
+        yield rota
+        yield rota + '&pagina=3'
+        pagina = cliente.get(rota).get_data(as_text=True).replace('&amp;', '&')
+        cursor = re.search(r'cursor=([^"&]+)', pagina)
+        if cursor:
+            yield f'{rota}&cursor={cursor.group(1)}'
+    yield '/autores/sugestoes?q=a'
+    yield '/livros/sugestoes?q=amor'
+    yield '/clientes/sugestoes?q=ana'
+    yield '/livros/busca?q=amor'
+    for nome, recurso in api.RECURSOS.items():
+        yield f'/api/v1/{nome}?por_pagina={por_pagina}'
+        yield f'/api/v1/{nome}/1'
+        if recurso.inclusoes:
+            incluir = ','.join(recurso.inclusoes)
+            yield f'/api/v1/{nome}?por_pagina={por_pagina}&include={incluir}'
+            yield f'/api/v1/{nome}/1?include={incluir}'
+
+
+def main():
+    livros = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    vendas = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    por_pagina = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    app = preparar_app()
+    app.config['PERFILAMENTO_SQL_LENTA_MS'] = float('inf')
+    consultas = registrar_consultas(app)
+
+    from monitoramento import OrcamentoSQLExcedido
+    with app.app_context():
+        semear_catalogo(livros, max(livros // 10, 1))
+        semear_vendas(vendas, max(vendas // 10, 1))
+
+    cliente = app.test_client()
+    login(cliente)
+    cliente.get('/livros')  # Descarta a mensagem flash do login
+
+    todas = list(rotas(cliente, por_pagina))  # Cursores lidos antes de ligar a verificação
+    app.testing = True  # Liga verificar_orcamento
+    falhas = []
+    for rota in todas:
+        limpar_caches(app)
+        consultas.clear()
+        try:
+            status = cliente.get(rota).status_code
+        except OrcamentoSQLExcedido as e:
+            falhas.append(rota)
+            print(f'FALHOU {rota}: {e}')
+            continue
+        view = app.view_functions[app.url_map.bind('').match(rota.split('?')[0])[0]]
+        print(f'{status}  {consultas[-1]}/{view.limite_consultas} SQL  {rota[:90]}')
+        if status != 200:
+            falhas.append(rota)
+    if falhas:
+        raise SystemExit(f'FALHOU: {len(falhas)} rota(s) fora do orçamento ou com erro')
+    print('\nok  todas as rotas dentro do orçamento de consultas')
+
+
+if __name__ == '__main__':
+    main()
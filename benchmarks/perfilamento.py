@@ -0,0 +1,56 @@
+"""Benchmark do custo do perfilamento de SQL por requisição.
+
+Mede a mediana de latência de algumas rotas com o perfilamento desligado e
+ligado (Server-Timing, tempos por instrução e histogramas), alternando os
+dois estados em rodadas para diluir o ruído.
+
+Uso: python -m benchmarks.perfilamento [repeticoes] [livros] [vendas]
+"""
+import os
+import statistics
+import sys
+import tempfile
+
+os.environ.setdefault('LOG_AMOSTRAGEM', '0')
+os.environ.setdefault('PERFILAMENTO_ARQUIVO', os.path.join(tempfile.mkdtemp(), 'perfilamento'))
+
+from benchmarks.comum import preparar_app, login, cronometrar
+from benchmarks.dados import semear_catalogo, semear_vendas
+
+ROTAS = ('/', '/livros?por_pagina=50', '/vendas?por_pagina=50', '/livros/sugestoes?q=amor', '/clientes/novo')
+RODADAS = 5
+
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    livros = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    vendas = int(sys.argv[3]) if len(sys.argv) > 3 else 10000
+    app = preparar_app()
+    app.config['PERFILAMENTO_SQL_LENTA_MS'] = float('inf')  # Mede o perfil, não a escrita do log
+    with app.app_context():
+        semear_catalogo(livros, max(livros // 10, 1))
+        semear_vendas(vendas, max(vendas // 10, 1))
+
+    from perfilamento import interruptor
+    cliente = app.test_client()
+    login(cliente)
+
+    tempos = {(rota, ativo): [] for rota in ROTAS for ativo in (False, True)}
+    for _ in range(RODADAS):
+        for ativo in (False, True):
+            with app.app_context():
+                interruptor.definir(app, ativo)
+            for rota in ROTAS:
+                cliente.get(rota)
+                tempos[rota, ativo] += cronometrar(lambda: cliente.get(rota), repeticoes // RODADAS)
+
+    print(f'{"rota":<28} {"desligado":>10} {"ligado":>10} {"custo":>10}')
+    for rota in ROTAS:
+        desligado = statistics.median(tempos[rota, False])
+        ligado = statistics.median(tempos[rota, True])
+        print(f'{rota:<28} {desligado:8.3f}ms {ligado:8.3f}ms {(ligado - desligado) * 1000:+7.0f} µs '
+              f'({(ligado - desligado) / desligado * 100:+.1f}%)')
+
+
+if __name__ == '__main__':
+    main()
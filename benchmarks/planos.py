@@ -0,0 +1,273 @@
+"""Regressão de planos de execução: nenhuma consulta-chave pode varrer uma tabela grande.
+
+Semeia um volume grande de dados (benchmarks/dados.py), recalcula os
+agregados de rollup.py, atualiza as estatísticas com ANALYZE e confere:
+  - as instruções que a própria aplicação executa, capturadas no Engine
+    enquanto cada ação roda (rotas pelo cliente de teste, relacionamentos
+    do ORM e o worker de rollup): listagens keyset (HTML e API, com
+    inclusões), exportação e análises por período, sugestões, busca no
+    catálogo e recálculo de clientes. Cada ação roda uma vez antes da
+    captura (índice de busca, contagens e sessão já carregados) e os caches
+    de fragmentos e de análises são esvaziados antes dela. Cada instrução é
+    explicada com os mesmos parâmetros: EXPLAIN QUERY PLAN no SQLite e
+    EXPLAIN (FORMAT JSON) no PostgreSQL;
+  - no PostgreSQL, as funções de base.sql (que precisam estar instaladas).
+    EXPLAIN não mostra o plano das consultas internas de uma função, então
+    a varredura é detectada pelo contador seq_scan de pg_stat_user_tables.
+Cada verificação pode liberar tabelas que a consulta lê por inteiro por
+natureza (ex.: o ramo por gênero de sp_recomendacoes_cliente). Termina com
+status 1 se alguma consulta fizer varredura sequencial de outra tabela.
+
+Uso: python -m benchmarks.planos [livros] [vendas] [clientes]
+"""
+import json
+import os
+import re
+import sys
+import time
+from datetime import date, timedelta
+
+os.environ.setdefault('LOG_AMOSTRAGEM', '0')
+
+from sqlalchemy import event, func, insert, select
+from sqlalchemy.engine import Engine
+
+from benchmarks.comum import preparar_app, login
+from benchmarks.dados import semear_catalogo, semear_vendas
+
+FIM = date(2024, 12, 31)
+TABELAS_GRANDES = {
+    'autores', 'livros', 'livro_autor', 'clientes', 'vendas', 'venda_itens', 'estoque',
+    'vendas_diarias', 'vendas_diarias_autores', 'vendas_mensais', 'vendas_mensais_autores',
+    'metricas_autores', 'segmentacao_clientes',
+}
+INSTRUCOES = re.compile(r'\s*(SELECT|WITH|INSERT|UPDATE|DELETE)\b', re.IGNORECASE)
+
+
+def capturar(acao):
+    """Instruções (SQL, parâmetros) executadas pela ação, sem repetições e sem executemany"""
+    instrucoes = {}
+
+    def registrar(conexao, cursor, sql, parametros, contexto, executemany):
+        if not executemany and INSTRUCOES.match(sql):
+            instrucoes.setdefault((sql, repr(parametros)), (sql, parametros))
+
+    event.listen(Engine, 'before_cursor_execute', registrar)
+    try:
+        acao()
+    finally:
+        event.remove(Engine, 'before_cursor_execute', registrar)
+    return list(instrucoes.values())
+
+
+def cursor_da_pagina(cliente, rota):
+    """Cursor do link "próxima" de uma listagem HTML"""
+    html = cliente.get(rota).get_data(as_text=True).replace('&amp;', '&')
+    return re.findall(r'cursor=([^"&]+)', html)[-1]
+
+
+def acoes(app, cliente, amostra):
+    """(nome, preparação, ação, tabelas liberadas) com o código da aplicação"""
+    import rollup
+    from models import db, Autor, Cliente, Livro, Venda
+
+    def rota(url):
+        def requisitar():
+            resposta = cliente.get(url)
+            assert resposta.status_code == 200, f'{url}: {resposta.status_code}'
+            resposta.get_data()  # Consome respostas transmitidas em blocos (exportação)
+        return requisitar
+
+    def relacionamento(modelo, id, nome):
+        def carregar():
+            db.session.expunge_all()
+            getattr(db.session.get(modelo, id), nome)  # Carregamento lazy, como nos templates
+        return carregar
+
+    def excluir_venda():
+        venda_id = db.session.scalar(
+            select(func.max(Venda.venda_id)).where(Venda.cliente_id == amostra['cliente_id'])
+        )
+        assert cliente.post(f'/vendas/{venda_id}/deletar').status_code == 302
+
+    def processar_eventos():
+        while rollup.processar_lote(app.config['ROLLUP_TAMANHO_LOTE']):
+            pass
+
+    periodo = f"inicio={(FIM - timedelta(days=29)).isoformat()}&fim={FIM.isoformat()}"
+    trimestre = f"inicio={(FIM - timedelta(days=77)).isoformat()}&fim={FIM.isoformat()}"  # Dias avulsos + meses
+    api = lambda recurso, incluir='': rota(
+        f"/api/v1/{recurso}?por_pagina=10&cursor={amostra['cursores'][recurso]}" + (f'&include={incluir}' if incluir else '')
+    )
+    return [
+        ('vendas de um cliente (Cliente.vendas)', None,
+         relacionamento(Cliente, amostra['cliente_id'], 'vendas'), set()),
+        ('itens de um livro (Livro.vendas_itens, FK)', None,
+         relacionamento(Livro, amostra['livro_id'], 'vendas_itens'), set()),
+        ('livros de um autor (Autor.livros, FK)', None,
+         relacionamento(Autor, amostra['autor_id'], 'livros'), set()),
+        ('listagem de vendas (keyset, itens da página)', None,
+         rota(f"/vendas?por_pagina=10&cursor={amostra['cursores']['vendas_html']}"), set()),
+        ('listagem de livros (keyset)', None,
+         rota(f"/livros?por_pagina=10&cursor={amostra['cursores']['livros_html']}"), set()),
+        ('API: autores (keyset) + livros', None, api('autores', 'livros'), set()),
+        ('API: livros (keyset) + autores', None, api('livros', 'autores'), set()),
+        ('API: clientes (keyset)', None, api('clientes'), set()),
+        ('API: vendas (keyset) + itens, cliente', None, api('vendas', 'itens,cliente'), set()),
+        ('exportação de vendas (30 dias)', None, rota(f'/exportar/vendas?{periodo}'), set()),
+        ('análise: receita diária (30 dias)', None, rota(f'/analises/receita?{periodo}'), set()),
+        ('análise: receita mensal (dias e meses)', None,
+         rota(f'/analises/receita?{trimestre}&granularidade=mes'), set()),
+        ('análise: gêneros (dias e meses)', None, rota(f'/analises/generos?{trimestre}'), set()),
+        ('análise: autores (dias e meses)', None, rota(f'/analises/autores?{trimestre}'), set()),
+        ('sugestões de autores', None, rota('/autores/sugestoes?q=clar'), set()),
+        ('sugestões de livros (título e ISBN)', None,
+         rota(f"/livros/sugestoes?q={amostra['isbn']}"), set()),
+        ('sugestões de clientes', None, rota('/clientes/sugestoes?q=ana'), set()),
+        ('busca no catálogo', None, rota('/livros/busca?q=saudade+sertão'), set()),  # Palavras de dados.py
+        ('busca no catálogo por ISBN', None, rota(f"/livros/busca?q={amostra['isbn']}"), set()),
+        ('busca por similaridade', None, rota('/livros/busca?q=sodade'), set()),  # Sem resultado na textual
+        ('worker de rollup (recálculo de cliente)', excluir_venda, processar_eventos, set()),
+    ]
+
+
+def funcoes(amostra):
+    """(nome, SQL, tabelas liberadas) das funções de base.sql (apenas PostgreSQL)"""
+    inicio, fim = (FIM - timedelta(days=29)).isoformat(), FIM.isoformat()
+    return [
+        ('sp_dashboard_vendas (30 dias)', f"SELECT * FROM sp_dashboard_vendas('{inicio}', '{fim}')", set()),
+        ('sp_analise_performance_autores (30 dias)',
+         f"SELECT * FROM sp_analise_performance_autores('{inicio}', '{fim}')", {'autores'}),
+        ('sp_recomendacoes_cliente',
+         f"SELECT * FROM sp_recomendacoes_cliente({amostra['cliente_id']})",
+         {'livros', 'livro_autor', 'autores'}),  # Ramo por gênero: lê boa parte do catálogo
+        ('sp_controle_estoque_alertas', 'SELECT * FROM sp_controle_estoque_alertas()',
+         {'estoque'}),  # quantidade <= estoque_minimo compara duas colunas da mesma linha
+    ]
+
+
+def varreduras_sqlite(conexao, sql, parametros=()):
+    detalhes = [linha[-1] for linha in conexao.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql, parametros)]
+    tabelas = set()
+    for detalhe in detalhes:
+        encontrado = re.match(r'SCAN (?:TABLE )?(\w+)(.*)', detalhe)
+        if encontrado and 'USING' not in encontrado.group(2):
+            tabelas.add(encontrado.group(1))
+    return tabelas, detalhes
+
+
+def varreduras_postgresql(conexao, sql, parametros=None):
+    plano = conexao.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + sql, parametros).scalar()
+    tabelas, detalhes, pendentes = set(), [], [plano[0]['Plan']]
+    while pendentes:
+        no = pendentes.pop()
+        detalhes.append(f"{no['Node Type']} {no.get('Relation Name', '')}".strip())
+        if no['Node Type'] == 'Seq Scan':
+            tabelas.add(no['Relation Name'])
+        pendentes.extend(no.get('Plans', []))
+    return tabelas, detalhes
+
+
+def varreduras_funcao(conexao, sql):
+    """Tabelas com seq_scan incrementado pela execução da função"""
+    def contadores():
+        conexao.exec_driver_sql('SELECT pg_stat_clear_snapshot()')
+        return dict(conexao.exec_driver_sql('SELECT relname, seq_scan FROM pg_stat_user_tables').all())
+
+    versao = int(conexao.exec_driver_sql('SHOW server_version_num').scalar())
+    antes = contadores()
+    conexao.commit()
+    conexao.exec_driver_sql(sql).all()
+    if versao >= 150000:
+        conexao.exec_driver_sql('SELECT pg_stat_force_next_flush()')
+    conexao.commit()
+    if versao < 150000:
+        time.sleep(1)  # Estatísticas enviadas ao coletor de forma assíncrona
+    depois = contadores()
+    conexao.commit()
+    return {tabela for tabela, total in depois.items() if total > antes.get(tabela, 0)}, []
+
+
+def main():
+    livros = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    vendas = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+    clientes = int(sys.argv[3]) if len(sys.argv) > 3 else 20000
+    app = preparar_app()
+    app.config['PERFILAMENTO_SQL_LENTA_MS'] = float('inf')
+
+    import analises
+    import cache_http
+    import rollup
+    from models import db, Cliente, Estoque, Livro, livro_autor
+    with app.app_context():
+        semear_catalogo(livros, max(livros // 10, 1))
+        semear_vendas(vendas, clientes, inicio=FIM - timedelta(days=1824), dias=1825)
+        # Poucos livros abaixo do mínimo, como em um estoque real
+        db.session.execute(insert(Estoque).from_select(
+            ['livro_id', 'quantidade', 'estoque_minimo'],
+            select(Livro.livro_id, 20 + Livro.livro_id % 200, 10 + Livro.livro_id % 7 * 5)
+        ))
+        db.session.commit()
+        rollup.reconstruir(hoje=FIM)  # Agregados lidos pelas análises
+        db.session.connection().exec_driver_sql('ANALYZE')
+        db.session.commit()
+        dialeto = db.session.get_bind().dialect.name
+        amostra = {
+            'cliente_id': db.session.scalar(select(func.min(Cliente.cliente_id))),
+            'livro_id': db.session.scalar(select(func.min(Livro.livro_id))),
+            'autor_id': db.session.scalar(select(func.min(livro_autor.c.autor_id))),
+            'isbn': db.session.scalar(select(Livro.isbn).offset(livros // 2).limit(1)),
+        }
+
+    cliente = app.test_client()
+    login(cliente)
+    amostra['cursores'] = {
+        f'{nome}_html': cursor_da_pagina(cliente, f'/{nome}?por_pagina=10') for nome in ('vendas', 'livros')
+    }
+    amostra['cursores'].update({
+        nome: json.loads(cliente.get(f'/api/v1/{nome}?por_pagina=10').get_data())['proximo_cursor']
+        for nome in ('autores', 'livros', 'clientes', 'vendas')
+    })
+
+    print(f'Banco {dialeto}: {livros} livros, {vendas} vendas, {clientes} clientes\n')
+    falhas = 0
+
+    def informar(nome, tabelas, liberadas, detalhes):
+        indevidas = sorted((tabelas & TABELAS_GRANDES) - liberadas)
+        print(f'{"FALHOU" if indevidas else "ok":<7} {nome}' + (f': varre {", ".join(indevidas)}' if indevidas else ''))
+        for detalhe in detalhes if indevidas else []:
+            print(f'          {detalhe}')
+        return bool(indevidas)
+
+    varrer = varreduras_postgresql if dialeto == 'postgresql' else varreduras_sqlite
+    with app.app_context():
+        for nome, preparar, acao, liberadas in acoes(app, cliente, amostra):
+            for captura in (False, True):
+                cache_http.cache_fragmentos.limpar()
+                analises.cache_analises.limpar()
+                if preparar:
+                    preparar()
+                instrucoes = capturar(acao) if captura else acao()
+            tabelas, detalhes = set(), []
+            with db.engine.connect() as conexao:
+                for sql, parametros in instrucoes:
+                    encontradas, plano = varrer(conexao, sql, parametros)
+                    tabelas |= encontradas
+                    if encontradas & TABELAS_GRANDES - liberadas:
+                        detalhes += [sql.strip().splitlines()[0][:100]] + plano
+            falhas += informar(f'{nome} ({len(instrucoes)} SQL)', tabelas, liberadas, detalhes)
+
+        if dialeto == 'postgresql':
+            conexao = db.session.connection()
+            for nome, sql, liberadas in funcoes(amostra):
+                falhas += informar(nome, varreduras_funcao(conexao, sql)[0], liberadas, [])
+            db.session.rollback()
+        else:
+            print('\nFunções de base.sql verificadas apenas no PostgreSQL')
+
+    if falhas:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
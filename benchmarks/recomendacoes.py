@@ -0,0 +1,142 @@
+"""Benchmark das recomendações por cliente (/clientes/<id>/recomendacoes).
+
+Compara o índice em memória (recomendacoes.py) com a consulta de
+sp_recomendacoes_cliente. No PostgreSQL com base.sql aplicado, chama o
+próprio procedimento; nos demais bancos executa o corpo dele adaptado às
+tabelas de models.py (venda_itens). Antes, confere o índice com um catálogo
+em que nenhum livro tem gênero e com vínculos e vendas de livros ausentes
+da leitura dos livros (criados durante a reconstrução ou livro_id NULL).
+
+Uso: python -m benchmarks.recomendacoes [vendas] [livros] [clientes_amostrados]
+"""
+import random
+import sys
+import time
+
+from sqlalchemy import text
+
+from benchmarks.comum import preparar_app, cronometrar
+from benchmarks.dados import semear_catalogo, semear_vendas
+
+SQL_PROCEDIMENTO = text('SELECT * FROM sp_recomendacoes_cliente(:cliente_id)')
+
+SQL_REFERENCIA = text("""
+    SELECT * FROM (
+        SELECT DISTINCT l.titulo, a.nome, l.genero,
+               (SELECT AVG(preco_unitario) FROM venda_itens WHERE livro_id = l.livro_id) AS preco_medio,
+               'Mesmo autor' AS motivo
+        FROM livros l
+        JOIN livro_autor la ON l.livro_id = la.livro_id
+        JOIN autores a ON la.autor_id = a.autor_id
+        WHERE la.autor_id IN (
+            SELECT DISTINCT la2.autor_id FROM venda_itens vi
+            JOIN vendas v ON vi.venda_id = v.venda_id
+            JOIN livro_autor la2 ON vi.livro_id = la2.livro_id
+            WHERE v.cliente_id = :cliente_id)
+        AND l.livro_id NOT IN (
+            SELECT vi.livro_id FROM venda_itens vi
+            JOIN vendas v ON vi.venda_id = v.venda_id
+            WHERE v.cliente_id = :cliente_id)
+        UNION ALL
+        SELECT DISTINCT l.titulo, a.nome, l.genero,
+               (SELECT AVG(preco_unitario) FROM venda_itens WHERE livro_id = l.livro_id) AS preco_medio,
+               'Mesmo gênero' AS motivo
+        FROM livros l
+        JOIN livro_autor la ON l.livro_id = la.livro_id
+        JOIN autores a ON la.autor_id = a.autor_id
+        WHERE l.genero IN (
+            SELECT DISTINCT l2.genero FROM venda_itens vi
+            JOIN vendas v ON vi.venda_id = v.venda_id
+            JOIN livros l2 ON vi.livro_id = l2.livro_id
+            WHERE v.cliente_id = :cliente_id)
+        AND l.livro_id NOT IN (
+            SELECT vi.livro_id FROM venda_itens vi
+            JOIN vendas v ON vi.venda_id = v.venda_id
+            WHERE v.cliente_id = :cliente_id)
+    ) AS recomendacoes
+    ORDER BY preco_medio DESC
+    LIMIT 10
+""")
+
+
+def resumo(nome, tempos):
+    ordenados = sorted(tempos)
+    p = lambda q: ordenados[min(len(ordenados) - 1, int(len(ordenados) * q))]
+    print(f'{nome:<40} p50 {p(0.5):9.2f} ms | p95 {p(0.95):9.2f} ms | máx {ordenados[-1]:9.2f} ms')
+
+
+def sem_generos():
+    """Catálogo sem nenhum gênero: o componente de gênero fica zerado, sem erro"""
+    from indice_recomendacoes import IndiceRecomendacoes
+    indice = IndiceRecomendacoes(
+        [1, 2, 3, 4], [None] * 4, [(1, 10), (2, 10), (3, 20), (4, 20)],
+        [(100, 1), (100, 3), (200, 1), (200, 2)], [(1, 79.8, 2), (2, 39.9, 1), (3, 39.9, 1)]
+    )
+    resultado = indice.recomendar(100, 10, (1, 1, 1, 1))
+    if [livro_id for livro_id, _, _ in resultado] != [2, 4] or any(m == 'Mesmo gênero' for _, _, m in resultado):
+        raise SystemExit(f'FALHOU: recomendações sem gêneros: {resultado}')
+    print('ok  catálogo sem gêneros recomendado sem o componente de gênero')
+
+
+def livros_ausentes():
+    """Vínculos, compras e preços de livros fora da lista de livros são ignorados"""
+    from indice_recomendacoes import IndiceRecomendacoes
+    indice = IndiceRecomendacoes(
+        [1, 2, 3], ['Poesia'] * 3, [(1, 10), (2, 10), (99, 10)],
+        [(100, 1), (100, 99), (100, None), (200, 1), (200, 2)],
+        [(1, 79.8, 2), (2, 39.9, 1), (99, 39.9, 1), (None, 10, 1)]
+    )
+    resultado = indice.recomendar(100, 10, (1, 1, 1, 1))
+    if [livro_id for livro_id, _, _ in resultado] != [2, 3] or indice.compras[100] != {0}:
+        raise SystemExit(f'FALHOU: índice com livros ausentes: {resultado}')
+    print('ok  vínculos e vendas de livros ausentes ignorados na construção do índice\n')
+
+
+def main():
+    vendas = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    livros = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    amostra = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    sem_generos()
+    livros_ausentes()
+    app = preparar_app()
+
+    from recomendacoes import motor_recomendacoes, recomendar_livros
+    from models import db
+    with app.app_context():
+        semear_catalogo(livros=livros, autores=max(livros // 20, 10))
+        cliente_ids = semear_vendas(vendas=vendas, clientes=max(vendas // 20, 10))
+        print(f'Dados: {vendas} vendas, {livros} livros, {len(cliente_ids)} clientes\n')
+
+        inicio = time.perf_counter()
+        motor_recomendacoes.reconstruir()
+        print(f'Construção do índice: {(time.perf_counter() - inicio) * 1000:.0f} ms')
+
+        sorteados = random.Random(1).sample(cliente_ids, amostra)
+        fila = iter(sorteados * 10)
+        resumo('Índice em memória (top-10)', cronometrar(lambda: recomendar_livros(next(fila), 10), amostra * 10))
+
+        # Atualização incremental: uma venda nova de 3 livros por cliente
+        livro_ids = db.session.scalars(db.select(db.text('livro_id FROM livros'))).all()
+        aleatorio = random.Random(2)
+        fila = iter(sorteados)
+        resumo('Venda nova + recomendação', cronometrar(lambda: (
+            motor_recomendacoes.registrar_itens(
+                (cliente_id, livro_id, 39.9) for cliente_id in [next(fila)]
+                for livro_id in aleatorio.sample(livro_ids, 3)
+            ),
+            recomendar_livros(sorteados[0], 10)
+        ), amostra))
+
+        usa_procedimento = db.session.get_bind().dialect.name == 'postgresql' and db.session.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_proc WHERE proname = 'sp_recomendacoes_cliente')"
+        )).scalar()
+        consulta = SQL_PROCEDIMENTO if usa_procedimento else SQL_REFERENCIA
+        nome = 'sp_recomendacoes_cliente' if usa_procedimento else 'Consulta do procedimento (adaptada)'
+        fila = iter(sorteados)
+        resumo(nome, cronometrar(
+            lambda: db.session.execute(consulta, {'cliente_id': next(fila)}).all(), amostra
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Benchmark da manutenção de metricas_autores e segmentacao_clientes.
+
+Importa o mesmo volume de vendas (via importar_vendas, em lotes) nos dois
+modos e compara a vazão:
+  - gatilhos: triggers por linha equivalentes a fn_atualizar_metricas_autor
+    e fn_atualizar_segmentacao_cliente (no SQLite, reescritos em SQL puro;
+    no PostgreSQL, as funções de base.sql precisam estar instaladas);
+  - outbox: o worker agrega em lote a partir de rollup_eventos.
+Nos dois modos a importação grava o outbox e o worker é executado, já que
+os agregados diários de /analises só são mantidos por ele.
+No modo outbox, 1% das vendas é removido pelo ORM antes da agregação, para
+exercitar o recálculo dos clientes afetados. Ao final de cada modo,
+rollup.verificar() confere as tabelas contra o recálculo completo.
+
+Uso: python -m benchmarks.rollup [vendas] [clientes] [lote_worker]
+"""
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+os.environ.setdefault('LOG_AMOSTRAGEM', '0')
+
+from sqlalchemy import select, text
+
+from benchmarks.comum import preparar_app
+from benchmarks.dados import semear_catalogo, semear_vendas
+
+GATILHOS = {
+    'sqlite': [
+        """
+        CREATE TRIGGER tg_atualizar_metricas_autor AFTER INSERT ON venda_itens
+        BEGIN
+            INSERT INTO metricas_autores (autor_id, total_vendas, receita_total, livros_publicados, data_atualizacao)
+            SELECT autor_id, NEW.quantidade, NEW.quantidade * NEW.preco_unitario, 1, CURRENT_TIMESTAMP
+            FROM livro_autor WHERE livro_id = NEW.livro_id
+            ON CONFLICT (autor_id) DO UPDATE SET
+                total_vendas = total_vendas + excluded.total_vendas,
+                receita_total = receita_total + excluded.receita_total,
+                data_atualizacao = CURRENT_TIMESTAMP;
+        END
+        """,
+        """
+        CREATE TRIGGER tg_atualizar_segmentacao_cliente AFTER INSERT ON vendas
+        BEGIN
+            INSERT INTO segmentacao_clientes
+                (cliente_id, segmento, total_compras, valor_total_gasto, ultima_compra, data_atualizacao)
+            SELECT cliente_id,
+                   CASE WHEN SUM(valor_total) > 1000 THEN 'VIP'
+                        WHEN MAX(data_venda) < date('now', '-6 months') THEN 'Inativo'
+                        WHEN COUNT(*) = 1 THEN 'Novo'
+                        ELSE 'Regular' END,
+                   COUNT(*), SUM(valor_total), MAX(data_venda), CURRENT_TIMESTAMP
+            FROM vendas WHERE cliente_id = NEW.cliente_id GROUP BY cliente_id
+            ON CONFLICT (cliente_id) DO UPDATE SET
+                segmento = excluded.segmento,
+                total_compras = excluded.total_compras,
+                valor_total_gasto = excluded.valor_total_gasto,
+                ultima_compra = excluded.ultima_compra,
+                data_atualizacao = CURRENT_TIMESTAMP;
+        END
+        """,
+    ],
+    'postgresql': [
+        'CREATE TRIGGER tg_atualizar_metricas_autor AFTER INSERT ON venda_itens '
+        'FOR EACH ROW EXECUTE FUNCTION fn_atualizar_metricas_autor()',
+        'CREATE TRIGGER tg_atualizar_segmentacao_cliente AFTER INSERT ON vendas '
+        'FOR EACH ROW EXECUTE FUNCTION fn_atualizar_segmentacao_cliente()',
+    ],
+}
+REMOVER = {
+    'sqlite': ['DROP TRIGGER tg_atualizar_metricas_autor', 'DROP TRIGGER tg_atualizar_segmentacao_cliente'],
+    'postgresql': ['DROP TRIGGER tg_atualizar_metricas_autor ON venda_itens',
+                   'DROP TRIGGER tg_atualizar_segmentacao_cliente ON vendas'],
+}
+
+
+def gerar_vendas(quantidade, cliente_ids, livro_ids, semente):
+    """Registros (linha, dados) no formato de ler_jsonl"""
+    aleatorio = random.Random(semente)
+    inicio = date.today() - timedelta(days=730)
+    return [
+        (linha, {
+            'cliente_id': aleatorio.choice(cliente_ids),
+            'data_venda': (inicio + timedelta(days=aleatorio.randrange(730))).isoformat(),
+            'itens': [
+                {'livro_id': livro_id, 'quantidade': aleatorio.randint(1, 3),
+                 'preco_unitario': str(Decimal(aleatorio.randint(1990, 12990)) / 100)}
+                for livro_id in aleatorio.sample(livro_ids, aleatorio.randint(1, 4))
+            ]
+        })
+        for linha in range(1, quantidade + 1)
+    ]
+
+
+def executar(db, instrucoes):
+    for instrucao in instrucoes:
+        db.session.execute(text(instrucao))
+    db.session.commit()
+
+
+def main():
+    vendas = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    clientes = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    app = preparar_app()
+    tamanho = int(sys.argv[3]) if len(sys.argv) > 3 else app.config['ROLLUP_TAMANHO_LOTE']
+
+    import rollup
+    from importacao_vendas import importar_vendas
+    from models import db, Cliente, Livro, Venda
+
+    with app.app_context():
+        dialeto = db.session.get_bind().dialect.name
+        semear_catalogo(5000, 500)
+        semear_vendas(0, clientes)
+        cliente_ids = db.session.scalars(select(Cliente.cliente_id)).all()
+        livro_ids = db.session.scalars(select(Livro.livro_id)).all()
+
+        print(f'{vendas} vendas por modo, {clientes} clientes, banco {dialeto}\n')
+        for modo, semente in (('gatilhos', 1), ('outbox', 2)):
+            app.config['ROLLUP_MODO'] = modo
+            registros = gerar_vendas(vendas, cliente_ids, livro_ids, semente)
+            if modo == 'gatilhos':
+                executar(db, GATILHOS[dialeto])
+
+            inicio = time.perf_counter()
+            relatorio = importar_vendas(registros, app.config['IMPORTACAO_TAMANHO_LOTE'])
+            importacao = time.perf_counter() - inicio
+
+            if modo == 'gatilhos':
+                executar(db, REMOVER[dialeto])
+            else:
+                removidas = db.session.scalars(
+                    select(Venda).order_by(Venda.venda_id.desc()).limit(max(vendas // 100, 1))
+                ).all()
+                for venda in removidas:
+                    db.session.delete(venda)
+                db.session.commit()
+            # O worker roda nos dois modos: os agregados diários sempre vêm do outbox
+            inicio = time.perf_counter()
+            rollup.executar_worker(tamanho, informar=lambda mensagem: None)
+            agregacao = time.perf_counter() - inicio
+
+            total = importacao + agregacao
+            verificacao = rollup.verificar()
+            divergentes = sum(
+                resultado['divergentes'] for tabela, resultado in verificacao.items() if tabela != 'eventos_pendentes'
+            )
+            print(f'{modo:<9} importação {importacao:7.2f} s | agregação {agregacao:6.2f} s | '
+                  f'total {total:7.2f} s ({relatorio.vendas / total:8.0f} vendas/s) | '
+                  f'divergências: {divergentes}, pendentes: {verificacao["eventos_pendentes"]}')
+
+
+if __name__ == '__main__':
+    main()
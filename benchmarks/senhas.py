@@ -0,0 +1,91 @@
+"""Benchmark de carga mista: logins concorrentes e navegação autenticada.
+
+Sobe a aplicação em um servidor HTTP com threads e mede a latência de
+GET /autores (p50, p95, p99) enquanto outras threads fazem login sem parar,
+com o hash calculado na thread da requisição (SENHAS_WORKERS = 0) e no pool
+limitado de senhas.
+
+Uso: python -m benchmarks.senhas [segundos] [threads_login] [threads_navegacao]
+"""
+import http.cookiejar
+import logging
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+from werkzeug.serving import make_server
+
+from benchmarks.comum import preparar_app, percentil
+
+
+def abrir_sessao(base):
+    """Opener com cookie de sessão já autenticado"""
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    opener.open(base + '/login', data=urllib.parse.urlencode(
+        {'username': 'admin', 'password': 'admin123'}
+    ).encode()).read()
+    return opener
+
+
+def cenario(app, base, workers, segundos, threads_login, threads_navegacao):
+    import senhas
+    app.config['SENHAS_WORKERS'] = workers
+    senhas._pool_pid = None  # Recria o pool com a nova configuração
+
+    fim = time.perf_counter() + segundos
+    latencias, logins, erros = [], [0], [0]
+    dados_login = urllib.parse.urlencode({'username': 'usuario', 'password': 'senha123'}).encode()
+
+    def logar():
+        while time.perf_counter() < fim:
+            try:
+                # Opener novo a cada tentativa: sem cookie, o login sempre verifica a senha
+                urllib.request.build_opener(urllib.request.HTTPCookieProcessor()).open(
+                    base + '/login', data=dados_login
+                ).read()
+                logins[0] += 1
+            except Exception:
+                erros[0] += 1
+
+    def navegar():
+        opener = abrir_sessao(base)
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            opener.open(base + '/autores').read()
+            latencias.append((time.perf_counter() - inicio) * 1000)
+
+    threads = [threading.Thread(target=logar) for _ in range(threads_login)]
+    threads += [threading.Thread(target=navegar) for _ in range(threads_navegacao)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    nome = 'na thread da requisição' if not workers else f'pool com {workers} worker(s)'
+    print(f'Hash {nome:<28} /autores p50 {percentil(latencias, 50):7.1f} ms | '
+          f'p95 {percentil(latencias, 95):7.1f} ms | p99 {percentil(latencias, 99):7.1f} ms | '
+          f'logins/s {logins[0] / segundos:5.1f} | erros {erros[0]}')
+
+
+def main():
+    segundos = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    threads_login = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    threads_navegacao = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    app = preparar_app()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    servidor = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{servidor.server_port}'
+    print(f'{threads_login} threads de login, {threads_navegacao} de navegação, {segundos:.0f} s por cenário\n')
+    try:
+        for workers in (0, 1, 2):
+            cenario(app, base, workers, segundos, threads_login, threads_navegacao)
+    finally:
+        servidor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
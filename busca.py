@@ -0,0 +1,310 @@
+import bisect
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from models import db, Autor, Livro, livro_autor
+
+# Busca no catálogo (título, gênero, ISBN e nome dos autores).
+#
+# No PostgreSQL usa busca textual com a configuração portugues_sem_acento e
+# os índices GIN criados em base.sql, com fallback por similaridade trigram.
+# Nos demais bancos (SQLite em desenvolvimento) usa um índice invertido em
+# memória, atualizado de forma incremental após escritas em livros e autores.
+
+PESO_TITULO = 3.0
+PESO_AUTOR = 2.0
+PESO_GENERO = 1.0
+PESO_ISBN = 10.0
+
+# Os candidatos são a união de três conjuntos lidos por índice (GIN de
+# título/gênero, ISBN único e GIN de autores); só eles são pontuados. Um OR
+# entre condições de tabelas diferentes no WHERE impediria o uso dos índices
+# GIN e calcularia to_tsvector para todo o catálogo.
+SQL_BUSCA_POSTGRES = text("""
+    WITH q AS (SELECT websearch_to_tsquery('portugues_sem_acento', :termo) AS consulta),
+    por_autor AS (
+        SELECT la.livro_id,
+               MAX(ts_rank(to_tsvector('portugues_sem_acento', a.nome), q.consulta)) AS relevancia
+        FROM autores a
+        JOIN livro_autor la ON la.autor_id = a.autor_id, q
+        WHERE to_tsvector('portugues_sem_acento', a.nome) @@ q.consulta
+        GROUP BY la.livro_id
+    ),
+    candidatos AS (
+        SELECT livro_id FROM livros
+        WHERE (setweight(to_tsvector('portugues_sem_acento', titulo), 'A') ||
+               setweight(to_tsvector('portugues_sem_acento', COALESCE(genero, '')), 'C'))
+              @@ websearch_to_tsquery('portugues_sem_acento', :termo)
+        UNION
+        SELECT livro_id FROM livros WHERE isbn = :isbn
+        UNION
+        SELECT livro_id FROM por_autor
+    )
+    SELECT l.livro_id,
+           COALESCE(ts_rank(setweight(to_tsvector('portugues_sem_acento', l.titulo), 'A') ||
+                            setweight(to_tsvector('portugues_sem_acento', COALESCE(l.genero, '')), 'C'),
+                            q.consulta), 0)
+           + COALESCE(pa.relevancia, 0) * 0.8
+           + CASE WHEN l.isbn = :isbn THEN 10 ELSE 0 END AS relevancia
+    FROM candidatos c
+    JOIN livros l ON l.livro_id = c.livro_id
+    CROSS JOIN q
+    LEFT JOIN por_autor pa ON pa.livro_id = l.livro_id
+    ORDER BY relevancia DESC, l.livro_id
+    LIMIT :limite
+""")
+
+
+SQL_SIMILARIDADE_POSTGRES = text("""
+    SELECT livro_id, similarity(lower(titulo), lower(:termo)) AS relevancia
+    FROM livros
+    WHERE lower(titulo) % lower(:termo)
+    ORDER BY relevancia DESC, livro_id
+    LIMIT :limite
+""")
+
+
+def normalizar(texto):
+    """Minúsculas e sem acentos: 'Solidão' -> 'solidao'"""
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def tokenizar(texto):
+    return re.findall(r'\w+', normalizar(texto))
+
+
+class IndiceInvertido:
+    """Índice invertido em memória de livros, com ranking TF-IDF por campo.
+
+    O último termo da consulta também casa por prefixo, para que a busca
+    funcione enquanto o usuário digita.
+    """
+
+    def __init__(self):
+        self.postagens = defaultdict(dict)  # termo -> {livro_id: peso}
+        self.documentos = {}  # livro_id -> {termo: peso}
+        self.isbns = {}  # isbn -> livro_id
+        self.isbn_por_livro = {}
+        self.livros_por_autor = defaultdict(set)
+        self.autores_por_livro = {}
+        self._vocabulario = None
+
+    def remover(self, livro_id):
+        for termo in self.documentos.pop(livro_id, {}):
+            postagem = self.postagens.get(termo)
+            if postagem is not None:
+                postagem.pop(livro_id, None)
+                if not postagem:
+                    del self.postagens[termo]
+                    self._vocabulario = None
+        isbn = self.isbn_por_livro.pop(livro_id, None)
+        if isbn is not None:
+            self.isbns.pop(isbn, None)
+        for autor_id in self.autores_por_livro.pop(livro_id, ()):
+            self.livros_por_autor[autor_id].discard(livro_id)
+
+    def adicionar(self, livro_id, titulo, genero, isbn, autores):
+        """Indexa um livro; autores é uma lista de (autor_id, nome)"""
+        self.remover(livro_id)
+        pesos = defaultdict(float)
+        for termo in tokenizar(titulo):
+            pesos[termo] += PESO_TITULO
+        for termo in tokenizar(genero):
+            pesos[termo] += PESO_GENERO
+        for _, nome in autores:
+            for termo in tokenizar(nome):
+                pesos[termo] += PESO_AUTOR
+
+        for termo, peso in pesos.items():
+            if termo not in self.postagens:
+                self._vocabulario = None
+            self.postagens[termo][livro_id] = peso
+        self.documentos[livro_id] = dict(pesos)
+        if isbn:
+            self.isbns[isbn] = livro_id
+            self.isbn_por_livro[livro_id] = isbn
+        self.autores_por_livro[livro_id] = {autor_id for autor_id, _ in autores}
+        for autor_id, _ in autores:
+            self.livros_por_autor[autor_id].add(livro_id)
+
+    def _termos_com_prefixo(self, prefixo):
+        if self._vocabulario is None:
+            self._vocabulario = sorted(self.postagens)
+        inicio = bisect.bisect_left(self._vocabulario, prefixo)
+        fim = bisect.bisect_left(self._vocabulario, prefixo + '\uffff')
+        return self._vocabulario[inicio:fim]
+
+    def buscar(self, consulta, limite):
+        """Lista de (livro_id, relevancia) em ordem decrescente de relevância"""
+        termos = tokenizar(consulta)
+        total = max(len(self.documentos), 1)
+        pontuacao = defaultdict(float)
+        encontrados = None
+
+        for posicao, termo in enumerate(termos):
+            variantes = [termo]
+            if posicao == len(termos) - 1:
+                variantes = self._termos_com_prefixo(termo) or [termo]
+
+            casaram = set()
+            for variante in variantes:
+                postagem = self.postagens.get(variante, {})
+                idf = math.log(1 + total / (1 + len(postagem)))
+                # Termo exato vale mais que um termo que só começa com ele
+                fator = 1.0 if variante == termo else 0.5
+                for livro_id, peso in postagem.items():
+                    pontuacao[livro_id] += peso * idf * fator
+                    casaram.add(livro_id)
+            # Todos os termos precisam casar (E lógico)
+            encontrados = casaram if encontrados is None else encontrados & casaram
+
+        resultado = {livro_id: pontuacao[livro_id] for livro_id in encontrados or ()}
+        isbn = re.sub(r'\D', '', consulta or '')
+        if isbn in self.isbns:
+            livro_id = self.isbns[isbn]
+            resultado[livro_id] = resultado.get(livro_id, 0) + PESO_ISBN
+
+        ordenado = sorted(resultado.items(), key=lambda item: (-item[1], item[0]))
+        return ordenado[:limite]
+
+
+class BuscaCatalogo:
+    """Mantém o índice em memória sincronizado com o banco"""
+
+    def __init__(self):
+        self.indice = None
+        self.construido_em = 0
+        self.livros_pendentes = set()
+        self.autores_pendentes = set()
+        self._lock = threading.Lock()
+
+    def _carregar(self, livro_ids=None):
+        """Lê livros e autores do banco; None carrega o catálogo completo"""
+        consulta = db.select(Livro.livro_id, Livro.titulo, Livro.genero, Livro.isbn)
+        vinculos = db.select(livro_autor.c.livro_id, Autor.autor_id, Autor.nome) \
+            .join(Autor, Autor.autor_id == livro_autor.c.autor_id)
+        if livro_ids is not None:
+            consulta = consulta.where(Livro.livro_id.in_(livro_ids))
+            vinculos = vinculos.where(livro_autor.c.livro_id.in_(livro_ids))
+
+        autores = defaultdict(list)
+        for livro_id, autor_id, nome in db.session.execute(vinculos):
+            autores[livro_id].append((autor_id, nome))
+        return [
+            (livro_id, titulo, genero, isbn, autores.get(livro_id, []))
+            for livro_id, titulo, genero, isbn in db.session.execute(consulta)
+        ]
+
+    def reconstruir(self):
+        # Alterações marcadas durante a leitura continuam pendentes
+        with self._lock:
+            self.livros_pendentes.clear()
+            self.autores_pendentes.clear()
+        indice = IndiceInvertido()
+        for livro in self._carregar():
+            indice.adicionar(*livro)
+        with self._lock:
+            self.indice = indice
+            self.construido_em = time.monotonic()
+
+    def marcar_livros(self, livro_ids):
+        with self._lock:
+            self.livros_pendentes.update(livro_ids)
+
+    def marcar_autores(self, autor_ids):
+        with self._lock:
+            self.autores_pendentes.update(autor_ids)
+
+    def _atualizar(self):
+        ttl = current_app.config['BUSCA_INDICE_TTL']
+        if self.indice is None or time.monotonic() - self.construido_em > ttl:
+            self.reconstruir()
+
+        with self._lock:
+            livro_ids = set(self.livros_pendentes)
+            autor_ids = set(self.autores_pendentes)
+            self.livros_pendentes.clear()
+            self.autores_pendentes.clear()
+        if autor_ids:
+            for autor_id in autor_ids:
+                livro_ids |= self.indice.livros_por_autor.get(autor_id, set())
+            livro_ids |= set(db.session.scalars(
+                db.select(livro_autor.c.livro_id).where(livro_autor.c.autor_id.in_(autor_ids))
+            ))
+        if not livro_ids:
+            return
+
+        atuais = self._carregar(livro_ids)
+        with self._lock:
+            for livro_id in livro_ids:
+                self.indice.remover(livro_id)
+            for livro in atuais:
+                self.indice.adicionar(*livro)
+
+    def buscar(self, termo, limite):
+        self._atualizar()
+        with self._lock:
+            return self.indice.buscar(termo, limite)
+
+
+busca_catalogo = BuscaCatalogo()
+_suporte_postgres = {}
+
+
+def _usa_postgres():
+    """True se o banco é PostgreSQL com a configuração portugues_sem_acento"""
+    bind = db.session.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return False
+    chave = str(bind.url)
+    if chave not in _suporte_postgres:
+        _suporte_postgres[chave] = db.session.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'portugues_sem_acento')"
+        )).scalar()
+    return _suporte_postgres[chave]
+
+
+def buscar_livros(termo, limite=None):
+    """Busca livros por relevância; retorna lista de (livro_id, relevancia)"""
+    termo = (termo or '').strip()
+    if not termo:
+        return []
+    limite = limite or current_app.config['BUSCA_LIMITE']
+
+    if _usa_postgres():
+        parametros = {'termo': termo, 'isbn': re.sub(r'\D', '', termo), 'limite': limite}
+        resultado = db.session.execute(SQL_BUSCA_POSTGRES, parametros).all()
+        if not resultado:
+            resultado = db.session.execute(SQL_SIMILARIDADE_POSTGRES, parametros).all()
+        return [tuple(linha) for linha in resultado]
+
+    return busca_catalogo.buscar(termo, limite)
+
+
+def _registrar_alteracoes(session, contexto):
+    """Marca livros e autores alterados na sessão para reindexação"""
+    livros, autores = set(), set()
+    for objeto in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(objeto, Livro) and objeto.livro_id is not None:
+            livros.add(objeto.livro_id)
+        elif isinstance(objeto, Autor) and objeto.autor_id is not None:
+            autores.add(objeto.autor_id)
+    if livros:
+        busca_catalogo.marcar_livros(livros)
+    if autores:
+        busca_catalogo.marcar_autores(autores)
+
+
+def init_app(app):
+    """Registra a marcação de alterações para o índice em memória"""
+    if not event.contains(Session, 'after_flush', _registrar_alteracoes):
+        event.listen(Session, 'after_flush', _registrar_alteracoes)
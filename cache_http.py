@@ -0,0 +1,239 @@
+import hashlib
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, g, make_response, render_template, request, session as sessao_flask
+from flask_login import current_user
+from flask_sqlalchemy.session import Session
+from flask_wtf.csrf import generate_csrf
+from markupsafe import Markup
+from sqlalchemy import event, inspect, select
+
+from models import db, VersaoTabela
+
+# Cache HTTP condicional e cache de fragmentos das páginas de listagem/edição.
+#
+# Toda transação que altera uma tabela (flush do ORM ou INSERT/UPDATE/DELETE
+# executado pela sessão) incrementa a versão dela em versoes_tabelas, no
+# próprio commit. Views marcadas com @condicional(tabelas...) leem essas
+# versões em uma consulta (na réplica, se a view for @somente_leitura, no
+# mesmo banco que os dados) e respondem com ETag/Last-Modified; se o
+# navegador já tem a página daquela versão, a resposta é 304 sem consultar
+# nem renderizar nada.
+#
+# O ETag também varia com o usuário, a URL, a sessão CSRF e uma janela de
+# tempo de metade de WTF_CSRF_TIME_LIMIT, para que uma página revalidada
+# nunca traga um token CSRF expirado. Páginas com mensagens flash pendentes
+# são sempre renderizadas e saem sem validadores (e com no-store), para que
+# a mensagem apareça uma única vez.
+#
+# fragmento() guarda o HTML de trechos caros (tabela + paginação) por
+# parâmetros e versões, em um LRU limitado por tamanho, compartilhado entre
+# os usuários do processo: o token CSRF entra no lugar de um marcador a
+# cada requisição. Alterações feitas fora da aplicação (psql, triggers) não
+# incrementam as versões.
+
+IGNORADAS = {'versoes_tabelas', 'rollup_eventos'}  # Não aparecem em páginas
+MARCADOR_CSRF = Markup('<!--csrf-->')  # Texto escapado do banco nunca produz um comentário
+
+
+class CacheFragmentos:
+    """Cache LRU de HTML renderizado, limitado pelo total de caracteres, por processo"""
+
+    def __init__(self, maximo=8 * 1024 * 1024):
+        self.maximo = maximo
+        self._itens = OrderedDict()
+        self._tamanho = 0
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            html = self._itens.get(chave)
+            if html is not None:
+                self._itens.move_to_end(chave)
+            return html
+
+    def guardar(self, chave, html):
+        if len(html) > self.maximo:
+            return
+        with self._lock:
+            anterior = self._itens.pop(chave, None)
+            if anterior is not None:
+                self._tamanho -= len(anterior)
+            self._itens[chave] = html
+            self._tamanho += len(html)
+            while self._tamanho > self.maximo:
+                _, removido = self._itens.popitem(last=False)
+                self._tamanho -= len(removido)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self._tamanho = 0
+
+    def tamanho(self):
+        with self._lock:
+            return len(self._itens), self._tamanho
+
+
+cache_fragmentos = CacheFragmentos()
+
+
+# ----- Versões por tabela -----
+
+def _alteradas(session):
+    return session.info.setdefault('tabelas_alteradas', set())
+
+
+def _registrar_orm(session, contexto, instancias):
+    alteradas = _alteradas(session)
+    for objeto in itertools.chain(session.new, session.deleted, session.dirty):
+        estado = inspect(objeto)
+        if estado.modified or not estado.persistent or objeto in session.deleted:
+            alteradas.update(tabela.name for tabela in estado.mapper.tables)
+        # Coleções muitos-para-muitos (ex.: livro.autores grava em livro_autor)
+        for relacao in estado.mapper.relationships:
+            if relacao.secondary is not None and estado.attrs[relacao.key].history.has_changes():
+                alteradas.add(relacao.secondary.name)
+            elif relacao.secondary is not None and objeto in session.deleted:
+                alteradas.add(relacao.secondary.name)
+
+
+def _registrar_core(estado):
+    if estado.is_insert or estado.is_update or estado.is_delete:
+        tabela = getattr(estado.statement, 'table', None)
+        if tabela is not None:
+            _alteradas(estado.session).add(tabela.name)
+
+
+def _publicar_versoes(session):
+    """Incrementa, na transação que está sendo confirmada, a versão das tabelas alteradas"""
+    session.flush()
+    tabelas = session.info.pop('tabelas_alteradas', set()) - IGNORADAS
+    if not tabelas:
+        return
+    dialeto = session.get_bind().dialect.name
+    if dialeto == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as insert_dialeto
+    elif dialeto == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as insert_dialeto
+    else:
+        raise RuntimeError(f'Versões de tabelas não suportadas para {dialeto}')
+
+    versoes = VersaoTabela.__table__
+    instrucao = insert_dialeto(versoes)
+    instrucao = instrucao.on_conflict_do_update(
+        index_elements=[versoes.c.tabela],
+        set_={'versao': versoes.c.versao + 1, 'alterado_em': instrucao.excluded.alterado_em}
+    )
+    agora = datetime.utcnow()
+    # Ordem fixa: transações concorrentes travam as linhas na mesma sequência
+    session.execute(instrucao, [{'tabela': tabela, 'versao': 1, 'alterado_em': agora} for tabela in sorted(tabelas)])
+
+
+def _descartar(session):
+    session.info.pop('tabelas_alteradas', None)
+
+
+def ler_versoes(tabelas):
+    """{tabela: (versao, alterado_em)}; tabelas nunca alteradas têm versão 0"""
+    linhas = db.session.execute(
+        select(VersaoTabela.tabela, VersaoTabela.versao, VersaoTabela.alterado_em)
+        .where(VersaoTabela.tabela.in_(tabelas))
+    ).all()
+    versoes = {tabela: (0, None) for tabela in tabelas}
+    versoes.update((tabela, (versao, alterado_em)) for tabela, versao, alterado_em in linhas)
+    return versoes
+
+
+# ----- Respostas condicionais -----
+
+def _etag(versoes):
+    config = current_app.config
+    limite = config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    partes = (
+        config['CACHE_HTTP_VERSAO'],
+        request.full_path,
+        current_user.get_id() if current_user.is_authenticated else None,
+        # Sessão CSRF e janela de validade dos tokens já renderizados
+        sessao_flask.get(config.get('WTF_CSRF_FIELD_NAME', 'csrf_token')),
+        int(time.time() // (limite / 2)) if limite else None,
+        sorted((tabela, versao) for tabela, (versao, _) in versoes.items()),
+    )
+    return hashlib.blake2b(repr(partes).encode(), digest_size=12).hexdigest()
+
+
+def _ultima_alteracao(versoes):
+    datas = [alterado_em for _, alterado_em in versoes.values() if alterado_em is not None]
+    if not datas:
+        return None
+    return max(datas).replace(microsecond=0, tzinfo=timezone.utc)
+
+
+def condicional(*tabelas):
+    """Responde 304 às requisições GET quando as tabelas usadas pela view não mudaram"""
+    def decorador(view):
+        @wraps(view)
+        def envolvida(*args, **kwargs):
+            if request.method != 'GET' or not current_app.config['CACHE_HTTP_ATIVO']:
+                return view(*args, **kwargs)
+
+            versoes = g.versoes_tabelas = ler_versoes(tabelas)
+            if '_flashes' in sessao_flask:
+                resposta = make_response(view(*args, **kwargs))
+                resposta.headers['Cache-Control'] = 'no-store'
+                return resposta
+
+            etag = _etag(versoes)
+            ultima = _ultima_alteracao(versoes)
+            # If-None-Match tem precedência; If-Modified-Since só vale sem ele (RFC 9110)
+            if request.if_none_match:
+                inalterada = request.if_none_match.contains_weak(etag)
+            else:
+                inalterada = bool(ultima and request.if_modified_since and ultima <= request.if_modified_since)
+
+            resposta = current_app.response_class(status=304) if inalterada else make_response(view(*args, **kwargs))
+            if resposta.status_code in (200, 304):
+                resposta.set_etag(etag, weak=True)
+                if ultima:
+                    resposta.last_modified = ultima
+                resposta.headers['Cache-Control'] = 'private, no-cache'
+            return resposta
+        return envolvida
+    return decorador
+
+
+def fragmento(template, parametros, contexto):
+    """HTML de `template` do cache ou renderizado com contexto(); exige @condicional na view.
+
+    A chave é o template, os parâmetros e as versões lidas por @condicional.
+    O template usa {{ csrf_fragmento }} no lugar de {{ csrf_token() }}.
+    """
+    versoes = g.get('versoes_tabelas')
+    if versoes is None:
+        raise RuntimeError('fragmento() requer uma view com @condicional')
+    chave = (template, parametros, tuple(sorted((tabela, versao) for tabela, (versao, _) in versoes.items())))
+    html = cache_fragmentos.obter(chave)
+    if html is None:
+        html = render_template(template, csrf_fragmento=MARCADOR_CSRF, **contexto())
+        cache_fragmentos.guardar(chave, html)
+    return Markup(html.replace(MARCADOR_CSRF, generate_csrf()))
+
+
+def init_app(app):
+    """Registra o rastreio de tabelas alteradas e configura o cache de fragmentos"""
+    for nome, funcao in (
+        ('before_flush', _registrar_orm),
+        ('do_orm_execute', _registrar_core),
+        ('before_commit', _publicar_versoes),
+        ('after_commit', _descartar),
+        ('after_rollback', _descartar),
+    ):
+        if not event.contains(Session, nome, funcao):
+            event.listen(Session, nome, funcao)
+    cache_fragmentos.maximo = app.config['CACHE_FRAGMENTOS_TAMANHO']
+    cache_fragmentos.limpar()
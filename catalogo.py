@@ -0,0 +1,231 @@
+import csv
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import delete, insert, tuple_
+
+from models import db, Autor, Livro, livro_autor
+from estatisticas import ajustar_estatisticas
+from paginacao import invalidar_contagem
+from busca import busca_catalogo
+
+
+def resolver_autores(autores_ids):
+    """IDs de autores existentes entre os informados, com uma única consulta IN"""
+    ids = {int(autor_id) for autor_id in autores_ids if str(autor_id).isdigit()}
+    if not ids:
+        return set()
+    return set(db.session.scalars(db.select(Autor.autor_id).where(Autor.autor_id.in_(ids))))
+
+
+def sincronizar_autores(livro_id, autores_ids):
+    """Aplica a diferença entre os autores atuais e os desejados de um livro.
+
+    Remove e insere apenas os vínculos que mudaram, com um DELETE e um
+    INSERT em lote, em vez de limpar e reconstruir a coleção.
+    """
+    atuais = set(db.session.scalars(
+        db.select(livro_autor.c.autor_id).where(livro_autor.c.livro_id == livro_id)
+    ))
+    desejados = set(autores_ids)
+
+    remover = atuais - desejados
+    if remover:
+        db.session.execute(
+            delete(livro_autor)
+            .where(livro_autor.c.livro_id == livro_id)
+            .where(livro_autor.c.autor_id.in_(remover))
+        )
+    adicionar = desejados - atuais
+    if adicionar:
+        db.session.execute(
+            insert(livro_autor),
+            [{'livro_id': livro_id, 'autor_id': autor_id} for autor_id in adicionar]
+        )
+    if remover or adicionar:
+        busca_catalogo.marcar_livros([livro_id])
+
+
+# ===== IMPORTAÇÃO DE CATÁLOGO =====
+#
+# CSV com cabeçalho: titulo,isbn,data_publicacao,genero,autores
+# Os nomes em "autores" são separados por ";". Livros são identificados pelo
+# ISBN: existentes são atualizados, novos são inseridos. Autores inexistentes
+# são criados. Com "autores" vazio, os vínculos do livro são mantidos.
+
+
+class RelatorioCatalogo:
+    """Resultado da importação de catálogo"""
+
+    def __init__(self):
+        self.inseridos = 0
+        self.atualizados = 0
+        self.autores_criados = 0
+        self.erros = []
+
+    def erro(self, linha, mensagem):
+        self.erros.append({'linha': linha, 'erro': mensagem})
+
+    def to_dict(self):
+        return {
+            'livros_inseridos': self.inseridos,
+            'livros_atualizados': self.atualizados,
+            'autores_criados': self.autores_criados,
+            'total_erros': len(self.erros),
+            'erros': sorted(self.erros, key=lambda erro: erro['linha'])
+        }
+
+
+def _normalizar_livro(linha):
+    titulo = (linha.get('titulo') or '').strip()
+    isbn = (linha.get('isbn') or '').strip()
+    if not titulo or not isbn:
+        raise ValueError('Título e ISBN são obrigatórios')
+    if len(isbn) > 20:
+        raise ValueError('ISBN muito longo')
+
+    data_publicacao = (linha.get('data_publicacao') or '').strip()
+    try:
+        data_publicacao = datetime.strptime(data_publicacao, '%Y-%m-%d').date() if data_publicacao else None
+    except ValueError:
+        raise ValueError('Formato de data inválido')
+
+    nomes = [nome.strip() for nome in (linha.get('autores') or '').split(';') if nome.strip()]
+    return {
+        'titulo': titulo,
+        'isbn': isbn,
+        'data_publicacao': data_publicacao,
+        'genero': (linha.get('genero') or '').strip() or None,
+        'autores': list(dict.fromkeys(nomes))
+    }
+
+
+def _upsert_livros(livros):
+    """INSERT ... ON CONFLICT (isbn) DO UPDATE em uma única instrução executemany"""
+    dialeto = db.session.get_bind().dialect.name
+    if dialeto == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as insert_dialeto
+    elif dialeto == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as insert_dialeto
+    else:
+        raise RuntimeError(f'Importação de catálogo não suportada para {dialeto}')
+
+    instrucao = insert_dialeto(Livro.__table__)
+    instrucao = instrucao.on_conflict_do_update(
+        index_elements=[Livro.__table__.c.isbn],
+        set_={
+            'titulo': instrucao.excluded.titulo,
+            'data_publicacao': instrucao.excluded.data_publicacao,
+            'genero': instrucao.excluded.genero
+        }
+    )
+    db.session.execute(instrucao, [
+        {chave: livro[chave] for chave in ('titulo', 'isbn', 'data_publicacao', 'genero')}
+        for livro in livros
+    ])
+
+
+def _resolver_autores_por_nome(nomes):
+    """Mapeia nome -> autor_id, criando em lote os autores que faltam"""
+    if not nomes:
+        return {}, 0
+    por_nome = {}
+    for autor_id, nome in db.session.execute(
+        db.select(Autor.autor_id, Autor.nome).where(Autor.nome.in_(nomes)).order_by(Autor.autor_id)
+    ):
+        por_nome.setdefault(nome, autor_id)
+
+    novos = [nome for nome in nomes if nome not in por_nome]
+    if novos:
+        ids = db.session.scalars(
+            insert(Autor).returning(Autor.autor_id, sort_by_parameter_order=True),
+            [{'nome': nome} for nome in novos]
+        ).all()
+        por_nome.update(zip(novos, ids))
+    return por_nome, len(novos)
+
+
+def _processar_lote_catalogo(lote, relatorio):
+    livros = {}
+    for numero, linha in lote:
+        try:
+            livro = _normalizar_livro(linha)
+        except ValueError as e:
+            relatorio.erro(numero, str(e))
+            continue
+        livro['linha'] = numero
+        livros[livro['isbn']] = livro  # A última ocorrência do ISBN no lote prevalece
+
+    if not livros:
+        return
+
+    try:
+        isbns = list(livros)
+        existentes = set(db.session.scalars(db.select(Livro.isbn).where(Livro.isbn.in_(isbns))))
+        _upsert_livros(livros.values())
+        ids_por_isbn = dict(db.session.execute(
+            db.select(Livro.isbn, Livro.livro_id).where(Livro.isbn.in_(isbns))
+        ).all())
+
+        nomes = list(dict.fromkeys(nome for livro in livros.values() for nome in livro['autores']))
+        autores_por_nome, autores_criados = _resolver_autores_por_nome(nomes)
+
+        # Vínculos desejados apenas para livros que trouxeram autores
+        com_autores = [ids_por_isbn[isbn] for isbn, livro in livros.items() if livro['autores']]
+        desejados = {
+            (ids_por_isbn[isbn], autores_por_nome[nome])
+            for isbn, livro in livros.items()
+            for nome in livro['autores']
+        }
+        atuais = set()
+        if com_autores:
+            atuais = set(db.session.execute(
+                db.select(livro_autor.c.livro_id, livro_autor.c.autor_id)
+                .where(livro_autor.c.livro_id.in_(com_autores))
+            ).all())
+
+        remover = atuais - desejados
+        if remover:
+            db.session.execute(
+                delete(livro_autor).where(
+                    tuple_(livro_autor.c.livro_id, livro_autor.c.autor_id).in_(list(remover))
+                )
+            )
+        adicionar = desejados - atuais
+        if adicionar:
+            db.session.execute(
+                insert(livro_autor),
+                [{'livro_id': livro_id, 'autor_id': autor_id} for livro_id, autor_id in adicionar]
+            )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        for livro in livros.values():
+            relatorio.erro(livro['linha'], f'Falha ao gravar o lote: {e}')
+        return
+
+    busca_catalogo.marcar_livros(ids_por_isbn.values())
+    inseridos = len(livros) - len(existentes)
+    relatorio.inseridos += inseridos
+    relatorio.atualizados += len(existentes)
+    relatorio.autores_criados += autores_criados
+    ajustar_estatisticas(total_livros=inseridos, total_autores=autores_criados)
+
+
+def importar_catalogo(linhas, tamanho_lote=1000):
+    """Importa um CSV de livros e autores em lotes, cada um em sua transação.
+
+    O arquivo é lido de forma incremental; apenas um lote fica em memória.
+    """
+    relatorio = RelatorioCatalogo()
+    leitor = csv.DictReader(linhas)
+    registros = ((leitor.line_num, linha) for linha in leitor)
+    while True:
+        lote = list(islice(registros, tamanho_lote))
+        if not lote:
+            break
+        _processar_lote_catalogo(lote, relatorio)
+
+    invalidar_contagem(Livro.__tablename__)
+    invalidar_contagem(Autor.__tablename__)
+    return relatorio
@@ -0,0 +1,145 @@
+import os
+import sqlite3
+import threading
+import time
+from decimal import Decimal
+
+from flask import current_app
+
+from models import db, Autor, Livro, Cliente, Venda, VendaArquivada
+
+# Contadores do dashboard guardados em um arquivo SQLite local, compartilhado
+# entre os workers do mesmo servidor. O valor total das vendas é guardado em
+# centavos para que os ajustes incrementais sejam exatos.
+CHAVES = ('total_autores', 'total_livros', 'total_clientes', 'total_vendas')
+
+_local = threading.local()
+
+
+def _caminho_arquivo():
+    return current_app.config.get('ESTATISTICAS_ARQUIVO') or \
+        os.path.join(current_app.instance_path, 'estatisticas.db')
+
+
+def _conexao():
+    """Conexão com o arquivo de estatísticas, uma por thread"""
+    caminho = _caminho_arquivo()
+    conexoes = getattr(_local, 'conexoes', None)
+    if conexoes is None:
+        conexoes = _local.conexoes = {}
+    if caminho not in conexoes:
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        conn = sqlite3.connect(caminho, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS estatisticas '
+            '(chave TEXT PRIMARY KEY, valor INTEGER NOT NULL)'
+        )
+        conexoes[caminho] = conn
+    return conexoes[caminho]
+
+
+def _para_centavos(valor):
+    return int((Decimal(valor) * 100).to_integral_value())
+
+
+def _calcular():
+    """Calcula os totais direto no banco, em uma única consulta (vendas incluem o arquivo)"""
+    linha = db.session.execute(db.select(
+        db.select(db.func.count()).select_from(Autor).scalar_subquery(),
+        db.select(db.func.count()).select_from(Livro).scalar_subquery(),
+        db.select(db.func.count()).select_from(Cliente).scalar_subquery(),
+        db.select(db.func.coalesce(db.func.sum(Venda.valor_total), 0)).scalar_subquery(),
+        db.select(db.func.coalesce(db.func.sum(VendaArquivada.valor_total), 0)).scalar_subquery()
+    )).one()
+    total_autores, total_livros, total_clientes, recentes, arquivadas = linha
+    total_vendas = recentes + arquivadas
+    return {
+        'total_autores': total_autores,
+        'total_livros': total_livros,
+        'total_clientes': total_clientes,
+        'total_vendas': _para_centavos(total_vendas)
+    }
+
+
+def _formatar(valores):
+    estatisticas = {chave: valores[chave] for chave in CHAVES}
+    estatisticas['total_vendas'] = Decimal(valores['total_vendas']) / 100
+    return estatisticas
+
+
+def obter_estatisticas():
+    """Totais do dashboard, lidos do cache compartilhado quando válido.
+
+    Quando o cache expira (ESTATISTICAS_TTL), os totais são recalculados.
+    O resultado só é gravado se nenhum ajuste ocorreu durante o cálculo
+    (controle pela chave 'geracao').
+    """
+    try:
+        conn = _conexao()
+        valores = dict(conn.execute('SELECT chave, valor FROM estatisticas'))
+        if valores.get('expira_em', 0) > time.time() and all(c in valores for c in CHAVES):
+            return _formatar(valores)
+
+        geracao = valores.get('geracao', 0)
+        calculados = _calcular()
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            atual = conn.execute(
+                "SELECT valor FROM estatisticas WHERE chave = 'geracao'"
+            ).fetchone()
+            if (atual[0] if atual else 0) == geracao:
+                expira_em = int(time.time() + current_app.config['ESTATISTICAS_TTL'])
+                conn.executemany(
+                    'INSERT OR REPLACE INTO estatisticas (chave, valor) VALUES (?, ?)',
+                    list(calculados.items()) + [('expira_em', expira_em)]
+                )
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            conn.execute('ROLLBACK')
+            raise
+        return _formatar(calculados)
+    except sqlite3.Error as e:
+        current_app.logger.warning(f'Cache de estatísticas indisponível: {e}')
+        return _formatar(_calcular())
+
+
+def _registrar_alteracao(comandos):
+    try:
+        conn = _conexao()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for sql, parametros in comandos:
+                conn.execute(sql, parametros)
+            conn.execute(
+                "INSERT INTO estatisticas (chave, valor) VALUES ('geracao', 1) "
+                "ON CONFLICT (chave) DO UPDATE SET valor = valor + 1"
+            )
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            conn.execute('ROLLBACK')
+            raise
+    except sqlite3.Error as e:
+        current_app.logger.warning(f'Cache de estatísticas indisponível: {e}')
+
+
+def ajustar_estatisticas(**deltas):
+    """Aplica variações aos totais em cache após um commit.
+
+    Exemplo: ajustar_estatisticas(total_autores=1) ou
+    ajustar_estatisticas(total_vendas=-venda.valor_total).
+    """
+    comandos = []
+    for chave, delta in deltas.items():
+        if chave not in CHAVES:
+            raise KeyError(chave)
+        if chave == 'total_vendas':
+            delta = _para_centavos(delta)
+        comandos.append(('UPDATE estatisticas SET valor = valor + ? WHERE chave = ?', (delta, chave)))
+    _registrar_alteracao(comandos)
+
+
+def invalidar_estatisticas():
+    """Força o recálculo dos totais na próxima leitura"""
+    _registrar_alteracao([("DELETE FROM estatisticas WHERE chave = 'expira_em'", ())])
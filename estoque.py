@@ -0,0 +1,77 @@
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+from models import db, Estoque
+
+# Reserva de estoque na criação de vendas.
+#
+# Cada livro é baixado com um UPDATE condicional (quantidade >= pedido), que
+# verifica e decrementa em uma única instrução: não há leitura seguida de
+# escrita, então duas vendas simultâneas do mesmo livro nunca veem o mesmo
+# saldo. No PostgreSQL o UPDATE trava a linha até o commit; as baixas seguem
+# a ordem de livro_id, então vendas com os mesmos livros travam as linhas na
+# mesma sequência e não entram em deadlock. A reserva deve ser o último passo
+# antes do commit, para que a linha de um livro muito vendido fique travada
+# o mínimo possível; antes dela, conferir_estoque() recusa sem travar nada as
+# vendas de livros já esgotados. Livros sem linha em estoque não têm
+# controle de estoque.
+
+
+class EstoqueInsuficiente(RuntimeError):
+    """Um ou mais livros da venda sem exemplares suficientes; `faltas` = {livro_id: (pedido, disponível)}"""
+
+    def __init__(self, faltas):
+        self.faltas = faltas
+        super().__init__(', '.join(
+            f'livro {livro_id}: pedido {pedido}, disponível {disponivel}'
+            for livro_id, (pedido, disponivel) in sorted(faltas.items())
+        ))
+
+
+def conferir_estoque(quantidades):
+    """Levanta EstoqueInsuficiente se o saldo lido (sem travar) já não atende à venda.
+
+    Só antecipa a recusa de livros esgotados, sem disputar a trava da linha
+    com as vendas em andamento; quem garante o saldo é reservar_estoque().
+    """
+    if not quantidades:
+        return
+    faltas = {
+        livro_id: (quantidades[livro_id], disponivel)
+        for livro_id, disponivel in db.session.execute(
+            select(Estoque.livro_id, Estoque.quantidade).where(Estoque.livro_id.in_(quantidades))
+        )
+        if disponivel < quantidades[livro_id]
+    }
+    if faltas:
+        raise EstoqueInsuficiente(faltas)
+
+
+def reservar_estoque(quantidades):
+    """Baixa na transação atual o estoque de todos os livros ou levanta EstoqueInsuficiente.
+
+    `quantidades` é {livro_id: exemplares}. Após EstoqueInsuficiente a
+    transação tem baixas parciais e precisa ser desfeita com rollback().
+    """
+    agora = datetime.utcnow()
+    sem_saldo = []
+    for livro_id in sorted(quantidades):
+        resultado = db.session.execute(
+            update(Estoque)
+            .where(Estoque.livro_id == livro_id, Estoque.quantidade >= quantidades[livro_id])
+            .values(quantidade=Estoque.quantidade - quantidades[livro_id], data_atualizacao=agora)
+            .execution_options(synchronize_session=False)
+        )
+        if resultado.rowcount == 0:
+            sem_saldo.append(livro_id)
+
+    if sem_saldo:
+        # Nenhuma linha alterada: saldo insuficiente ou livro sem controle de estoque
+        disponiveis = dict(db.session.execute(
+            select(Estoque.livro_id, Estoque.quantidade).where(Estoque.livro_id.in_(sem_saldo))
+        ).all())
+        if disponiveis:
+            raise EstoqueInsuficiente({
+                livro_id: (quantidades[livro_id], disponivel) for livro_id, disponivel in disponiveis.items()
+            })
@@ -0,0 +1,192 @@
+from itertools import islice
+
+from sqlalchemy import column, delete, inspect, select, table
+
+from models import (
+    db, Autor, Livro, Cliente, Venda, VendaItem, VendaArquivada, VendaItemArquivado, livro_autor, Estoque,
+    MetricaAutor, SegmentacaoCliente, VendaDiaria, VendaDiariaAutor, VendaMensalAutor
+)
+from estatisticas import ajustar_estatisticas
+from paginacao import invalidar_contagem
+from rollup import registrar_vendas
+import busca
+
+# Exclusão em lote de autores, livros, clientes e vendas.
+#
+# Cada lote de ids é excluído em uma transação, com um DELETE por tabela
+# (WHERE id IN ...) em vez de carregar os objetos e os relacionamentos pelo
+# ORM. As dependências são tratadas explicitamente, do mesmo jeito no
+# PostgreSQL e no SQLite (que não aplica ON DELETE CASCADE sem
+# PRAGMA foreign_keys):
+#   - autores: vínculos de livro_autor e métricas/agregados do autor;
+#   - livros: bloqueados se tiverem vendas (inclusive arquivadas) ou
+#     histórico de preços (tabela de auditoria de base.sql, quando existir);
+#     vínculos, estoque e agregados diários do livro são excluídos;
+#   - clientes: bloqueados se tiverem vendas (inclusive arquivadas); a
+#     segmentação é excluída;
+#   - vendas: itens excluídos e remoção gravada no outbox de rollup.py
+#     (os eventos do ORM não veem DELETEs em massa). O estoque não é
+#     devolvido, como em deletar_venda. Vendas arquivadas não são excluídas.
+# As vendas arquivadas também bloqueiam: os agregados de rollup.py contam o
+# arquivo, e o recálculo completo liga os itens ao livro e ao cliente.
+# As linhas são travadas (FOR UPDATE no PostgreSQL) antes da verificação
+# das dependências, para que uma venda nova não referencie um livro ou
+# cliente entre a verificação e o DELETE.
+
+MOTIVOS = {
+    'livros': 'Livro com vendas registradas',
+    'historico_precos': 'Livro com histórico de preços',
+    'clientes': 'Cliente com vendas registradas',
+    'vendas': 'Venda arquivada',
+}
+
+
+class RelatorioExclusao:
+    """Resultado de uma exclusão em lote: ids excluídos, bloqueados (com motivo) e não encontrados"""
+
+    def __init__(self):
+        self.excluidos = []
+        self.bloqueados = {}
+        self.nao_encontrados = []
+
+    def bloquear(self, ids, motivo):
+        for id in ids:
+            self.bloqueados[id] = motivo
+
+    def to_dict(self):
+        return {
+            'total_excluidos': len(self.excluidos),
+            'excluidos': sorted(self.excluidos),
+            'total_bloqueados': len(self.bloqueados),
+            'bloqueados': [{'id': id, 'motivo': motivo} for id, motivo in sorted(self.bloqueados.items())],
+            'nao_encontrados': sorted(self.nao_encontrados),
+        }
+
+
+# Só existe nos bancos criados por base.sql
+historico_precos = table('historico_precos', column('livro_id'))
+
+
+def _travar(coluna, ids, *colunas):
+    """Linhas existentes entre os ids, travadas até o fim da transação"""
+    return db.session.execute(select(coluna, *colunas).where(coluna.in_(ids)).with_for_update()).all()
+
+
+def _usados(ids, *colunas):
+    """Ids referenciados em alguma das colunas (verificação de chave estrangeira)"""
+    usados = set()
+    for coluna in colunas:
+        usados.update(db.session.scalars(select(coluna).where(coluna.in_(ids)).distinct()))
+    return usados
+
+
+def _excluir_autores(ids, relatorio):
+    existentes = [autor_id for autor_id, in _travar(Autor.autor_id, ids)]
+    if existentes:
+        for tabela, coluna in (
+            (livro_autor, livro_autor.c.autor_id), (MetricaAutor, MetricaAutor.autor_id),
+            (VendaDiariaAutor, VendaDiariaAutor.autor_id), (VendaMensalAutor, VendaMensalAutor.autor_id),
+            (Autor, Autor.autor_id),
+        ):
+            db.session.execute(delete(tabela).where(coluna.in_(existentes)))
+
+    def confirmar():
+        ajustar_estatisticas(total_autores=-len(existentes))
+        invalidar_contagem(Autor.__tablename__)
+        busca.busca_catalogo.marcar_autores(existentes)
+    return existentes, confirmar
+
+
+def _excluir_livros(ids, relatorio):
+    existentes = {livro_id for livro_id, in _travar(Livro.livro_id, ids)}
+    bloqueados = _usados(existentes, VendaItem.livro_id, VendaItemArquivado.livro_id) if existentes else set()
+    relatorio.bloquear(bloqueados, MOTIVOS['livros'])
+    if existentes - bloqueados and inspect(db.session.connection()).has_table('historico_precos'):
+        auditados = _usados(existentes - bloqueados, historico_precos.c.livro_id)
+        relatorio.bloquear(auditados, MOTIVOS['historico_precos'])
+        bloqueados |= auditados
+    excluir = sorted(existentes - bloqueados)
+    if excluir:
+        for tabela, coluna in (
+            (livro_autor, livro_autor.c.livro_id), (Estoque, Estoque.livro_id),
+            (VendaDiaria, VendaDiaria.livro_id), (Livro, Livro.livro_id),
+        ):
+            db.session.execute(delete(tabela).where(coluna.in_(excluir)))
+
+    def confirmar():
+        ajustar_estatisticas(total_livros=-len(excluir))
+        invalidar_contagem(Livro.__tablename__)
+        busca.busca_catalogo.marcar_livros(excluir)
+    return excluir, confirmar
+
+
+def _excluir_clientes(ids, relatorio):
+    existentes = {cliente_id for cliente_id, in _travar(Cliente.cliente_id, ids)}
+    bloqueados = _usados(existentes, Venda.cliente_id, VendaArquivada.cliente_id) if existentes else set()
+    relatorio.bloquear(bloqueados, MOTIVOS['clientes'])
+    excluir = sorted(existentes - bloqueados)
+    if excluir:
+        db.session.execute(delete(SegmentacaoCliente).where(SegmentacaoCliente.cliente_id.in_(excluir)))
+        db.session.execute(delete(Cliente).where(Cliente.cliente_id.in_(excluir)))
+
+    def confirmar():
+        ajustar_estatisticas(total_clientes=-len(excluir))
+        invalidar_contagem(Cliente.__tablename__)
+    return excluir, confirmar
+
+
+def _excluir_vendas(ids, relatorio):
+    valores = dict(_travar(Venda.venda_id, ids, Venda.valor_total))
+    ausentes = set(ids) - valores.keys()
+    if ausentes:
+        relatorio.bloquear(_usados(ausentes, VendaArquivada.venda_id), MOTIVOS['vendas'])
+    excluir = sorted(valores)
+    if excluir:
+        registrar_vendas(excluir, -1)  # Antes do DELETE: os eventos copiam os itens
+        db.session.execute(delete(VendaItem).where(VendaItem.venda_id.in_(excluir)))
+        db.session.execute(delete(Venda).where(Venda.venda_id.in_(excluir)))
+    total = sum(valores.values(), 0)
+
+    def confirmar():
+        ajustar_estatisticas(total_vendas=-total)
+        invalidar_contagem(Venda.__tablename__)
+    return excluir, confirmar
+
+
+EXCLUSOES = {
+    'autores': _excluir_autores,
+    'livros': _excluir_livros,
+    'clientes': _excluir_clientes,
+    'vendas': _excluir_vendas,
+}
+
+
+def excluir(tipo, ids, tamanho_lote=500):
+    """Exclui os ids de `tipo` em lotes, uma transação por lote; retorna o RelatorioExclusao.
+
+    Um lote que falhar no banco é desfeito por inteiro e seus ids são
+    relatados como bloqueados, sem interromper os demais.
+    """
+    funcao = EXCLUSOES[tipo]
+    relatorio = RelatorioExclusao()
+    ids = iter(dict.fromkeys(ids))
+    while True:
+        lote = list(islice(ids, tamanho_lote))
+        if not lote:
+            break
+        bloqueados_antes = set(relatorio.bloqueados)
+        try:
+            excluidos, confirmar = funcao(lote, relatorio)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for id in set(relatorio.bloqueados) - bloqueados_antes:
+                del relatorio.bloqueados[id]
+            relatorio.bloquear(lote, f'Falha ao excluir o lote: {e}')
+            continue
+        relatorio.excluidos += excluidos
+        resolvidos = set(excluidos) | relatorio.bloqueados.keys()
+        relatorio.nao_encontrados += [id for id in lote if id not in resolvidos]
+        if excluidos:
+            confirmar()
+    return relatorio
@@ -0,0 +1,163 @@
+import csv
+import heapq
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+
+from models import (
+    db, Autor, Livro, Cliente, Venda, VendaItem, VendaArquivada, VendaItemArquivado, livro_autor
+)
+
+# Exportações completas em CSV ou JSON Lines.
+#
+# As linhas são lidas com yield_per (cursor no servidor no PostgreSQL) e
+# escritas em blocos de tamanho fixo; a memória usada não depende do
+# tamanho das tabelas. A compressão gzip também é feita bloco a bloco.
+
+COLUNAS_VENDAS = (
+    'venda_id', 'data_venda', 'valor_total', 'cliente_id', 'cliente_nome', 'cliente_email',
+    'item_id', 'livro_id', 'titulo', 'isbn', 'quantidade', 'preco_unitario'
+)
+COLUNAS_CLIENTES = ('cliente_id', 'nome', 'email', 'data_cadastro')
+COLUNAS_CATALOGO = ('livro_id', 'titulo', 'isbn', 'data_publicacao', 'genero', 'autores')
+
+
+def _vendas(inicio, fim, yield_per):
+    """Uma linha por item de venda, com os dados do cliente e do livro.
+
+    Vendas e arquivo (arquivamento.py) são lidos em dois cursores ordenados
+    por (data_venda, venda_id, item_id) e intercalados em um merge. No
+    arquivo, cliente e livro podem ter sido excluídos: os dados deles saem
+    vazios, mantendo os ids gravados na venda.
+    """
+    arquivo, arquivo_itens = VendaArquivada.__table__, VendaItemArquivado.__table__
+    recentes = (
+        db.select(
+            Venda.venda_id, Venda.data_venda, Venda.valor_total,
+            Cliente.cliente_id, Cliente.nome, Cliente.email,
+            VendaItem.item_id, Livro.livro_id, Livro.titulo, Livro.isbn,
+            VendaItem.quantidade, VendaItem.preco_unitario
+        )
+        .join(Cliente, Cliente.cliente_id == Venda.cliente_id)
+        .join(VendaItem, VendaItem.venda_id == Venda.venda_id)
+        .join(Livro, Livro.livro_id == VendaItem.livro_id)
+        .order_by(Venda.data_venda, Venda.venda_id, VendaItem.item_id)
+    )
+    arquivadas = (
+        db.select(
+            arquivo.c.venda_id, arquivo.c.data_venda, arquivo.c.valor_total,
+            arquivo.c.cliente_id, Cliente.nome, Cliente.email,
+            arquivo_itens.c.item_id, arquivo_itens.c.livro_id, Livro.titulo, Livro.isbn,
+            arquivo_itens.c.quantidade, arquivo_itens.c.preco_unitario
+        )
+        .join(arquivo_itens, arquivo_itens.c.venda_id == arquivo.c.venda_id)
+        .outerjoin(Cliente, Cliente.cliente_id == arquivo.c.cliente_id)
+        .outerjoin(Livro, Livro.livro_id == arquivo_itens.c.livro_id)
+        .order_by(arquivo.c.data_venda, arquivo.c.venda_id, arquivo_itens.c.item_id)
+    )
+    if inicio:
+        recentes = recentes.where(Venda.data_venda >= inicio)
+        arquivadas = arquivadas.where(arquivo.c.data_venda >= inicio)
+    if fim:
+        recentes = recentes.where(Venda.data_venda <= fim)
+        arquivadas = arquivadas.where(arquivo.c.data_venda <= fim)
+    yield from heapq.merge(
+        db.session.execute(arquivadas.execution_options(yield_per=yield_per)),
+        db.session.execute(recentes.execution_options(yield_per=yield_per)),
+        key=lambda linha: (linha.data_venda, linha.venda_id, linha.item_id)
+    )
+
+
+def _clientes(inicio, fim, yield_per):
+    consulta = db.select(
+        Cliente.cliente_id, Cliente.nome, Cliente.email, Cliente.data_cadastro
+    ).order_by(Cliente.cliente_id)
+    yield from db.session.execute(consulta.execution_options(yield_per=yield_per))
+
+
+def _catalogo(inicio, fim, yield_per):
+    """Livros com os nomes dos autores separados por ';'.
+
+    Livros e vínculos são lidos em dois cursores ordenados por livro_id e
+    combinados em um merge, sem agregar no banco nem carregar o catálogo.
+    """
+    livros = db.session.execute(
+        db.select(Livro.livro_id, Livro.titulo, Livro.isbn, Livro.data_publicacao, Livro.genero)
+        .order_by(Livro.livro_id)
+        .execution_options(yield_per=yield_per)
+    )
+    vinculos = db.session.execute(
+        db.select(livro_autor.c.livro_id, Autor.nome)
+        .join(Autor, Autor.autor_id == livro_autor.c.autor_id)
+        .order_by(livro_autor.c.livro_id, Autor.nome)
+        .execution_options(yield_per=yield_per)
+    )
+    vinculo = next(vinculos, None)
+    for livro in livros:
+        autores = []
+        while vinculo is not None and vinculo.livro_id <= livro.livro_id:
+            if vinculo.livro_id == livro.livro_id:
+                autores.append(vinculo.nome)
+            vinculo = next(vinculos, None)
+        yield (*livro, '; '.join(autores))
+
+
+EXPORTACOES = {
+    'vendas': (COLUNAS_VENDAS, _vendas),
+    'clientes': (COLUNAS_CLIENTES, _clientes),
+    'catalogo': (COLUNAS_CATALOGO, _catalogo),
+}
+FORMATOS = ('csv', 'jsonl')
+
+
+def _valor_json(valor):
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+
+def exportar(tipo, formato='csv', inicio=None, fim=None, yield_per=1000, tamanho_bloco=65536):
+    """Gera o conteúdo da exportação em blocos de texto de ~tamanho_bloco caracteres.
+
+    inicio e fim (datas, inclusivas) filtram data_venda na exportação de vendas.
+    """
+    colunas, linhas = EXPORTACOES[tipo]
+    buffer = io.StringIO()
+
+    if formato == 'csv':
+        escritor = csv.writer(buffer, lineterminator='\n')
+        escritor.writerow(colunas)
+        escrever = escritor.writerow
+    else:
+        def escrever(linha):
+            buffer.write(json.dumps(
+                dict(zip(colunas, map(_valor_json, linha))), ensure_ascii=False
+            ))
+            buffer.write('\n')
+
+    for linha in linhas(inicio, fim, yield_per):
+        escrever(linha)
+        if buffer.tell() >= tamanho_bloco:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def codificar(blocos, comprimir=False, nivel=6):
+    """Converte os blocos de texto em bytes UTF-8, opcionalmente em gzip"""
+    if not comprimir:
+        for bloco in blocos:
+            yield bloco.encode('utf-8')
+        return
+
+    compressor = zlib.compressobj(nivel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for bloco in blocos:
+        # Sync flush por bloco: o cliente recebe os dados sem esperar o fim do arquivo
+        yield compressor.compress(bloco.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
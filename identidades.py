@@ -0,0 +1,204 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from flask_login import UserMixin
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+
+from models import db, Usuario
+
+# Cada worker guarda as identidades em um cache próprio (CacheIdentidades).
+# Para que uma desativação ou troca de senha valha em todos os workers na
+# requisição seguinte, e não só depois do TTL, cada usuário tem uma versão
+# em um arquivo SQLite local compartilhado pelos workers do servidor (como
+# as estatísticas do dashboard). O commit que altera um usuário incrementa a
+# versão dele; uma identidade em cache só é usada se foi carregada na versão
+# atual. Sem o arquivo (erro do SQLite), o cache não é usado.
+
+_local = threading.local()
+
+
+class IdentidadeUsuario(UserMixin):
+    """Representação leve do usuário logado, usada pelo Flask-Login.
+
+    Guarda apenas os campos necessários em toda requisição. Qualquer outro
+    atributo (email, to_dict, check_password...) é buscado no Usuario
+    completo sob demanda.
+    """
+
+    def __init__(self, usuario_id, username, is_admin, is_active):
+        self.usuario_id = usuario_id
+        self.username = username
+        self.is_admin = is_admin
+        self._ativo = is_active
+
+    @property
+    def is_active(self):
+        return self._ativo
+
+    def get_id(self):
+        return str(self.usuario_id)
+
+    def __getattr__(self, nome):
+        if nome.startswith('_'):
+            raise AttributeError(nome)
+        usuario = db.session.get(Usuario, self.usuario_id)
+        return getattr(usuario, nome)
+
+    def __repr__(self):
+        return f'<IdentidadeUsuario {self.username}>'
+
+
+class CacheIdentidades:
+    """Cache LRU com expiração (TTL) de identidades de usuário, por processo, validado pela versão"""
+
+    def __init__(self, maximo=1024, ttl=60):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, usuario_id, versao):
+        with self._lock:
+            item = self._itens.get(usuario_id)
+            if item is None:
+                return None
+            expira_em, versao_item, identidade = item
+            if expira_em < time.monotonic() or versao_item != versao:
+                del self._itens[usuario_id]
+                return None
+            self._itens.move_to_end(usuario_id)
+            return identidade
+
+    def guardar(self, identidade, versao):
+        if self.maximo <= 0:
+            return
+        with self._lock:
+            self._itens[identidade.usuario_id] = (time.monotonic() + self.ttl, versao, identidade)
+            self._itens.move_to_end(identidade.usuario_id)
+            while len(self._itens) > self.maximo:
+                self._itens.popitem(last=False)
+
+    def invalidar(self, usuario_id):
+        with self._lock:
+            self._itens.pop(usuario_id, None)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+
+cache_identidades = CacheIdentidades()
+
+
+# ----- Versões compartilhadas -----
+
+def _caminho_arquivo():
+    return current_app.config.get('IDENTIDADES_VERSOES_ARQUIVO') or \
+        os.path.join(current_app.instance_path, 'identidades.db')
+
+
+def _conexao():
+    """Conexão com o arquivo de versões, uma por thread"""
+    caminho = _caminho_arquivo()
+    conexoes = getattr(_local, 'conexoes', None)
+    if conexoes is None:
+        conexoes = _local.conexoes = {}
+    if caminho not in conexoes:
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        conn = sqlite3.connect(caminho, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS versoes_usuarios '
+            '(usuario_id INTEGER PRIMARY KEY, versao INTEGER NOT NULL)'
+        )
+        conexoes[caminho] = conn
+    return conexoes[caminho]
+
+
+def _versao(usuario_id):
+    """Versão atual do usuário (0 se nunca alterado); None se o arquivo estiver indisponível"""
+    try:
+        linha = _conexao().execute(
+            'SELECT versao FROM versoes_usuarios WHERE usuario_id = ?', (usuario_id,)
+        ).fetchone()
+    except sqlite3.Error as e:
+        current_app.logger.warning(f'Versões de usuários indisponíveis: {e}')
+        return None
+    return linha[0] if linha else 0
+
+
+def _incrementar_versoes(usuario_ids):
+    try:
+        conn = _conexao()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                'INSERT INTO versoes_usuarios (usuario_id, versao) VALUES (?, 1) '
+                'ON CONFLICT (usuario_id) DO UPDATE SET versao = versao + 1',
+                [(usuario_id,) for usuario_id in sorted(usuario_ids)]
+            )
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            conn.execute('ROLLBACK')
+            raise
+    except sqlite3.Error as e:
+        current_app.logger.warning(f'Versões de usuários indisponíveis: {e}')
+
+
+def carregar_identidade(usuario_id):
+    """Identidade do usuário, do cache ou de uma consulta só com os campos leves"""
+    # Versão lida antes da consulta: uma alteração confirmada depois dela invalida o que for guardado
+    versao = _versao(usuario_id) if cache_identidades.maximo > 0 else None
+    if versao is not None:
+        identidade = cache_identidades.obter(usuario_id, versao)
+        if identidade is not None:
+            return identidade
+
+    linha = db.session.execute(
+        db.select(Usuario.usuario_id, Usuario.username, Usuario.is_admin, Usuario.is_active)
+        .where(Usuario.usuario_id == usuario_id)
+    ).first()
+    if linha is None:
+        return None
+
+    identidade = IdentidadeUsuario(*linha)
+    if versao is not None:
+        cache_identidades.guardar(identidade, versao)
+    return identidade
+
+
+@event.listens_for(Usuario, 'after_update')
+@event.listens_for(Usuario, 'after_delete')
+def _marcar_usuario(mapper, connection, usuario):
+    """Anota na sessão o usuário alterado (senha, desativação, último login...)"""
+    object_session(usuario).info.setdefault('usuarios_alterados', set()).add(usuario.usuario_id)
+
+
+def _invalidar_usuarios(session):
+    """Após o commit, incrementa a versão compartilhada e remove do cache os usuários alterados"""
+    usuario_ids = session.info.pop('usuarios_alterados', None)
+    if not usuario_ids:
+        return
+    _incrementar_versoes(usuario_ids)
+    for usuario_id in usuario_ids:
+        cache_identidades.invalidar(usuario_id)
+
+
+def _descartar(session):
+    session.info.pop('usuarios_alterados', None)
+
+
+def init_app(app):
+    """Configura o tamanho e o TTL do cache e a invalidação no commit"""
+    for nome, funcao in (('after_commit', _invalidar_usuarios), ('after_rollback', _descartar)):
+        if not event.contains(Session, nome, funcao):
+            event.listen(Session, nome, funcao)
+    cache_identidades.maximo = app.config['IDENTIDADES_CACHE_MAX']
+    cache_identidades.ttl = app.config['IDENTIDADES_CACHE_TTL']
+    cache_identidades.limpar()
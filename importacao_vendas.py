@@ -0,0 +1,209 @@
+import csv
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from sqlalchemy import insert
+
+from models import db, Cliente, Livro, Venda, VendaItem
+from estatisticas import ajustar_estatisticas
+from recomendacoes import motor_recomendacoes
+from rollup import registrar_vendas
+
+# Formatos aceitos:
+#
+# JSON Lines - uma venda por linha:
+#   {"cliente_id": 1, "data_venda": "2025-01-10",
+#    "itens": [{"livro_id": 1, "quantidade": 2, "preco_unitario": "35.90"}]}
+#
+# CSV - um item por linha; linhas consecutivas com o mesmo venda_ref formam
+# uma venda (sem a coluna venda_ref, cada linha é uma venda):
+#   venda_ref,cliente_id,data_venda,livro_id,quantidade,preco_unitario
+
+# Limites das colunas (Numeric(10, 2) e Integer): valores maiores falhariam no
+# INSERT e derrubariam o lote inteiro, em vez de só a linha
+VALOR_MAXIMO = Decimal('99999999.99')
+QUANTIDADE_MAXIMA = 2 ** 31 - 1
+
+
+class RelatorioImportacao:
+    """Resultado de uma importação: totais gravados e erros por linha"""
+
+    def __init__(self):
+        self.vendas = 0
+        self.itens = 0
+        self.valor_total = Decimal('0')
+        self.erros = []
+
+    def erro(self, linha, mensagem):
+        self.erros.append({'linha': linha, 'erro': mensagem})
+
+    def to_dict(self):
+        return {
+            'vendas_inseridas': self.vendas,
+            'itens_inseridos': self.itens,
+            'valor_total': str(self.valor_total.quantize(Decimal('0.01'))),
+            'total_erros': len(self.erros),
+            'erros': sorted(self.erros, key=lambda erro: erro['linha'])
+        }
+
+
+def ler_jsonl(linhas):
+    """Gera (linha, dados) para cada venda de um arquivo JSON Lines"""
+    for numero, texto in enumerate(linhas, 1):
+        if not texto.strip():
+            continue
+        try:
+            yield numero, json.loads(texto)
+        except ValueError as e:
+            yield numero, f'JSON inválido: {e}'
+
+
+def ler_csv(linhas):
+    """Gera (linha, dados) agrupando itens consecutivos com o mesmo venda_ref"""
+    leitor = csv.DictReader(linhas)
+    atual, ref_atual, linha_atual = None, None, None
+    for linha in leitor:
+        numero = leitor.line_num
+        ref = linha.get('venda_ref') or None
+        item = {
+            'livro_id': linha.get('livro_id'),
+            'quantidade': linha.get('quantidade'),
+            'preco_unitario': linha.get('preco_unitario')
+        }
+        if atual is not None and ref is not None and ref == ref_atual:
+            atual['itens'].append(item)
+            continue
+        if atual is not None:
+            yield linha_atual, atual
+        atual = {
+            'cliente_id': linha.get('cliente_id'),
+            'data_venda': linha.get('data_venda'),
+            'itens': [item]
+        }
+        ref_atual, linha_atual = ref, numero
+    if atual is not None:
+        yield linha_atual, atual
+
+
+def _normalizar(dados):
+    """Converte e valida os campos de uma venda; levanta ValueError se inválida"""
+    if not isinstance(dados, dict):
+        raise ValueError('Registro deve ser um objeto')
+    try:
+        cliente_id = int(dados['cliente_id'])
+        data_venda = datetime.strptime(str(dados['data_venda']), '%Y-%m-%d').date()
+    except KeyError as e:
+        raise ValueError(f'Campo obrigatório ausente: {e.args[0]}')
+    except (TypeError, ValueError):
+        raise ValueError('cliente_id ou data_venda inválido')
+
+    itens = dados.get('itens') or []
+    if not isinstance(itens, list):
+        raise ValueError('itens deve ser uma lista')
+    normalizados = []
+    for item in itens:
+        try:
+            quantidade = int(item['quantidade'])
+            preco = Decimal(str(item['preco_unitario']))
+            livro_id = int(item['livro_id'])
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            raise ValueError('Item com livro_id, quantidade ou preco_unitario inválido')
+        if not preco.is_finite() or preco > VALOR_MAXIMO or quantidade > QUANTIDADE_MAXIMA:
+            raise ValueError('Item com quantidade ou preco_unitario fora do limite')
+        if quantidade <= 0 or preco < 0:
+            raise ValueError('Quantidade deve ser positiva e preço não negativo')
+        normalizados.append({'livro_id': livro_id, 'quantidade': quantidade, 'preco_unitario': preco})
+
+    if not normalizados:
+        raise ValueError('Venda sem itens')
+    if sum(item['quantidade'] * item['preco_unitario'] for item in normalizados) > VALOR_MAXIMO:
+        raise ValueError('Valor total da venda fora do limite')
+    return {'cliente_id': cliente_id, 'data_venda': data_venda, 'itens': normalizados}
+
+
+def _ids_existentes(coluna, ids):
+    if not ids:
+        return set()
+    return set(db.session.scalars(db.select(coluna).where(coluna.in_(ids))))
+
+
+def _processar_lote(lote, relatorio):
+    validas = []
+    for linha, dados in lote:
+        if isinstance(dados, str):
+            relatorio.erro(linha, dados)
+            continue
+        try:
+            validas.append((linha, _normalizar(dados)))
+        except ValueError as e:
+            relatorio.erro(linha, str(e))
+
+    # Validação dos relacionamentos com uma consulta por tabela
+    clientes = _ids_existentes(Cliente.cliente_id, {v['cliente_id'] for _, v in validas})
+    livros = _ids_existentes(Livro.livro_id, {i['livro_id'] for _, v in validas for i in v['itens']})
+
+    vendas = []
+    for linha, venda in validas:
+        if venda['cliente_id'] not in clientes:
+            relatorio.erro(linha, f"Cliente {venda['cliente_id']} não encontrado")
+            continue
+        faltando = sorted({i['livro_id'] for i in venda['itens']} - livros)
+        if faltando:
+            relatorio.erro(linha, f'Livro(s) não encontrado(s): {faltando}')
+            continue
+        venda['valor_total'] = sum(i['quantidade'] * i['preco_unitario'] for i in venda['itens'])
+        vendas.append((linha, venda))
+
+    if not vendas:
+        return
+
+    try:
+        venda_ids = db.session.scalars(
+            insert(Venda).returning(Venda.venda_id, sort_by_parameter_order=True),
+            [
+                {'cliente_id': v['cliente_id'], 'data_venda': v['data_venda'], 'valor_total': v['valor_total']}
+                for _, v in vendas
+            ]
+        ).all()
+        itens = [
+            dict(item, venda_id=venda_id)
+            for venda_id, (_, venda) in zip(venda_ids, vendas)
+            for item in venda['itens']
+        ]
+        db.session.execute(insert(VendaItem), itens)
+        registrar_vendas(venda_ids)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        for linha, _ in vendas:
+            relatorio.erro(linha, f'Falha ao gravar o lote: {e}')
+        return
+
+    valor_lote = sum(v['valor_total'] for _, v in vendas)
+    relatorio.vendas += len(vendas)
+    relatorio.itens += len(itens)
+    relatorio.valor_total += valor_lote
+    ajustar_estatisticas(total_vendas=valor_lote)
+    motor_recomendacoes.registrar_itens(
+        (venda['cliente_id'], item['livro_id'], item['preco_unitario'])
+        for _, venda in vendas
+        for item in venda['itens']
+    )
+
+
+def importar_vendas(registros, tamanho_lote=1000):
+    """Importa vendas em lotes; cada lote é validado e gravado em uma transação.
+
+    `registros` é um iterável de (linha, dados) como o gerado por ler_jsonl
+    ou ler_csv. Registros inválidos são relatados sem interromper o lote.
+    """
+    relatorio = RelatorioImportacao()
+    registros = iter(registros)
+    while True:
+        lote = list(islice(registros, tamanho_lote))
+        if not lote:
+            break
+        _processar_lote(lote, relatorio)
+    return relatorio
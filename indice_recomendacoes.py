@@ -0,0 +1,157 @@
+from collections import defaultdict
+
+import numpy as np
+from scipy import sparse
+
+# Índice de recomendações: matrizes esparsas do catálogo e a pontuação dos
+# livros. Separado de recomendacoes.py para que numpy/scipy só sejam
+# carregados na primeira recomendação, e não no início de cada worker.
+
+MOTIVOS = ('Comprado junto', 'Mesmo autor', 'Mesmo gênero', 'Popular')
+
+
+class IndiceRecomendacoes:
+    """Matrizes e vetores do catálogo usados para pontuar os livros"""
+
+    def __init__(self, livro_ids, generos, vinculos, compras, precos):
+        # Livros: posição na matriz <-> livro_id
+        self.livro_ids = np.asarray(livro_ids, dtype=np.int64)
+        self.posicao = {livro_id: i for i, livro_id in enumerate(livro_ids)}
+        total = len(livro_ids)
+
+        # As consultas de reconstruir() não leem o mesmo snapshot: vínculos e
+        # vendas de livros criados depois da leitura dos livros (ou sem livro,
+        # venda_itens.livro_id aceita NULL em base.sql) ficam de fora, como em
+        # registrar_compra; entram na próxima reconstrução
+        vinculos = [(livro_id, autor_id) for livro_id, autor_id in vinculos if livro_id in self.posicao]
+        compras = [(cliente_id, livro_id) for cliente_id, livro_id in compras if livro_id in self.posicao]
+        precos = [linha for linha in precos if linha[0] in self.posicao]
+
+        # Gênero de cada livro como índice (-1 sem gênero)
+        nomes_generos = sorted({genero for genero in generos if genero})
+        indice_genero = {genero: i for i, genero in enumerate(nomes_generos)}
+        self.genero = np.array([indice_genero.get(genero, -1) for genero in generos], dtype=np.int64)
+        self.total_generos = len(nomes_generos)
+
+        # Livro x autor (binária)
+        autores = sorted({autor_id for _, autor_id in vinculos})
+        indice_autor = {autor_id: i for i, autor_id in enumerate(autores)}
+        linhas = [self.posicao[livro_id] for livro_id, _ in vinculos]
+        colunas = [indice_autor[autor_id] for _, autor_id in vinculos]
+        self.autores = sparse.csr_matrix(
+            (np.ones(len(linhas)), (linhas, colunas)), shape=(total, max(len(autores), 1))
+        )
+
+        # Compras distintas por cliente e coocorrência livro x livro (B^T B)
+        self.compras = defaultdict(set)
+        for cliente_id, livro_id in compras:
+            self.compras[cliente_id].add(self.posicao[livro_id])
+        clientes = {cliente_id: i for i, cliente_id in enumerate(self.compras)}
+        linhas = [clientes[cliente_id] for cliente_id, livros in self.compras.items() for _ in livros]
+        colunas = [posicao for livros in self.compras.values() for posicao in livros]
+        compras_binaria = sparse.csr_matrix(
+            (np.ones(len(linhas), dtype=np.float32), (linhas, colunas)),
+            shape=(max(len(clientes), 1), total)
+        )
+        self.compradores = np.asarray(compras_binaria.sum(axis=0), dtype=np.float64).ravel()
+        coocorrencia = (compras_binaria.T @ compras_binaria).tocsr()
+        coocorrencia.setdiag(0)
+        coocorrencia.eliminate_zeros()
+        self.coocorrencia = coocorrencia
+        self.delta = defaultdict(float)  # (i, j) -> incremento ainda não incorporado
+        self._delta_csr = None
+
+        # Preço médio por item vendido (como no procedimento armazenado)
+        self.soma_precos = np.zeros(total)
+        self.itens_vendidos = np.zeros(total)
+        for livro_id, soma, quantidade in precos:
+            self.soma_precos[self.posicao[livro_id]] = float(soma)
+            self.itens_vendidos[self.posicao[livro_id]] = quantidade
+
+    def registrar_compra(self, cliente_id, livro_id, preco):
+        """Incorpora um item vendido; retorna False se o livro não está no índice"""
+        posicao = self.posicao.get(livro_id)
+        if posicao is None:
+            return False
+        self.soma_precos[posicao] += float(preco)
+        self.itens_vendidos[posicao] += 1
+
+        compras = self.compras[cliente_id]
+        if posicao in compras:
+            return True
+        for outro in compras:
+            self.delta[posicao, outro] += 1
+            self.delta[outro, posicao] += 1
+        compras.add(posicao)
+        self.compradores[posicao] += 1
+        self._delta_csr = None
+        return True
+
+    def consolidar(self, maximo):
+        """Soma o delta à matriz de coocorrência quando ele passa de `maximo` entradas"""
+        if len(self.delta) <= maximo:
+            return
+        self.coocorrencia = (self.coocorrencia + self._matriz_delta()).tocsr()
+        self.delta.clear()
+        self._delta_csr = None
+
+    def _matriz_delta(self):
+        if self._delta_csr is None:
+            total = len(self.livro_ids)
+            if self.delta:
+                (linhas, colunas), valores = zip(*self.delta.keys()), list(self.delta.values())
+            else:
+                linhas, colunas, valores = (), (), ()
+            self._delta_csr = sparse.csr_matrix((valores, (linhas, colunas)), shape=(total, total))
+        return self._delta_csr
+
+    @staticmethod
+    def _normalizar(valores):
+        maximo = valores.max() if valores.size else 0
+        return valores / maximo if maximo > 0 else valores
+
+    def recomendar(self, cliente_id, k, pesos):
+        """Lista de (livro_id, pontuacao, motivo) para os k melhores livros não comprados"""
+        compradas = np.fromiter(self.compras.get(cliente_id, ()), dtype=np.int64)
+        total = len(self.livro_ids)
+        componentes = np.zeros((4, total))
+
+        if compradas.size:
+            # Cosseno: (u / sqrt(n)) . C / sqrt(n), com n = compradores de cada livro
+            # Apenas as linhas dos livros comprados são lidas
+            normas = np.sqrt(np.maximum(self.compradores, 1))
+            pesos_compradas = 1 / normas[compradas]
+            cooc = self.coocorrencia[compradas].T @ pesos_compradas
+            if self.delta:
+                cooc += self._matriz_delta()[compradas].T @ pesos_compradas
+            componentes[0] = self._normalizar(cooc / normas)
+
+            preferencia_autor = np.asarray(self.autores[compradas].sum(axis=0)).ravel()
+            componentes[1] = self._normalizar(self.autores @ preferencia_autor)
+
+            if self.total_generos:  # Sem nenhum livro com gênero o componente fica zerado
+                generos = self.genero[compradas]
+                preferencia_genero = np.bincount(generos[generos >= 0], minlength=self.total_generos)
+                por_livro = np.where(self.genero >= 0, preferencia_genero[np.maximum(self.genero, 0)], 0)
+                componentes[2] = self._normalizar(por_livro.astype(np.float64))
+        componentes[3] = self._normalizar(self.compradores)
+
+        ponderados = componentes * np.asarray(pesos)[:, None]
+        pontuacao = ponderados.sum(axis=0)
+        pontuacao[compradas] = -np.inf
+
+        k = min(k, total - compradas.size)
+        if k <= 0:
+            return []
+        melhores = np.argpartition(-pontuacao, k - 1)[:k]
+        melhores = melhores[np.lexsort((self.livro_ids[melhores], -pontuacao[melhores]))]
+        return [
+            (int(self.livro_ids[i]), float(pontuacao[i]), MOTIVOS[int(ponderados[:, i].argmax())])
+            for i in melhores
+        ]
+
+    def preco_medio(self, livro_id):
+        posicao = self.posicao[livro_id]
+        if not self.itens_vendidos[posicao]:
+            return None
+        return round(self.soma_precos[posicao] / self.itens_vendidos[posicao], 2)
@@ -0,0 +1,276 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+import urllib.parse
+
+from limits.storage import MovingWindowSupport, Storage
+
+# Armazenamento do Flask-Limiter em um arquivo mapeado em memória, para que
+# todos os workers de um mesmo servidor compartilhem os contadores.
+#
+# O arquivo é uma tabela hash de tamanho fixo dividida em faixas; cada chave
+# pertence a uma faixa (hash % faixas) e é procurada por sondagem linear
+# dentro dela. Cada faixa tem seu lock (threading.Lock dentro do processo e
+# fcntl.lockf sobre um byte do arquivo entre processos), então chaves de
+# faixas diferentes não disputam o mesmo lock.
+#
+# Layout:
+#   cabeçalho: magic, versão, slots, faixas, janela_max
+#   bytes de lock: um por faixa
+#   slots: hash (u64), contagem (i64), expira_em (f64), cabeça (i64),
+#          janela_max timestamps (f64) para a janela móvel
+#
+# Uso: RATELIMIT_STORAGE_URI = 'mmap:///caminho/do/arquivo'
+
+MAGIC = b'EDLIMMAP'
+VERSAO = 1
+CABECALHO = struct.Struct('<8sIIII')
+SLOT = struct.Struct('<Qqdq')
+TIMESTAMP = struct.Struct('<d')
+
+
+class ArmazenamentoCheio(Exception):
+    """Todos os slots de uma faixa estão ocupados por chaves ainda válidas"""
+
+
+class ArmazenamentoMmap(Storage, MovingWindowSupport):
+    """Storage de limites compartilhado entre processos, com janela fixa e móvel"""
+
+    STORAGE_SCHEME = ['mmap']
+
+    def __init__(self, uri=None, wrap_exceptions=False, slots=4096, faixas=64, janela_max=64, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        caminho = urllib.parse.unquote(urllib.parse.urlparse(uri).path) if uri else ''
+        if not caminho:
+            raise ValueError("Informe o arquivo: 'mmap:///caminho/do/arquivo'")
+        self.caminho = caminho
+        self._abrir(int(slots), int(faixas), int(janela_max))
+
+    @property
+    def base_exceptions(self):
+        return (ArmazenamentoCheio, ValueError, OSError)
+
+    # ----- Arquivo e locks -----
+
+    def _abrir(self, slots, faixas, janela_max):
+        os.makedirs(os.path.dirname(self.caminho) or '.', exist_ok=True)
+        fd = os.open(self.caminho, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            # O primeiro processo define a geometria; os demais leem do cabeçalho
+            fcntl.lockf(fd, fcntl.LOCK_EX, CABECALHO.size, 0)
+            try:
+                cabecalho = os.pread(fd, CABECALHO.size, 0)
+                if len(cabecalho) == CABECALHO.size and cabecalho.startswith(MAGIC):
+                    _, versao, slots, faixas, janela_max = CABECALHO.unpack(cabecalho)
+                    if versao != VERSAO:
+                        raise ValueError(f'Arquivo de limites com versão {versao}; esperada {VERSAO}')
+                else:
+                    if slots % faixas:
+                        raise ValueError('slots deve ser múltiplo de faixas')
+                    tamanho = CABECALHO.size + faixas + slots * (SLOT.size + janela_max * TIMESTAMP.size)
+                    os.ftruncate(fd, tamanho)
+                    os.pwrite(fd, CABECALHO.pack(MAGIC, VERSAO, slots, faixas, janela_max), 0)
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN, CABECALHO.size, 0)
+            self._fd = fd
+            self._mapa = mmap.mmap(fd, 0)
+        except BaseException:
+            os.close(fd)
+            raise
+
+        self.slots = slots
+        self.faixas = faixas
+        self.janela_max = janela_max
+        self.slots_por_faixa = slots // faixas
+        self._tamanho_slot = SLOT.size + janela_max * TIMESTAMP.size
+        self._inicio_locks = CABECALHO.size
+        self._inicio_slots = CABECALHO.size + faixas
+        self._criar_locks()
+
+    def _criar_locks(self):
+        # Locks de thread não sobrevivem ao fork com segurança: recriados por processo
+        self._pid = os.getpid()
+        self._locks = [threading.Lock() for _ in range(self.faixas)]
+
+    def _travar(self, faixa):
+        if self._pid != os.getpid():
+            self._criar_locks()
+        lock = self._locks[faixa]
+        lock.acquire()
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, self._inicio_locks + faixa)
+        except BaseException:
+            lock.release()
+            raise
+        return lock
+
+    def _destravar(self, faixa, lock):
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, self._inicio_locks + faixa)
+        lock.release()
+
+    # ----- Tabela hash -----
+
+    @staticmethod
+    def _hash(chave):
+        valor = int.from_bytes(hashlib.blake2b(chave.encode(), digest_size=8).digest(), 'little')
+        return valor or 1  # 0 marca slot nunca usado
+
+    def _localizar(self, valor_hash, agora, criar):
+        """Offset do slot da chave (None se ausente e criar=False).
+
+        Deve ser chamado com o lock da faixa. Slots expirados de outras chaves
+        são reaproveitados, mas mantêm o hash até lá para não quebrar a
+        sequência de sondagem.
+        """
+        faixa = valor_hash % self.faixas
+        inicio = valor_hash // self.faixas % self.slots_por_faixa
+        reaproveitavel = None
+        for passo in range(self.slots_por_faixa):
+            indice = faixa * self.slots_por_faixa + (inicio + passo) % self.slots_por_faixa
+            offset = self._inicio_slots + indice * self._tamanho_slot
+            hash_slot, _, expira_em, _ = SLOT.unpack_from(self._mapa, offset)
+            if hash_slot == valor_hash:
+                return offset
+            if hash_slot == 0:
+                reaproveitavel = offset if reaproveitavel is None else reaproveitavel
+                break
+            if expira_em <= agora and reaproveitavel is None:
+                reaproveitavel = offset
+        if not criar:
+            return None
+        if reaproveitavel is None:
+            raise ArmazenamentoCheio(f'Faixa {faixa} do arquivo de limites está cheia')
+        self._zerar(reaproveitavel, valor_hash)
+        return reaproveitavel
+
+    def _zerar(self, offset, valor_hash):
+        self._mapa[offset:offset + self._tamanho_slot] = bytes(self._tamanho_slot)
+        SLOT.pack_into(self._mapa, offset, valor_hash, 0, 0.0, -1)
+
+    def _operar(self, chave, funcao, criar=True):
+        """Executa funcao(offset, agora) com o lock da faixa da chave"""
+        valor_hash = self._hash(chave)
+        faixa = valor_hash % self.faixas
+        lock = self._travar(faixa)
+        try:
+            agora = time.time()
+            offset = self._localizar(valor_hash, agora, criar)
+            return funcao(offset, agora)
+        finally:
+            self._destravar(faixa, lock)
+
+    # ----- Janela fixa -----
+
+    def incr(self, key, expiry, amount=1):
+        def incrementar(offset, agora):
+            valor_hash, contagem, expira_em, cabeca = SLOT.unpack_from(self._mapa, offset)
+            if expira_em <= agora:
+                contagem, expira_em = 0, agora + expiry
+            contagem += amount
+            SLOT.pack_into(self._mapa, offset, valor_hash, contagem, expira_em, cabeca)
+            return contagem
+        return self._operar(key, incrementar)
+
+    def decr(self, key, amount=1):
+        def decrementar(offset, agora):
+            if offset is None:
+                return 0
+            valor_hash, contagem, expira_em, cabeca = SLOT.unpack_from(self._mapa, offset)
+            if expira_em <= agora:
+                return 0
+            contagem = max(contagem - amount, 0)
+            SLOT.pack_into(self._mapa, offset, valor_hash, contagem, expira_em, cabeca)
+            return contagem
+        return self._operar(key, decrementar, criar=False)
+
+    def get(self, key):
+        def ler(offset, agora):
+            if offset is None:
+                return 0
+            _, contagem, expira_em, _ = SLOT.unpack_from(self._mapa, offset)
+            return contagem if expira_em > agora else 0
+        return self._operar(key, ler, criar=False)
+
+    def get_expiry(self, key):
+        def ler(offset, agora):
+            if offset is None:
+                return agora
+            _, _, expira_em, _ = SLOT.unpack_from(self._mapa, offset)
+            return expira_em if expira_em > agora else agora
+        return self._operar(key, ler, criar=False)
+
+    def clear(self, key):
+        def limpar(offset, agora):
+            if offset is not None:
+                # Mantém o hash no slot para não interromper a sondagem de outras chaves
+                self._zerar(offset, SLOT.unpack_from(self._mapa, offset)[0])
+        self._operar(key, limpar, criar=False)
+
+    # ----- Janela móvel (anel com os timestamps mais recentes) -----
+
+    def _timestamp(self, offset, cabeca, recuo):
+        """Timestamp da entrada `recuo` posições antes da mais recente"""
+        posicao = (cabeca - recuo) % self.janela_max
+        return TIMESTAMP.unpack_from(self._mapa, offset + SLOT.size + posicao * TIMESTAMP.size)[0]
+
+    def acquire_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        if limit > self.janela_max:
+            raise ValueError(f'Janela móvel suporta até {self.janela_max} entradas por chave')
+
+        def adquirir(offset, agora):
+            valor_hash, contagem, expira_em, cabeca = SLOT.unpack_from(self._mapa, offset)
+            if expira_em <= agora:
+                contagem, cabeca = 0, -1
+            # A entrada que sairia da janela ao aceitar `amount` novas ainda está dentro dela?
+            recuo = limit - amount
+            if recuo < contagem and self._timestamp(offset, cabeca, recuo) >= agora - expiry:
+                return False
+            for _ in range(amount):
+                cabeca = (cabeca + 1) % self.janela_max
+                TIMESTAMP.pack_into(self._mapa, offset + SLOT.size + cabeca * TIMESTAMP.size, agora)
+            contagem = min(contagem + amount, self.janela_max)
+            SLOT.pack_into(self._mapa, offset, valor_hash, contagem, agora + expiry, cabeca)
+            return True
+        return self._operar(key, adquirir)
+
+    def get_moving_window(self, key, limit, expiry):
+        def ler(offset, agora):
+            if offset is None:
+                return agora, 0
+            _, contagem, expira_em, cabeca = SLOT.unpack_from(self._mapa, offset)
+            if expira_em <= agora:
+                return agora, 0
+            inicio, dentro = agora, 0
+            for recuo in range(contagem):
+                timestamp = self._timestamp(offset, cabeca, recuo)
+                if timestamp <= agora - expiry:
+                    break
+                inicio, dentro = timestamp, dentro + 1
+            return inicio, dentro
+        return self._operar(key, ler, criar=False)
+
+    # ----- Manutenção -----
+
+    def check(self):
+        return not self._mapa.closed
+
+    def reset(self):
+        """Zera todos os slots; retorna quantos estavam em uso"""
+        locks = [self._travar(faixa) for faixa in range(self.faixas)]
+        try:
+            em_uso = 0
+            for indice in range(self.slots):
+                offset = self._inicio_slots + indice * self._tamanho_slot
+                if SLOT.unpack_from(self._mapa, offset)[0]:
+                    em_uso += 1
+            self._mapa[self._inicio_slots:] = bytes(len(self._mapa) - self._inicio_slots)
+            return em_uso
+        finally:
+            for faixa, lock in reversed(list(enumerate(locks))):
+                self._destravar(faixa, lock)
@@ -0,0 +1,137 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, request, current_app
+
+logger = logging.getLogger('editora.requisicoes')
+
+CAMPOS = ('metodo', 'caminho', 'status', 'duracao_ms', 'ip', 'usuario_id', 'evento', 'sql', 'parametros')
+
+
+class FormatadorJSON(logging.Formatter):
+    """Formata cada registro como uma linha JSON"""
+
+    def format(self, record):
+        dados = {
+            'momento': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'nivel': record.levelname,
+            'mensagem': record.getMessage(),
+        }
+        for campo in CAMPOS:
+            valor = getattr(record, campo, None)
+            if valor is not None:
+                dados[campo] = valor
+        if record.exc_info:
+            dados['excecao'] = self.formatException(record.exc_info)
+        return json.dumps(dados, ensure_ascii=False)
+
+
+class HandlerFilaNaoBloqueante(QueueHandler):
+    """Enfileira os registros sem nunca bloquear a thread da requisição.
+
+    Com a fila cheia (destino lento), o registro é descartado e contado em
+    `descartados`. A thread que escreve no destino é iniciada sob demanda em
+    cada processo, para funcionar também após o fork dos workers.
+    """
+
+    def __init__(self, destino, tamanho_fila):
+        super().__init__(queue.Queue(maxsize=tamanho_fila))
+        self.destino = destino
+        self.descartados = 0
+        self._listener = None
+        self._pid = None
+        self._lock_listener = threading.Lock()
+
+    def _garantir_listener(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock_listener:
+            if self._pid == os.getpid():
+                return
+            self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self._listener = QueueListener(self.queue, self.destino, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def prepare(self, record):
+        # Formatação fica a cargo do destino, na thread de escrita
+        return record
+
+    def enqueue(self, record):
+        self._garantir_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+    def parar(self):
+        """Esvazia a fila e encerra a thread de escrita"""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._pid = None
+
+
+def _iniciar_requisicao():
+    g.inicio_requisicao = time.perf_counter()
+
+
+def _registrar_requisicao(response):
+    status = response.status_code
+    amostragem = current_app.config['LOG_AMOSTRAGEM']
+    # Erros são sempre registrados; respostas de sucesso seguem a amostragem
+    if status < 400 and amostragem < 1 and random.random() >= amostragem:
+        return response
+
+    inicio = g.get('inicio_requisicao')
+    # Usa o usuário já carregado pelo Flask-Login, sem disparar um novo carregamento
+    usuario = g.get('_login_user')
+    usuario_id = usuario.get_id() if usuario is not None and usuario.is_authenticated else None
+
+    if status == 429:
+        nivel, evento = logging.WARNING, 'rate_limit'
+    elif status >= 500:
+        nivel, evento = logging.ERROR, None
+    else:
+        nivel, evento = logging.INFO, None
+
+    logger.log(nivel, '%s %s %s', request.method, request.path, status, extra={
+        'metodo': request.method,
+        'caminho': request.path,
+        'status': status,
+        'duracao_ms': round((time.perf_counter() - inicio) * 1000, 2) if inicio else None,
+        'ip': request.remote_addr,
+        'usuario_id': usuario_id,
+        'evento': evento,
+    })
+    return response
+
+
+def init_app(app):
+    """Configura o log estruturado de requisições com fila e thread de escrita"""
+    logger.setLevel(app.config['LOG_NIVEL'])
+    logger.propagate = False
+    for handler in list(logger.handlers):
+        if isinstance(handler, HandlerFilaNaoBloqueante):
+            handler.parar()
+        logger.removeHandler(handler)
+
+    if app.config.get('LOG_ARQUIVO'):
+        destino = logging.FileHandler(app.config['LOG_ARQUIVO'], encoding='utf-8')
+    else:
+        destino = logging.StreamHandler(sys.stdout)
+    destino.setFormatter(FormatadorJSON())
+
+    handler = HandlerFilaNaoBloqueante(destino, app.config['LOG_FILA_MAX'])
+    logger.addHandler(handler)
+    atexit.register(handler.parar)
+
+    app.before_request(_iniciar_requisicao)
+    app.after_request(_registrar_requisicao)
@@ -1,9 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from senhas import gerar_hash, verificar_senha, precisa_rehash
 from datetime import datetime
+from roteamento import SessaoRoteada
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': SessaoRoteada})
 
 class Usuario(db.Model, UserMixin):
     __tablename__ = 'usuarios'
@@ -21,10 +22,13 @@ class Usuario(db.Model, UserMixin):
         return str(self.usuario_id)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = gerar_hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verificar_senha(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return precisa_rehash(self.password_hash)
 
     def update_last_login(self):
         self.data_ultimo_login = datetime.utcnow()
@@ -87,23 +91,150 @@ class Cliente(db.Model):
 class Venda(db.Model):
     __tablename__ = 'vendas'
     venda_id = db.Column(db.Integer, primary_key=True)
-    cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.cliente_id'), nullable=False)
+    cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.cliente_id'), nullable=False, index=True)
     data_venda = db.Column(db.Date, nullable=False, default=datetime.utcnow)
     valor_total = db.Column(db.Numeric(10, 2), nullable=False, default=0)
     cliente = db.relationship('Cliente', back_populates='vendas')
     itens = db.relationship('VendaItem', back_populates='venda', cascade='all, delete-orphan')
+    # Períodos (relatórios, exportação) e a listagem keyset por (data_venda, venda_id)
+    __table_args__ = (db.Index('ix_vendas_data_venda', 'data_venda', 'venda_id'),)
 
 class VendaItem(db.Model):
     __tablename__ = 'venda_itens'
     item_id = db.Column(db.Integer, primary_key=True)
-    venda_id = db.Column(db.Integer, db.ForeignKey('vendas.venda_id'), nullable=False)
-    livro_id = db.Column(db.Integer, db.ForeignKey('livros.livro_id'), nullable=False)
+    venda_id = db.Column(db.Integer, db.ForeignKey('vendas.venda_id'), nullable=False, index=True)
+    livro_id = db.Column(db.Integer, db.ForeignKey('livros.livro_id'), nullable=False, index=True)
     quantidade = db.Column(db.Integer, nullable=False, default=1)
     preco_unitario = db.Column(db.Numeric(10, 2), nullable=False)
     venda = db.relationship('Venda', back_populates='itens')
     livro = db.relationship('Livro', back_populates='vendas_itens')
 
+# Vendas anteriores ao horizonte de ARQUIVO_HORIZONTE_MESES, movidas pelo
+# `flask vendas-arquivar` (arquivamento.py). Sem chaves estrangeiras, que
+# travariam o arquivamento em massa; a exclusão de clientes e livros com
+# vendas arquivadas é bloqueada por exclusao.py.
+class VendaArquivada(db.Model):
+    __tablename__ = 'vendas_arquivo'
+    venda_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    cliente_id = db.Column(db.Integer, nullable=False, index=True)
+    data_venda = db.Column(db.Date, nullable=False, index=True)
+    valor_total = db.Column(db.Numeric(10, 2), nullable=False)
+    arquivado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+class VendaItemArquivado(db.Model):
+    __tablename__ = 'venda_itens_arquivo'
+    item_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    venda_id = db.Column(db.Integer, nullable=False, index=True)
+    livro_id = db.Column(db.Integer, nullable=False, index=True)  # Verificação da exclusão de livros
+    quantidade = db.Column(db.Integer, nullable=False)
+    preco_unitario = db.Column(db.Numeric(10, 2), nullable=False)
+
 livro_autor = db.Table('livro_autor',
     db.Column('livro_id', db.Integer, db.ForeignKey('livros.livro_id'), primary_key=True),
-    db.Column('autor_id', db.Integer, db.ForeignKey('autores.autor_id'), primary_key=True)
-)
\ No newline at end of file
+    db.Column('autor_id', db.Integer, db.ForeignKey('autores.autor_id'), primary_key=True),
+    db.Index('ix_livro_autor_autor_id', 'autor_id')  # A chave primária só atende buscas por livro_id
+)
+
+class Estoque(db.Model):
+    """Exemplares disponíveis por livro; baixado na criação da venda (estoque.py)"""
+    __tablename__ = 'estoque'
+    livro_id = db.Column(db.Integer, db.ForeignKey('livros.livro_id', ondelete='CASCADE'), primary_key=True)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    estoque_minimo = db.Column(db.Integer, nullable=False, default=10)
+    data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.CheckConstraint('quantidade >= 0', name='ck_estoque_quantidade'),)
+
+# Tabelas de inteligência de negócio (mantidas pelo worker de rollup.py ou
+# pelos triggers de base.sql, conforme ROLLUP_MODO)
+class MetricaAutor(db.Model):
+    __tablename__ = 'metricas_autores'
+    autor_id = db.Column(db.Integer, db.ForeignKey('autores.autor_id', ondelete='CASCADE'), primary_key=True)
+    total_vendas = db.Column(db.Integer, default=0)
+    receita_total = db.Column(db.Numeric(15, 2), default=0)
+    livros_publicados = db.Column(db.Integer, default=0)
+    data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SegmentacaoCliente(db.Model):
+    __tablename__ = 'segmentacao_clientes'
+    cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.cliente_id', ondelete='CASCADE'), primary_key=True)
+    segmento = db.Column(db.String(20))  # VIP, Regular, Inativo ou Novo
+    total_compras = db.Column(db.Integer, default=0)
+    valor_total_gasto = db.Column(db.Numeric(15, 2), default=0)
+    ultima_compra = db.Column(db.Date)
+    data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow)
+
+class EventoRollup(db.Model):
+    """Outbox: item de venda inserido (sinal 1) ou removido (-1), ainda não agregado"""
+    __tablename__ = 'rollup_eventos'
+    evento_id = db.Column(db.Integer, primary_key=True)
+    venda_id = db.Column(db.Integer, nullable=False, index=True)  # Sem FK: a venda pode já ter sido removida
+    cliente_id = db.Column(db.Integer, nullable=False, index=True)
+    data_venda = db.Column(db.Date, nullable=False)
+    valor_total = db.Column(db.Numeric(10, 2), nullable=False)
+    livro_id = db.Column(db.Integer)  # Nulo para venda sem itens
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    preco_unitario = db.Column(db.Numeric(10, 2), nullable=False, default=0)
+    sinal = db.Column(db.SmallInteger, nullable=False)
+    registrado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Vendas agregadas por dia e por mês (mantidas pelo worker de rollup.py), base de /analises
+class VendaDiaria(db.Model):
+    """Itens vendidos por dia e livro; o gênero é o do livro na primeira venda do dia"""
+    __tablename__ = 'vendas_diarias'
+    data = db.Column(db.Date, primary_key=True)
+    livro_id = db.Column(db.Integer, db.ForeignKey('livros.livro_id', ondelete='CASCADE'), primary_key=True)
+    genero = db.Column(db.String(50))
+    itens = db.Column(db.Integer, nullable=False, default=0)  # Linhas de venda_itens
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    receita = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+
+class VendaDiariaAutor(db.Model):
+    """Itens vendidos por dia, autor e gênero; cada autor recebe a receita integral do livro"""
+    __tablename__ = 'vendas_diarias_autores'
+    data = db.Column(db.Date, primary_key=True)
+    autor_id = db.Column(db.Integer, db.ForeignKey('autores.autor_id', ondelete='CASCADE'), primary_key=True)
+    genero = db.Column(db.String(50), primary_key=True, default='')  # '' para livros sem gênero
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    receita = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+
+# Os mesmos totais por mês (primeiro dia do mês), para períodos longos
+class VendaMensal(db.Model):
+    __tablename__ = 'vendas_mensais'
+    mes = db.Column(db.Date, primary_key=True)
+    genero = db.Column(db.String(50), primary_key=True, default='')
+    itens = db.Column(db.Integer, nullable=False, default=0)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    receita = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+
+class VendaMensalAutor(db.Model):
+    __tablename__ = 'vendas_mensais_autores'
+    mes = db.Column(db.Date, primary_key=True)
+    autor_id = db.Column(db.Integer, db.ForeignKey('autores.autor_id', ondelete='CASCADE'), primary_key=True)
+    genero = db.Column(db.String(50), primary_key=True, default='')
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    receita = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+
+class VersaoTabela(db.Model):
+    """Versão de cada tabela, incrementada no commit das transações que a alteram (ETags de cache_http.py)"""
+    __tablename__ = 'versoes_tabelas'
+    tabela = db.Column(db.String(63), primary_key=True)
+    versao = db.Column(db.BigInteger, nullable=False, default=1)
+    alterado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+# Índices funcionais para a busca por prefixo dos campos de autocompletar
+# (lower(coluna) LIKE 'termo%'); no PostgreSQL usam varchar_pattern_ops
+db.Index(
+    'ix_autores_nome_lower',
+    db.func.lower(Autor.nome).label('nome_lower'),
+    postgresql_ops={'nome_lower': 'varchar_pattern_ops'}
+)
+db.Index(
+    'ix_livros_titulo_lower',
+    db.func.lower(Livro.titulo).label('titulo_lower'),
+    postgresql_ops={'titulo_lower': 'varchar_pattern_ops'}
+)
+db.Index(
+    'ix_clientes_nome_lower',
+    db.func.lower(Cliente.nome).label('nome_lower'),
+    postgresql_ops={'nome_lower': 'varchar_pattern_ops'}
+)
@@ -0,0 +1,54 @@
+from flask import g, request, current_app, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class OrcamentoSQLExcedido(AssertionError):
+    """Erro levantado quando uma rota executa mais consultas que o permitido"""
+
+
+def _contar_consulta(conn, cursor, statement, parameters, context, executemany):
+    """Conta as consultas SQL executadas durante a requisição atual"""
+    if has_request_context():
+        g.consultas_sql = g.get('consultas_sql', 0) + 1
+
+
+def limite_consultas(maximo):
+    """Define o número máximo de consultas SQL que uma rota pode executar.
+
+    O limite só é verificado em modo de teste (TESTING) ou quando
+    ORCAMENTO_SQL_ATIVO estiver habilitado, para que um N+1 introduzido
+    em um template faça os testes falharem (python -m benchmarks.orcamento).
+    """
+    def decorador(view):
+        view.limite_consultas = maximo
+        return view
+    return decorador
+
+
+def consultas_na_requisicao():
+    """Retorna quantas consultas SQL a requisição atual executou"""
+    return g.get('consultas_sql', 0)
+
+
+def verificar_orcamento(response):
+    """Confere o total de consultas da requisição contra o limite da rota"""
+    app = current_app
+    if not (app.testing or app.config.get('ORCAMENTO_SQL_ATIVO')):
+        return response
+
+    view = app.view_functions.get(request.endpoint)
+    maximo = getattr(view, 'limite_consultas', None)
+    total = consultas_na_requisicao()
+    if maximo is not None and total > maximo:
+        raise OrcamentoSQLExcedido(
+            f'{request.endpoint} executou {total} consultas SQL (limite: {maximo})'
+        )
+    return response
+
+
+def init_app(app):
+    """Registra a contagem de consultas e a verificação de orçamento"""
+    if not event.contains(Engine, 'before_cursor_execute', _contar_consulta):
+        event.listen(Engine, 'before_cursor_execute', _contar_consulta)
+    app.after_request(verificar_orcamento)
@@ -0,0 +1,211 @@
+import time
+from datetime import date, datetime
+
+from flask import current_app
+from flask_sqlalchemy.pagination import QueryPagination
+from itsdangerous import BadData, URLSafeSerializer
+from sqlalchemy import text, tuple_
+
+from models import db
+
+# Cache de contagens por tabela: {tabela: (expira_em, total)}
+_contagens = {}
+
+
+def _serializador():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='paginacao')
+
+
+def ler_cursor(token):
+    """Decodifica um cursor opaco; retorna None se ausente ou inválido"""
+    if not token:
+        return None
+    try:
+        cursor = _serializador().loads(token)
+    except BadData:
+        return None
+    if not isinstance(cursor, dict) or not {'k', 'p', 'd'} <= cursor.keys():
+        return None
+    return cursor
+
+
+def _gerar_cursor(chave, pagina, direcao):
+    return _serializador().dumps({'k': chave, 'p': pagina, 'd': direcao})
+
+
+def _valor_chave(item, coluna):
+    valor = getattr(item, coluna.key)
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+
+def _converter_chave(coluna, valor):
+    tipo = coluna.type.python_type
+    if tipo is datetime:
+        return datetime.fromisoformat(valor)
+    if tipo is date:
+        return date.fromisoformat(valor)
+    return tipo(valor)
+
+
+def filtro_cursor(cursor, colunas, descendente=False):
+    """Condição que continua a partir da chave do cursor, na ordem das colunas.
+
+    Levanta ValueError se a chave não corresponder às colunas (cursor de
+    outra consulta).
+    """
+    if not isinstance(cursor['k'], list) or len(cursor['k']) != len(colunas):
+        raise ValueError('Cursor de outra consulta')
+    try:
+        convertidos = [_converter_chave(coluna, valor) for coluna, valor in zip(colunas, cursor['k'])]
+    except (TypeError, ValueError):
+        raise ValueError('Cursor de outra consulta') from None
+    chave = tuple_(*colunas)
+    valores = tuple_(*convertidos)
+    return chave < valores if descendente else chave > valores
+
+
+def cursor_apos(linha, colunas):
+    """Cursor opaco para continuar depois da linha (paginação keyset sem número de página)"""
+    return _gerar_cursor([_valor_chave(linha, coluna) for coluna in colunas], 0, 'proxima')
+
+
+def contar_em_cache(query):
+    """Total de linhas da consulta, com cache por tabela e estimativa no PostgreSQL.
+
+    No PostgreSQL, tabelas grandes usam a estimativa do planner
+    (pg_class.reltuples) em vez de um COUNT(*) completo.
+    """
+    tabela = query.column_descriptions[0]['entity'].__tablename__
+    agora = time.monotonic()
+    em_cache = _contagens.get(tabela)
+    if em_cache and em_cache[0] > agora:
+        return em_cache[1]
+
+    total = None
+    if db.session.get_bind().dialect.name == 'postgresql':
+        estimativa = db.session.execute(
+            # Tabela particionada (vendas, particionamento.py): soma das estimativas das partições
+            text(
+                "SELECT CASE WHEN c.relkind = 'p' THEN ("
+                "    SELECT sum(greatest(p.reltuples, 0)) FROM pg_inherits i"
+                "    JOIN pg_class p ON p.oid = i.inhrelid WHERE i.inhparent = c.oid"
+                ") ELSE c.reltuples END::bigint "
+                "FROM pg_class c WHERE c.oid = to_regclass(:tabela)"
+            ),
+            {'tabela': tabela}
+        ).scalar()
+        if estimativa and estimativa >= current_app.config['PAGINACAO_LIMIAR_ESTIMATIVA']:
+            total = estimativa
+    if total is None:
+        total = query.order_by(None).count()
+
+    _contagens[tabela] = (agora + current_app.config['PAGINACAO_TTL_CONTAGEM'], total)
+    return total
+
+
+def invalidar_contagem(tabela):
+    """Descarta a contagem em cache de uma tabela"""
+    _contagens.pop(tabela, None)
+
+
+class PaginacaoKeyset(QueryPagination):
+    """Paginação por chave (seek) com a mesma interface da paginação do Flask-SQLAlchemy.
+
+    Sem cursor, a página é buscada por OFFSET (navegação por número de
+    página). Com cursor, a consulta continua a partir da chave do último
+    (ou primeiro) item exibido, sem OFFSET. O total vem de contar_em_cache.
+    """
+
+    def _query_items(self):
+        query = self._query_args['query']
+        colunas = self._query_args['colunas']
+        descendente = self._query_args['descendente']
+        cursor = self._query_args['cursor']
+
+        para_tras = cursor is not None and cursor['d'] == 'anterior'
+        ordem_invertida = descendente != para_tras
+        ordem = [coluna.desc() if ordem_invertida else coluna.asc() for coluna in colunas]
+
+        if cursor is None:
+            query = query.order_by(*ordem).offset(self._query_offset)
+        else:
+            query = query.filter(filtro_cursor(cursor, colunas, ordem_invertida)).order_by(*ordem)
+
+        itens = query.limit(self.per_page + 1).all()
+        mais = len(itens) > self.per_page
+        itens = itens[:self.per_page]
+
+        if para_tras:
+            itens.reverse()
+            self._tem_anterior = mais
+            self._tem_proxima = True
+            if not mais:
+                self.page = 1
+        else:
+            self._tem_anterior = self.page > 1
+            self._tem_proxima = mais
+        return itens
+
+    def _query_count(self):
+        return contar_em_cache(self._query_args['query'])
+
+    @property
+    def pages(self):
+        paginas = super().pages
+        return max(paginas, self.page + 1 if self._tem_proxima else self.page)
+
+    @property
+    def has_prev(self):
+        return self._tem_anterior
+
+    @property
+    def has_next(self):
+        return self._tem_proxima
+
+    @property
+    def proximo_cursor(self):
+        """Cursor opaco da próxima página, ou None na última"""
+        if not self._tem_proxima or not self.items:
+            return None
+        colunas = self._query_args['colunas']
+        chave = [_valor_chave(self.items[-1], coluna) for coluna in colunas]
+        return _gerar_cursor(chave, self.page + 1, 'proxima')
+
+    @property
+    def cursor_anterior(self):
+        """Cursor opaco da página anterior, ou None na primeira"""
+        if not self._tem_anterior or not self.items:
+            return None
+        colunas = self._query_args['colunas']
+        chave = [_valor_chave(self.items[0], coluna) for coluna in colunas]
+        return _gerar_cursor(chave, self.page - 1, 'anterior')
+
+
+def paginar(query, colunas, pagina, por_pagina, cursor=None, descendente=False):
+    """Pagina a consulta ordenando pelas colunas informadas (chave única).
+
+    Quando um cursor válido é informado, o número da página vem dele e a
+    busca é feita por keyset. Um cursor de outra listagem é ignorado, como
+    um cursor inválido (página por OFFSET). O tamanho da página é limitado
+    por PAGINACAO_MAX_POR_PAGINA.
+    """
+    cursor = ler_cursor(cursor)
+    if cursor is not None:
+        try:
+            filtro_cursor(cursor, colunas)
+        except ValueError:
+            cursor = None
+        else:
+            pagina = cursor['p']
+    return PaginacaoKeyset(
+        page=pagina,
+        per_page=por_pagina,
+        max_per_page=current_app.config['PAGINACAO_MAX_POR_PAGINA'],
+        error_out=False,
+        query=query,
+        colunas=colunas,
+        descendente=descendente,
+        cursor=cursor
+    )
@@ -0,0 +1,145 @@
+import re
+from datetime import date
+
+from sqlalchemy import text
+
+from models import db, Venda
+from paginacao import invalidar_contagem
+from rollup import meses_atras
+
+# Particionamento de vendas por data_venda (apenas PostgreSQL).
+#
+# `flask vendas-particionar` converte vendas, em uma transação, em uma
+# tabela particionada por intervalo de data_venda: uma partição por mês
+# (vendas_AAAA_MM) e a partição padrão vendas_padrao para datas fora das
+# partições criadas. `flask vendas-particoes` cria antes da hora as
+# partições dos próximos VENDAS_PARTICOES_FUTURAS meses e deve rodar
+# periodicamente (cron); vendas de meses sem partição caem em vendas_padrao
+# e são movidas para a partição do mês quando ela é criada.
+#
+# Consultas com filtro em data_venda (períodos, exportação, arquivamento)
+# leem só as partições do período. A listagem keyset (ORDER BY data_venda
+# DESC, venda_id DESC LIMIT n) usa Merge Append sobre os índices das
+# partições e para nas mais recentes. A chave primária passa a ser
+# (venda_id, data_venda), exigência do PostgreSQL para partições; venda_id
+# continua vindo da mesma sequência. Por isso venda_itens perde a chave
+# estrangeira para vendas (a exclusão de itens é feita pela aplicação, pelo
+# cascade de Venda.itens). venda_itens não é particionada, já que não tem
+# data_venda; o crescimento dela é contido pelo arquivamento (arquivamento.py),
+# que esvazia as partições antigas para remover_particoes_vazias().
+
+
+def _sql(comando, **parametros):
+    return db.session.execute(text(comando), parametros)
+
+
+def vendas_particionada():
+    """True se vendas já é uma tabela particionada no PostgreSQL"""
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return False
+    return bool(_sql(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('vendas')"
+    ).scalar())
+
+
+def nome_particao(mes):
+    return f'vendas_{mes.year:04d}_{mes.month:02d}'
+
+
+def _meses(desde, ate):
+    mes = desde.replace(day=1)
+    while mes <= ate:
+        yield mes
+        mes = meses_atras(mes, -1)
+
+
+def _criar_particoes(desde, ate):
+    """Cria as partições mensais ausentes de desde até ate; retorna os nomes criados"""
+    existentes = set(_sql(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'vendas'::regclass"
+    ).scalars())
+    criadas = []
+    for mes in _meses(desde, ate):
+        nome = nome_particao(mes)
+        if nome in existentes:
+            continue
+        seguinte = meses_atras(mes, -1)
+        limites = {'inicio': mes, 'fim': seguinte}
+        # O PostgreSQL recusa a nova partição se a padrão tiver linhas do intervalo
+        pendentes = _sql(
+            'SELECT count(*) FROM vendas_padrao WHERE data_venda >= :inicio AND data_venda < :fim', **limites
+        ).scalar()
+        if pendentes:
+            _sql('CREATE TEMP TABLE vendas_movidas ON COMMIT DROP AS '
+                 'SELECT * FROM vendas_padrao WHERE data_venda >= :inicio AND data_venda < :fim', **limites)
+            _sql('DELETE FROM vendas_padrao WHERE data_venda >= :inicio AND data_venda < :fim', **limites)
+        _sql(f"CREATE TABLE {nome} PARTITION OF vendas FOR VALUES FROM ('{mes}') TO ('{seguinte}')")
+        if pendentes:
+            _sql('INSERT INTO vendas SELECT * FROM vendas_movidas')
+            _sql('DROP TABLE vendas_movidas')
+        criadas.append(nome)
+    return criadas
+
+
+def criar_particoes(meses_futuros):
+    """Garante as partições do mês atual e dos próximos meses_futuros meses"""
+    hoje = date.today()
+    criadas = _criar_particoes(hoje, meses_atras(hoje, -meses_futuros))
+    db.session.commit()
+    return criadas
+
+
+def particionar_vendas(meses_futuros):
+    """Converte vendas em tabela particionada por mês de data_venda, em uma única transação"""
+    if db.session.get_bind().dialect.name != 'postgresql':
+        raise RuntimeError('Particionamento de vendas disponível apenas no PostgreSQL')
+    if vendas_particionada():
+        raise RuntimeError('vendas já é uma tabela particionada')
+
+    _sql('LOCK TABLE vendas, venda_itens IN ACCESS EXCLUSIVE MODE')
+    for restricao in _sql(
+        "SELECT conname FROM pg_constraint WHERE conrelid = 'venda_itens'::regclass "
+        "AND confrelid = 'vendas'::regclass AND contype = 'f'"
+    ).scalars():
+        _sql(f'ALTER TABLE venda_itens DROP CONSTRAINT {restricao}')
+    sequencia = _sql("SELECT pg_get_serial_sequence('vendas', 'venda_id')").scalar()
+    _sql('ALTER TABLE vendas RENAME TO vendas_nao_particionada')
+    if sequencia:
+        _sql(f'ALTER SEQUENCE {sequencia} OWNED BY NONE')
+    _sql('CREATE TABLE vendas (LIKE vendas_nao_particionada INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+         'PARTITION BY RANGE (data_venda)')
+    _sql('ALTER TABLE vendas ADD PRIMARY KEY (venda_id, data_venda)')
+    _sql('ALTER TABLE vendas ADD FOREIGN KEY (cliente_id) REFERENCES clientes (cliente_id)')
+    _sql('CREATE TABLE vendas_padrao PARTITION OF vendas DEFAULT')
+
+    primeira = _sql('SELECT min(data_venda) FROM vendas_nao_particionada').scalar() or date.today()
+    _criar_particoes(primeira, meses_atras(date.today(), -meses_futuros))
+    _sql('INSERT INTO vendas SELECT * FROM vendas_nao_particionada')
+    _sql('DROP TABLE vendas_nao_particionada')
+    if sequencia:
+        _sql(f'ALTER SEQUENCE {sequencia} OWNED BY vendas.venda_id')
+    # Índices de models.Venda, criados também em cada partição
+    for indice in Venda.__table__.indexes:
+        indice.create(db.session.connection())
+    db.session.commit()
+    invalidar_contagem(Venda.__tablename__)
+
+
+def remover_particoes_vazias(limite):
+    """Remove as partições mensais vazias que terminam até `limite` (após o arquivamento)"""
+    removidas = []
+    particoes = _sql(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'vendas'::regclass ORDER BY c.relname"
+    ).scalars().all()
+    for nome in particoes:
+        mensal = re.fullmatch(r'vendas_(\d{4})_(\d{2})', nome)
+        if not mensal or meses_atras(date(int(mensal.group(1)), int(mensal.group(2)), 1), -1) > limite:
+            continue
+        if _sql(f'SELECT EXISTS (SELECT 1 FROM {nome})').scalar():
+            continue
+        _sql(f'DROP TABLE {nome}')
+        removidas.append(nome)
+    db.session.commit()
+    return removidas
@@ -0,0 +1,261 @@
+import heapq
+import itertools
+import os
+import re
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from log_requisicoes import logger
+from monitoramento import consultas_na_requisicao
+from roteamento import metricas_pool
+
+# Perfil de SQL por requisição e métricas no formato do Prometheus.
+#
+# Com o perfilamento ativo, cada requisição mede o tempo de cada instrução
+# SQL (eventos before/after_cursor_execute) e devolve:
+#   - cabeçalhos Server-Timing com o tempo total no banco, o tempo da
+#     aplicação e, para administradores, as instruções mais lentas;
+#   - um registro 'sql_lenta' no log JSON para instruções acima de
+#     PERFILAMENTO_SQL_LENTA_MS, com literais e parâmetros ocultados;
+#   - histogramas de latência e contadores de SQL por rota, lidos em /metrics.
+#
+# O interruptor fica em um arquivo (PERFILAMENTO_ARQUIVO), relido a cada
+# PERFILAMENTO_VERIFICAR segundos, para ligar e desligar todos os workers
+# sem reiniciar (`flask perfilamento ligar|desligar`). Desligado, o custo
+# por requisição é uma comparação de tempo. As métricas são por processo:
+# cada worker expõe as próprias contagens.
+
+BALDES = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # Segundos
+_LITERAIS = re.compile(r"'(?:[^']|'')*'")
+
+
+class Interruptor:
+    """Liga/desliga compartilhado entre os workers por meio de um arquivo"""
+
+    def __init__(self):
+        self._ativo = None
+        self._verificado_em = float('-inf')
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _caminho(app):
+        return app.config.get('PERFILAMENTO_ARQUIVO') or os.path.join(app.instance_path, 'perfilamento')
+
+    def ativo(self, app):
+        agora = time.monotonic()
+        if agora - self._verificado_em > app.config['PERFILAMENTO_VERIFICAR']:
+            with self._lock:
+                try:
+                    with open(self._caminho(app), encoding='utf-8') as arquivo:
+                        self._ativo = arquivo.read().strip() == '1'
+                except FileNotFoundError:
+                    self._ativo = app.config['PERFILAMENTO_ATIVO']
+                self._verificado_em = agora
+        return self._ativo
+
+    def definir(self, app, ativo):
+        """Grava o estado no arquivo; os demais workers o leem na próxima verificação"""
+        caminho = self._caminho(app)
+        os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+        temporario = f'{caminho}.{os.getpid()}'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            arquivo.write('1' if ativo else '0')
+        os.replace(temporario, caminho)
+        with self._lock:
+            self._ativo = ativo
+            self._verificado_em = time.monotonic()
+
+
+class RegistroMetricas:
+    """Histogramas e contadores por rota do processo atual"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencias = {}  # (rota, metodo) -> [contagens por balde..., soma, total]
+        self._status = {}  # (rota, metodo, status) -> requisições
+        self._sql = {}  # rota -> [instruções, segundos no banco]
+
+    def observar(self, rota, metodo, status, duracao, consultas, tempo_sql):
+        posicao = next((i for i, limite in enumerate(BALDES) if duracao <= limite), len(BALDES))
+        with self._lock:
+            latencia = self._latencias.setdefault((rota, metodo), [0] * (len(BALDES) + 3))
+            latencia[posicao] += 1
+            latencia[-2] += duracao
+            latencia[-1] += 1
+            chave = (rota, metodo, status)
+            self._status[chave] = self._status.get(chave, 0) + 1
+            sql = self._sql.setdefault(rota, [0, 0.0])
+            sql[0] += consultas
+            sql[1] += tempo_sql
+
+    def limpar(self):
+        with self._lock:
+            self._latencias.clear()
+            self._status.clear()
+            self._sql.clear()
+
+    def copiar(self):
+        with self._lock:
+            return (
+                {chave: list(valores) for chave, valores in self._latencias.items()},
+                dict(self._status),
+                {rota: list(valores) for rota, valores in self._sql.items()},
+            )
+
+
+interruptor = Interruptor()
+registro = RegistroMetricas()
+_sequencia = itertools.count()  # Desempate no heap das instruções mais lentas
+
+
+def redigir(statement, parameters, executemany=False):
+    """Instrução com literais trocados por '?' e parâmetros reduzidos aos tipos"""
+    sql = _LITERAIS.sub("'?'", ' '.join(statement.split()))
+    if executemany:
+        return sql, f'{len(parameters)} conjuntos'
+    if isinstance(parameters, dict):
+        return sql, {nome: type(valor).__name__ for nome, valor in parameters.items()}
+    return sql, [type(valor).__name__ for valor in parameters or ()]
+
+
+def _antes_execucao(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and has_request_context() and g.get('perfilar'):
+        context._perfil_inicio = time.perf_counter()
+
+
+def _depois_execucao(conn, cursor, statement, parameters, context, executemany):
+    inicio = getattr(context, '_perfil_inicio', None)
+    if inicio is None or not has_request_context():
+        return
+    duracao = time.perf_counter() - inicio
+    g.tempo_sql += duracao
+
+    config = current_app.config
+    lentas = g.sql_lentas
+    item = (duracao, next(_sequencia), statement)
+    if len(lentas) < config['PERFILAMENTO_TOP_SQL']:
+        heapq.heappush(lentas, item)
+    elif duracao > lentas[0][0]:
+        heapq.heapreplace(lentas, item)
+
+    if duracao * 1000 >= config['PERFILAMENTO_SQL_LENTA_MS']:
+        sql, parametros = redigir(statement, parameters, executemany)
+        logger.warning('SQL lenta em %s %s', request.method, request.path, extra={
+            'metodo': request.method,
+            'caminho': request.path,
+            'duracao_ms': round(duracao * 1000, 2),
+            'evento': 'sql_lenta',
+            'sql': sql,
+            'parametros': parametros,
+        })
+
+
+def _iniciar_requisicao():
+    if not interruptor.ativo(current_app):
+        return
+    g.perfilar = True
+    g.perfil_inicio = time.perf_counter()
+    g.tempo_sql = 0.0
+    g.sql_lentas = []
+
+
+def _descricao(sql):
+    # Server-Timing aceita só texto simples entre aspas
+    return ' '.join(sql.split())[:80].replace('"', "'").replace('\\', '/')
+
+
+def _finalizar_requisicao(response):
+    if not g.get('perfilar'):
+        return response
+    duracao = time.perf_counter() - g.perfil_inicio
+    consultas = consultas_na_requisicao()
+    tempo_sql = g.tempo_sql
+
+    cabecalhos = [
+        f'db;dur={tempo_sql * 1000:.2f};desc="{consultas} consultas"',
+        f'app;dur={(duracao - tempo_sql) * 1000:.2f}',
+    ]
+    # O texto das instruções só vai para administradores
+    usuario = g.get('_login_user')
+    if usuario is not None and getattr(usuario, 'is_admin', False):
+        for posicao, (tempo, _, sql) in enumerate(sorted(g.sql_lentas, reverse=True), 1):
+            cabecalhos.append(f'sql{posicao};dur={tempo * 1000:.2f};desc="{_descricao(sql)}"')
+    response.headers['Server-Timing'] = ', '.join(cabecalhos)
+
+    registro.observar(
+        request.endpoint or 'sem_rota', request.method, response.status_code,
+        duracao, consultas, tempo_sql
+    )
+    return response
+
+
+def _rotulos(**rotulos):
+    def escapar(valor):
+        return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{nome}="{escapar(valor)}"' for nome, valor in rotulos.items()) + '}'
+
+
+def exportar_prometheus():
+    """Métricas do processo no formato de texto do Prometheus (0.0.4)"""
+    latencias, status, sql = registro.copiar()
+    linhas = [
+        '# HELP editora_perfilamento_ativo Perfilamento de requisições ligado (1) ou desligado (0)',
+        '# TYPE editora_perfilamento_ativo gauge',
+        f'editora_perfilamento_ativo {int(bool(interruptor.ativo(current_app)))}',
+        '# HELP editora_requisicao_duracao_segundos Latência das requisições por rota',
+        '# TYPE editora_requisicao_duracao_segundos histogram',
+    ]
+    for (rota, metodo), valores in sorted(latencias.items()):
+        acumulado = 0
+        for limite, quantidade in zip(BALDES + ('+Inf',), valores):
+            acumulado += quantidade
+            linhas.append(f'editora_requisicao_duracao_segundos_bucket{_rotulos(rota=rota, metodo=metodo, le=limite)} {acumulado}')
+        linhas.append(f'editora_requisicao_duracao_segundos_sum{_rotulos(rota=rota, metodo=metodo)} {valores[-2]:.6f}')
+        linhas.append(f'editora_requisicao_duracao_segundos_count{_rotulos(rota=rota, metodo=metodo)} {valores[-1]}')
+
+    linhas += [
+        '# HELP editora_requisicoes_total Requisições por rota e status',
+        '# TYPE editora_requisicoes_total counter',
+    ]
+    for (rota, metodo, codigo), quantidade in sorted(status.items()):
+        linhas.append(f'editora_requisicoes_total{_rotulos(rota=rota, metodo=metodo, status=codigo)} {quantidade}')
+
+    linhas += [
+        '# HELP editora_sql_instrucoes_total Instruções SQL executadas por rota',
+        '# TYPE editora_sql_instrucoes_total counter',
+    ]
+    linhas += [f'editora_sql_instrucoes_total{_rotulos(rota=rota)} {valores[0]}' for rota, valores in sorted(sql.items())]
+    linhas += [
+        '# HELP editora_sql_duracao_segundos_total Tempo gasto no banco por rota',
+        '# TYPE editora_sql_duracao_segundos_total counter',
+    ]
+    linhas += [f'editora_sql_duracao_segundos_total{_rotulos(rota=rota)} {valores[1]:.6f}' for rota, valores in sorted(sql.items())]
+
+    pools = {banco: dados for banco, dados in metricas_pool().items() if 'checkouts' in dados}
+    for nome, tipo, ajuda, campo, escala in (
+        ('editora_pool_conexoes_em_uso', 'gauge', 'Conexões em uso', 'em_uso', 1),
+        ('editora_pool_tamanho', 'gauge', 'Tamanho configurado do pool', 'tamanho', 1),
+        ('editora_pool_excedentes', 'gauge', 'Conexões além do pool (negativo: vagas no pool)', 'excedentes', 1),
+        ('editora_pool_checkouts_total', 'counter', 'Conexões retiradas do pool', 'checkouts', 1),
+        ('editora_pool_timeouts_total', 'counter', 'Esperas por conexão que esgotaram o tempo', 'timeouts', 1),
+        ('editora_pool_espera_segundos_total', 'counter', 'Tempo total aguardando conexão', 'espera_total_ms', 0.001),
+    ):
+        linhas += [f'# HELP {nome} {ajuda}', f'# TYPE {nome} {tipo}']
+        linhas += [f'{nome}{_rotulos(banco=banco)} {dados[campo] * escala:g}' for banco, dados in sorted(pools.items())]
+    return '\n'.join(linhas) + '\n'
+
+
+def init_app(app):
+    """Registra a medição de SQL por requisição e os cabeçalhos Server-Timing"""
+    for nome, funcao in (
+        ('before_cursor_execute', _antes_execucao),
+        ('after_cursor_execute', _depois_execucao),
+    ):
+        if not event.contains(Engine, nome, funcao):
+            event.listen(Engine, nome, funcao)
+    app.before_request(_iniciar_requisicao)
+    app.after_request(_finalizar_requisicao)
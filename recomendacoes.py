@@ -0,0 +1,151 @@
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, selectinload
+
+from models import db, Livro, Venda, VendaItem, livro_autor
+
+# Recomendações de livros por cliente, calculadas em memória.
+#
+# Substitui sp_recomendacoes_cliente (base.sql) nas páginas da aplicação.
+# A pontuação de cada livro não comprado combina:
+#   - compra conjunta: similaridade de cosseno entre livros na matriz esparsa
+#     de coocorrência (clientes que compraram os dois);
+#   - afinidade por autor e por gênero: quantos livros do mesmo autor/gênero
+#     o cliente já comprou;
+#   - popularidade, com peso pequeno, para desempate e clientes sem compras.
+#
+# Vendas confirmadas nesta instância atualizam o índice de forma incremental;
+# as demais alterações (edição de livros, exclusões, vendas gravadas por
+# outros workers) entram na reconstrução completa a cada RECOMENDACOES_TTL.
+# As matrizes ficam em indice_recomendacoes.py, importado sob demanda.
+
+
+class MotorRecomendacoes:
+    """Mantém o índice de recomendações sincronizado com as vendas"""
+
+    def __init__(self):
+        self.indice = None
+        self.construido_em = 0
+        self.pendentes = []  # (cliente_id, livro_id, preco_unitario)
+        self._lock = threading.Lock()
+
+    def reconstruir(self):
+        with self._lock:
+            self.pendentes.clear()
+        livros = db.session.execute(db.select(Livro.livro_id, Livro.genero).order_by(Livro.livro_id)).all()
+        vinculos = db.session.execute(db.select(livro_autor.c.livro_id, livro_autor.c.autor_id)).all()
+        compras = db.session.execute(
+            db.select(Venda.cliente_id, VendaItem.livro_id).distinct()
+            .join(Venda, Venda.venda_id == VendaItem.venda_id)
+        ).all()
+        precos = db.session.execute(
+            db.select(VendaItem.livro_id, db.func.sum(VendaItem.preco_unitario), db.func.count())
+            .group_by(VendaItem.livro_id)
+        ).all()
+        from indice_recomendacoes import IndiceRecomendacoes  # numpy/scipy só quando necessário
+        indice = IndiceRecomendacoes(
+            [livro_id for livro_id, _ in livros], [genero for _, genero in livros],
+            vinculos, compras, precos
+        )
+        with self._lock:
+            self.indice = indice
+            self.construido_em = time.monotonic()
+
+    def registrar_itens(self, itens):
+        """Enfileira itens vendidos (cliente_id, livro_id, preco_unitario) já confirmados"""
+        # Ids podem chegar como texto (valores de formulário atribuídos ao modelo)
+        itens = [(int(cliente_id), int(livro_id), preco) for cliente_id, livro_id, preco in itens]
+        with self._lock:
+            self.pendentes.extend(itens)
+
+    def _atualizar(self):
+        config = current_app.config
+        if self.indice is None or time.monotonic() - self.construido_em > config['RECOMENDACOES_TTL']:
+            self.reconstruir()
+
+        with self._lock:
+            itens, self.pendentes = self.pendentes, []
+            # Livro novo muda as dimensões das matrizes: reconstrói
+            if not all(self.indice.registrar_compra(*item) for item in itens):
+                self.construido_em = 0
+            self.indice.consolidar(config['RECOMENDACOES_DELTA_MAX'])
+        if not self.construido_em:
+            self.reconstruir()
+
+    def recomendar(self, cliente_id, k):
+        config = current_app.config
+        pesos = (
+            config['RECOMENDACOES_PESO_COMPRA_CONJUNTA'], config['RECOMENDACOES_PESO_AUTOR'],
+            config['RECOMENDACOES_PESO_GENERO'], config['RECOMENDACOES_PESO_POPULARIDADE']
+        )
+        self._atualizar()
+        with self._lock:
+            resultado = self.indice.recomendar(cliente_id, k, pesos)
+            precos = {livro_id: self.indice.preco_medio(livro_id) for livro_id, _, _ in resultado}
+        return resultado, precos
+
+
+motor_recomendacoes = MotorRecomendacoes()
+
+
+def recomendar_livros(cliente_id, k=10):
+    """Top-k livros recomendados ao cliente, com título, autores e motivo"""
+    k = max(1, min(k, current_app.config['RECOMENDACOES_K_MAX']))
+    resultado, precos = motor_recomendacoes.recomendar(cliente_id, k)
+    if not resultado:
+        return []
+
+    livros = {
+        livro.livro_id: livro
+        for livro in Livro.query.options(selectinload(Livro.autores))
+        .filter(Livro.livro_id.in_([livro_id for livro_id, _, _ in resultado]))
+    }
+    return [
+        {
+            'livro_id': livro_id,
+            'titulo': livros[livro_id].titulo,
+            'autores': [autor.nome for autor in livros[livro_id].autores],
+            'genero': livros[livro_id].genero,
+            'preco_medio': precos[livro_id],
+            'motivo': motivo,
+            'pontuacao': round(pontuacao, 4)
+        }
+        for livro_id, pontuacao, motivo in resultado
+        if livro_id in livros
+    ]
+
+
+def _registrar_itens_novos(session, contexto):
+    """Guarda na sessão os itens de venda inseridos, até o commit"""
+    # Apenas vendas já carregadas na sessão; não dispara consultas durante o flush
+    itens = [
+        (item.__dict__['venda'].cliente_id, item.livro_id, item.preco_unitario)
+        for item in session.new
+        if isinstance(item, VendaItem) and item.__dict__.get('venda') is not None
+    ]
+    if itens:
+        session.info.setdefault('recomendacoes_itens', []).extend(itens)
+
+
+def _confirmar_itens(session):
+    itens = session.info.pop('recomendacoes_itens', None)
+    if itens:
+        motor_recomendacoes.registrar_itens(itens)
+
+
+def _descartar_itens(session):
+    session.info.pop('recomendacoes_itens', None)
+
+
+def init_app(app):
+    """Registra a atualização incremental do índice após vendas confirmadas"""
+    for nome, funcao in (
+        ('after_flush', _registrar_itens_novos),
+        ('after_commit', _confirmar_itens),
+        ('after_rollback', _descartar_itens),
+    ):
+        if not event.contains(Session, nome, funcao):
+            event.listen(Session, nome, funcao)
@@ -0,0 +1,570 @@
+import time
+from calendar import monthrange
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import current_app, has_app_context
+from sqlalchemy import case, cast, delete, event, false, func, insert, literal, or_, select, update
+from sqlalchemy.orm import Session
+
+from arquivamento import historico_itens, historico_vendas
+from models import (
+    db, Livro, Venda, VendaItem, livro_autor, MetricaAutor, SegmentacaoCliente, EventoRollup,
+    VendaDiaria, VendaDiariaAutor, VendaMensal, VendaMensalAutor
+)
+
+# Manutenção em lote das tabelas derivadas de vendas: metricas_autores,
+# segmentacao_clientes e os agregados de /analises (vendas_diarias,
+# vendas_diarias_autores e os equivalentes mensais).
+#
+#   - cada venda inserida ou removida grava seus itens em rollup_eventos,
+#     na mesma transação (eventos de sessão do ORM e importacao_vendas);
+#   - o worker (`flask rollup-processar`) lê os eventos em lotes e aplica,
+#     em poucas instruções por lote, os deltas agregados por dia, por autor e
+#     por cliente; clientes com vendas removidas são recalculados a partir
+#     de vendas, porque a última compra não pode ser "descontada";
+#   - com ROLLUP_MODO = 'gatilhos', metricas_autores e segmentacao_clientes
+#     ficam com os triggers de base.sql (fn_atualizar_metricas_autor e
+#     fn_atualizar_segmentacao_cliente, que recalculam linha a linha) e o
+#     worker mantém só os agregados diários e mensais;
+#   - a reclassificação por tempo ('Inativo' após ROLLUP_INATIVO_MESES sem
+#     compras), que os triggers não fazem, roda a cada
+#     ROLLUP_RESSEGMENTAR_INTERVALO segundos;
+#   - `flask rollup-verificar` compara as tabelas com um recálculo completo.
+#
+# O lote é lido e aplicado em um único snapshot (REPEATABLE READ no
+# PostgreSQL, trava de escrita no SQLite), para que eventos e vendas estejam
+# sempre de acordo, e um advisory lock mantém um worker por vez.
+
+CHAVE_LOCK = 0x726f6c6c  # pg_advisory_xact_lock do worker
+
+eventos = EventoRollup.__table__
+metricas = MetricaAutor.__table__
+segmentacao = SegmentacaoCliente.__table__
+diarias = VendaDiaria.__table__
+diarias_autores = VendaDiariaAutor.__table__
+mensais = VendaMensal.__table__
+mensais_autores = VendaMensalAutor.__table__
+CENTAVOS = Decimal('0.01')
+
+
+def _decimal(valor):
+    # SUM de NUMERIC volta como float no SQLite
+    return Decimal(str(valor or 0)).quantize(CENTAVOS)
+
+
+def meses_atras(data, meses):
+    """Mesma data `meses` antes (como CURRENT_DATE - INTERVAL 'n months' do PostgreSQL)"""
+    ano, mes = divmod(data.year * 12 + data.month - 1 - meses, 12)
+    return date(ano, mes + 1, min(data.day, monthrange(ano, mes + 1)[1]))
+
+
+def expressao_segmento(valor_total, compras, ultima_compra, hoje=None):
+    """CASE com as regras de fn_atualizar_segmentacao_cliente"""
+    config = current_app.config
+    limite = meses_atras(hoje or date.today(), config['ROLLUP_INATIVO_MESES'])
+    return case(
+        (valor_total > config['ROLLUP_VIP_VALOR'], 'VIP'),
+        (ultima_compra < limite, 'Inativo'),
+        (compras == 1, 'Novo'),
+        else_='Regular'
+    )
+
+
+def _insert_dialeto():
+    dialeto = db.session.get_bind().dialect.name
+    if dialeto == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as insert_dialeto
+    elif dialeto == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as insert_dialeto
+    else:
+        raise RuntimeError(f'Rollup não suportado para {dialeto}')
+    return insert_dialeto
+
+
+def _iniciar_snapshot():
+    """Isola a transação do lote; False se outro worker já estiver processando"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+        return bool(db.session.scalar(select(func.pg_try_advisory_xact_lock(CHAVE_LOCK))))
+    # SQLite: uma escrita vazia obtém a trava de escrita antes das leituras
+    db.session.execute(delete(eventos).where(false()))
+    return True
+
+
+# ----- Outbox -----
+
+def registrar_vendas(venda_ids, sinal=1, conexao=None):
+    """Grava no outbox os itens das vendas informadas, na transação atual"""
+    venda_ids = list(venda_ids)
+    if not venda_ids or not has_app_context():
+        return
+    origem = (
+        select(
+            Venda.venda_id, Venda.cliente_id, Venda.data_venda, Venda.valor_total, VendaItem.livro_id,
+            func.coalesce(VendaItem.quantidade, 0), func.coalesce(VendaItem.preco_unitario, 0), literal(sinal)
+        )
+        .select_from(Venda)
+        .outerjoin(VendaItem, VendaItem.venda_id == Venda.venda_id)
+        .where(Venda.venda_id.in_(venda_ids))
+    )
+    colunas = ['venda_id', 'cliente_id', 'data_venda', 'valor_total', 'livro_id', 'quantidade', 'preco_unitario', 'sinal']
+    (conexao or db.session).execute(insert(eventos).from_select(colunas, origem))
+
+
+def _registrar_remocoes(session, contexto, instancias):
+    # Antes do flush: os itens ainda estão no banco
+    venda_ids = [venda.venda_id for venda in session.deleted if isinstance(venda, Venda)]
+    if venda_ids:
+        registrar_vendas(venda_ids, -1, session.connection())
+
+
+def _registrar_insercoes(session, contexto):
+    venda_ids = [venda.venda_id for venda in session.new if isinstance(venda, Venda)]
+    if venda_ids:
+        registrar_vendas(venda_ids, 1, session.connection())
+
+
+# ----- Worker -----
+
+def _somar_deltas(tabela, insert_dialeto, chaves, linhas):
+    """Upsert somando os deltas às colunas numéricas já existentes"""
+    instrucao = insert_dialeto(tabela)
+    somas = [coluna for coluna in linhas[0] if coluna not in chaves and coluna != 'genero']
+    instrucao = instrucao.on_conflict_do_update(
+        index_elements=[tabela.c[chave] for chave in chaves],
+        set_={coluna: tabela.c[coluna] + instrucao.excluded[coluna] for coluna in somas}
+    )
+    db.session.execute(instrucao, linhas)
+
+
+def _por_mes(linhas, chaves, somas):
+    """Soma as linhas diárias por mês (primeiro dia) e pelas demais chaves"""
+    meses = {}
+    for linha in linhas:
+        chave = (linha['data'].replace(day=1),) + tuple(linha[nome] or '' for nome in chaves)
+        total = meses.setdefault(chave, dict(zip(('mes',) + chaves, chave), **{nome: 0 for nome in somas}))
+        for nome in somas:
+            total[nome] += linha[nome]
+    return list(meses.values())
+
+
+def _aplicar_diarias(lote, insert_dialeto):
+    quantidade = func.sum(eventos.c.sinal * eventos.c.quantidade)
+    receita = func.sum(eventos.c.sinal * eventos.c.quantidade * eventos.c.preco_unitario)
+    por_livro = [
+        {'data': data, 'livro_id': livro_id, 'genero': genero, 'itens': int(itens),
+         'quantidade': int(soma), 'receita': _decimal(valor)}
+        for data, livro_id, genero, itens, soma, valor in db.session.execute(
+            select(eventos.c.data_venda, eventos.c.livro_id, Livro.genero, func.sum(eventos.c.sinal), quantidade, receita)
+            .join(Livro, Livro.livro_id == eventos.c.livro_id)
+            .where(lote)
+            .group_by(eventos.c.data_venda, eventos.c.livro_id, Livro.genero)
+        )
+    ]
+    if not por_livro:
+        return
+    _somar_deltas(diarias, insert_dialeto, ('data', 'livro_id'), por_livro)
+    _somar_deltas(mensais, insert_dialeto, ('mes', 'genero'),
+                  _por_mes(por_livro, ('genero',), ('itens', 'quantidade', 'receita')))
+
+    genero = func.coalesce(Livro.genero, '')
+    por_autor = [
+        {'data': data, 'autor_id': autor_id, 'genero': nome_genero,
+         'quantidade': int(soma), 'receita': _decimal(valor)}
+        for data, autor_id, nome_genero, soma, valor in db.session.execute(
+            select(eventos.c.data_venda, livro_autor.c.autor_id, genero, quantidade, receita)
+            .join(Livro, Livro.livro_id == eventos.c.livro_id)
+            .join(livro_autor, livro_autor.c.livro_id == eventos.c.livro_id)
+            .where(lote)
+            .group_by(eventos.c.data_venda, livro_autor.c.autor_id, genero)
+        )
+    ]
+    if por_autor:
+        _somar_deltas(diarias_autores, insert_dialeto, ('data', 'autor_id', 'genero'), por_autor)
+        _somar_deltas(mensais_autores, insert_dialeto, ('mes', 'autor_id', 'genero'),
+                      _por_mes(por_autor, ('autor_id', 'genero'), ('quantidade', 'receita')))
+
+
+def _aplicar_autores(lote, insert_dialeto, agora):
+    deltas = db.session.execute(
+        select(
+            livro_autor.c.autor_id,
+            func.sum(eventos.c.sinal * eventos.c.quantidade),
+            func.sum(eventos.c.sinal * eventos.c.quantidade * eventos.c.preco_unitario)
+        )
+        .join(livro_autor, livro_autor.c.livro_id == eventos.c.livro_id)
+        .where(lote)
+        .group_by(livro_autor.c.autor_id)
+    ).all()
+    if not deltas:
+        return
+    publicados = dict(db.session.execute(
+        select(livro_autor.c.autor_id, func.count())
+        .where(livro_autor.c.autor_id.in_([autor_id for autor_id, _, _ in deltas]))
+        .group_by(livro_autor.c.autor_id)
+    ).all())
+
+    instrucao = insert_dialeto(metricas)
+    instrucao = instrucao.on_conflict_do_update(
+        index_elements=[metricas.c.autor_id],
+        set_={
+            'total_vendas': metricas.c.total_vendas + instrucao.excluded.total_vendas,
+            'receita_total': metricas.c.receita_total + instrucao.excluded.receita_total,
+            'livros_publicados': instrucao.excluded.livros_publicados,
+            'data_atualizacao': instrucao.excluded.data_atualizacao
+        }
+    )
+    db.session.execute(instrucao, [
+        {
+            'autor_id': autor_id,
+            'total_vendas': int(quantidade or 0),
+            'receita_total': _decimal(receita),
+            'livros_publicados': publicados.get(autor_id, 0),
+            'data_atualizacao': agora
+        }
+        for autor_id, quantidade, receita in deltas
+    ])
+
+
+def _aplicar_clientes(lote, recalcular, insert_dialeto, agora):
+    """Soma os deltas dos clientes e recalcula os que tiveram remoções; retorna os clientes alterados"""
+    condicao = lote if not recalcular else lote & eventos.c.cliente_id.not_in(recalcular)
+    vendas_lote = (
+        select(eventos.c.venda_id, eventos.c.cliente_id, eventos.c.data_venda, eventos.c.valor_total)
+        .distinct().where(condicao).subquery()
+    )
+    deltas = db.session.execute(
+        select(
+            vendas_lote.c.cliente_id, func.count(),
+            func.sum(vendas_lote.c.valor_total), func.max(vendas_lote.c.data_venda)
+        ).group_by(vendas_lote.c.cliente_id)
+    ).all()
+
+    if deltas:
+        instrucao = insert_dialeto(segmentacao)
+        ultima = segmentacao.c.ultima_compra
+        instrucao = instrucao.on_conflict_do_update(
+            index_elements=[segmentacao.c.cliente_id],
+            set_={
+                'total_compras': segmentacao.c.total_compras + instrucao.excluded.total_compras,
+                'valor_total_gasto': segmentacao.c.valor_total_gasto + instrucao.excluded.valor_total_gasto,
+                'ultima_compra': case(
+                    (or_(ultima.is_(None), instrucao.excluded.ultima_compra > ultima), instrucao.excluded.ultima_compra),
+                    else_=ultima
+                ),
+                'data_atualizacao': instrucao.excluded.data_atualizacao
+            }
+        )
+        db.session.execute(instrucao, [
+            {
+                'cliente_id': cliente_id,
+                'total_compras': compras,
+                'valor_total_gasto': _decimal(valor),
+                'ultima_compra': ultima_compra,
+                'data_atualizacao': agora
+            }
+            for cliente_id, compras, valor, ultima_compra in deltas
+        ])
+
+    if recalcular:
+        db.session.execute(delete(segmentacao).where(segmentacao.c.cliente_id.in_(recalcular)))
+        vendas = historico_vendas()
+        db.session.execute(insert(segmentacao).from_select(
+            ['cliente_id', 'total_compras', 'valor_total_gasto', 'ultima_compra', 'data_atualizacao'],
+            select(
+                vendas.c.cliente_id, func.count(), func.sum(vendas.c.valor_total), func.max(vendas.c.data_venda),
+                literal(agora, db.DateTime)
+            )
+            .where(vendas.c.cliente_id.in_(recalcular))
+            .group_by(vendas.c.cliente_id)
+        ))
+    return {cliente_id for cliente_id, _, _, _ in deltas} | recalcular
+
+
+def processar_lote(tamanho, hoje=None):
+    """Agrega os eventos mais antigos (ao menos `tamanho`, em vendas inteiras) em uma transação.
+
+    Retorna quantos eventos foram consumidos; 0 se não houver eventos ou se
+    outro worker estiver processando.
+    """
+    insert_dialeto = _insert_dialeto()
+    if not _iniciar_snapshot():
+        db.session.rollback()
+        return 0
+
+    venda_ids = db.session.scalars(
+        select(eventos.c.venda_id).order_by(eventos.c.evento_id).limit(tamanho)
+    ).all()
+    if not venda_ids:
+        db.session.rollback()
+        return 0
+
+    # Uma venda nunca fica dividida entre lotes; clientes com remoções levam todos os seus eventos
+    pendentes = db.session.execute(
+        select(eventos.c.evento_id, eventos.c.cliente_id, eventos.c.sinal)
+        .where(eventos.c.venda_id.in_(set(venda_ids)))
+    ).all()
+    ids = {evento_id for evento_id, _, _ in pendentes}
+    recalcular = {cliente_id for _, cliente_id, sinal in pendentes if sinal < 0}
+    if recalcular:
+        ids.update(db.session.scalars(select(eventos.c.evento_id).where(eventos.c.cliente_id.in_(recalcular))))
+    lote = eventos.c.evento_id.in_(ids)
+
+    _aplicar_diarias(lote, insert_dialeto)
+    clientes = None
+    if current_app.config['ROLLUP_MODO'] == 'outbox':
+        agora = datetime.utcnow()
+        _aplicar_autores(lote, insert_dialeto, agora)
+        clientes = _aplicar_clientes(lote, recalcular, insert_dialeto, agora)
+    if clientes:
+        db.session.execute(
+            update(segmentacao)
+            .where(segmentacao.c.cliente_id.in_(clientes))
+            .values(segmento=expressao_segmento(
+                segmentacao.c.valor_total_gasto, segmentacao.c.total_compras, segmentacao.c.ultima_compra, hoje
+            ))
+        )
+    db.session.execute(delete(eventos).where(lote))
+    db.session.commit()
+    return len(ids)
+
+
+def ressegmentar(hoje=None):
+    """Reclassifica os clientes pela data atual (ex.: 'Inativo'); retorna quantos mudaram"""
+    novo = expressao_segmento(
+        segmentacao.c.valor_total_gasto, segmentacao.c.total_compras, segmentacao.c.ultima_compra, hoje
+    )
+    resultado = db.session.execute(
+        update(segmentacao)
+        .where(or_(segmentacao.c.segmento.is_(None), segmentacao.c.segmento != novo))
+        .values(segmento=novo, data_atualizacao=datetime.utcnow())
+    )
+    db.session.commit()
+    return resultado.rowcount
+
+
+def executar_worker(tamanho, continuo=False, informar=print):
+    """Consome o outbox em lotes; com `continuo`, aguarda novos eventos indefinidamente"""
+    config = current_app.config
+    ressegmentado_em = float('-inf')
+    while True:
+        inicio = time.perf_counter()
+        total = 0
+        while consumidos := processar_lote(tamanho):
+            total += consumidos
+        if total:
+            duracao = time.perf_counter() - inicio
+            informar(f'{total} eventos agregados em {duracao:.2f} s ({total / duracao:.0f} eventos/s)')
+
+        if not continuo or time.monotonic() - ressegmentado_em >= config['ROLLUP_RESSEGMENTAR_INTERVALO']:
+            alterados = ressegmentar()
+            ressegmentado_em = time.monotonic()
+            if alterados:
+                informar(f'{alterados} clientes reclassificados')
+        if not continuo:
+            return
+        time.sleep(config['ROLLUP_INTERVALO'])
+
+
+# ----- Recálculo completo e verificação -----
+
+def _esperado_autores():
+    itens = historico_itens()
+    return {
+        autor_id: (int(quantidade or 0), _decimal(receita))
+        for autor_id, quantidade, receita in db.session.execute(
+            select(
+                livro_autor.c.autor_id, func.sum(itens.c.quantidade),
+                func.sum(itens.c.quantidade * itens.c.preco_unitario)
+            )
+            .join(itens, itens.c.livro_id == livro_autor.c.livro_id)
+            .group_by(livro_autor.c.autor_id)
+        )
+    }
+
+
+def _consulta_clientes(hoje):
+    vendas = historico_vendas()
+    compras = func.count()
+    valor = func.sum(vendas.c.valor_total)
+    ultima = func.max(vendas.c.data_venda)
+    return select(
+        vendas.c.cliente_id, compras, valor, ultima, expressao_segmento(valor, compras, ultima, hoje)
+    ).group_by(vendas.c.cliente_id)
+
+
+def _consultas_diarias():
+    """Agregados diários por livro e por autor calculados direto das vendas (incluindo o arquivo)"""
+    vendas, itens = historico_vendas(), historico_itens()
+    quantidade = func.sum(itens.c.quantidade)
+    receita = func.sum(itens.c.quantidade * itens.c.preco_unitario)
+    por_livro = (
+        select(vendas.c.data_venda, itens.c.livro_id, Livro.genero, func.count(), quantidade, receita)
+        .select_from(vendas)
+        .join(itens, itens.c.venda_id == vendas.c.venda_id)
+        .join(Livro, Livro.livro_id == itens.c.livro_id)
+        .group_by(vendas.c.data_venda, itens.c.livro_id, Livro.genero)
+    )
+    genero = func.coalesce(Livro.genero, '')
+    por_autor = (
+        select(vendas.c.data_venda, livro_autor.c.autor_id, genero, quantidade, receita)
+        .select_from(vendas)
+        .join(itens, itens.c.venda_id == vendas.c.venda_id)
+        .join(Livro, Livro.livro_id == itens.c.livro_id)
+        .join(livro_autor, livro_autor.c.livro_id == itens.c.livro_id)
+        .group_by(vendas.c.data_venda, livro_autor.c.autor_id, genero)
+    )
+    return por_livro, por_autor
+
+
+def _inicio_mes(coluna):
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return cast(func.date_trunc('month', coluna), db.Date)
+    return func.date(coluna, 'start of month')
+
+
+def reconstruir(hoje=None):
+    """Recalcula todas as tabelas derivadas do zero e descarta os eventos pendentes (já incluídos)"""
+    if not _iniciar_snapshot():
+        db.session.rollback()
+        raise RuntimeError('Outro worker de rollup está em execução')
+    agora = datetime.utcnow()
+    db.session.execute(delete(eventos))
+    db.session.execute(delete(metricas))
+    db.session.execute(delete(segmentacao))
+    db.session.execute(delete(diarias))
+    db.session.execute(delete(diarias_autores))
+
+    db.session.execute(delete(mensais))
+    db.session.execute(delete(mensais_autores))
+
+    por_livro, por_autor = _consultas_diarias()
+    db.session.execute(insert(diarias).from_select(
+        ['data', 'livro_id', 'genero', 'itens', 'quantidade', 'receita'], por_livro
+    ))
+    db.session.execute(insert(diarias_autores).from_select(
+        ['data', 'autor_id', 'genero', 'quantidade', 'receita'], por_autor
+    ))
+    mes = _inicio_mes(diarias.c.data)
+    genero = func.coalesce(diarias.c.genero, '')
+    db.session.execute(insert(mensais).from_select(
+        ['mes', 'genero', 'itens', 'quantidade', 'receita'],
+        select(mes, genero, func.sum(diarias.c.itens), func.sum(diarias.c.quantidade), func.sum(diarias.c.receita))
+        .group_by(mes, genero)
+    ))
+    mes = _inicio_mes(diarias_autores.c.data)
+    db.session.execute(insert(mensais_autores).from_select(
+        ['mes', 'autor_id', 'genero', 'quantidade', 'receita'],
+        select(
+            mes, diarias_autores.c.autor_id, diarias_autores.c.genero,
+            func.sum(diarias_autores.c.quantidade), func.sum(diarias_autores.c.receita)
+        ).group_by(mes, diarias_autores.c.autor_id, diarias_autores.c.genero)
+    ))
+
+    outro = livro_autor.alias()
+    publicados = select(func.count()).select_from(outro).where(outro.c.autor_id == livro_autor.c.autor_id)
+    itens = historico_itens()
+    db.session.execute(insert(metricas).from_select(
+        ['autor_id', 'total_vendas', 'receita_total', 'livros_publicados', 'data_atualizacao'],
+        select(
+            livro_autor.c.autor_id, func.sum(itens.c.quantidade),
+            func.sum(itens.c.quantidade * itens.c.preco_unitario),
+            publicados.scalar_subquery(), literal(agora, db.DateTime)
+        )
+        .join(itens, itens.c.livro_id == livro_autor.c.livro_id)
+        .group_by(livro_autor.c.autor_id)
+    ))
+    clientes = _consulta_clientes(hoje).add_columns(literal(agora, db.DateTime))
+    db.session.execute(insert(segmentacao).from_select(
+        ['cliente_id', 'total_compras', 'valor_total_gasto', 'ultima_compra', 'segmento', 'data_atualizacao'],
+        clientes
+    ))
+    db.session.commit()
+
+
+def verificar(hoje=None, exemplos=10):
+    """Compara as tabelas com o recálculo a partir de vendas; retorna o relatório de divergências"""
+    pendentes = db.session.scalar(select(func.count()).select_from(eventos))
+
+    esperado = _esperado_autores()
+    atual = {
+        autor_id: (int(total or 0), _decimal(receita))
+        for autor_id, total, receita in db.session.execute(
+            select(metricas.c.autor_id, metricas.c.total_vendas, metricas.c.receita_total)
+        )
+    }
+    autores = _comparar(esperado, atual, (0, _decimal(0)), exemplos)
+
+    esperado = {
+        cliente_id: (compras, _decimal(valor), ultima, segmento)
+        for cliente_id, compras, valor, ultima, segmento in db.session.execute(_consulta_clientes(hoje))
+    }
+    atual = {
+        cliente_id: (compras, _decimal(valor), ultima, segmento)
+        for cliente_id, compras, valor, ultima, segmento in db.session.execute(select(
+            segmentacao.c.cliente_id, segmentacao.c.total_compras, segmentacao.c.valor_total_gasto,
+            segmentacao.c.ultima_compra, segmentacao.c.segmento
+        ))
+    }
+    clientes = _comparar(esperado, atual, None, exemplos)
+
+    relatorio = {'eventos_pendentes': pendentes, 'autores': autores, 'clientes': clientes}
+    por_livro, por_autor = _consultas_diarias()
+    linhas_livros = [
+        {'data': data, 'livro_id': livro_id, 'genero': genero, 'itens': itens,
+         'quantidade': int(quantidade), 'receita': _decimal(receita)}
+        for data, livro_id, genero, itens, quantidade, receita in db.session.execute(por_livro)
+    ]
+    linhas_autores = [
+        {'data': data, 'autor_id': autor_id, 'genero': genero, 'quantidade': int(quantidade), 'receita': _decimal(receita)}
+        for data, autor_id, genero, quantidade, receita in db.session.execute(por_autor)
+    ]
+    somas_livros = ('itens', 'quantidade', 'receita')
+    somas_autores = ('quantidade', 'receita')
+    for tabela, chaves, somas, linhas in (
+        (diarias, ('data', 'livro_id'), somas_livros, linhas_livros),
+        (diarias_autores, ('data', 'autor_id', 'genero'), somas_autores, linhas_autores),
+        (mensais, ('mes', 'genero'), somas_livros, _por_mes(linhas_livros, ('genero',), somas_livros)),
+        (mensais_autores, ('mes', 'autor_id', 'genero'), somas_autores, _por_mes(linhas_autores, ('autor_id', 'genero'), somas_autores)),
+    ):
+        def valores(linha):
+            return tuple(_decimal(linha[nome]) if nome == 'receita' else int(linha[nome]) for nome in somas)
+
+        esperado = {tuple(str(linha[nome]) for nome in chaves): valores(linha) for linha in linhas}
+        atual = {
+            tuple(str(linha[nome]) for nome in chaves): valores(linha)
+            for linha in db.session.execute(select(*[tabela.c[nome] for nome in chaves + somas])).mappings()
+        }
+        vazio = tuple(_decimal(0) if nome == 'receita' else 0 for nome in somas)
+        relatorio[tabela.name] = _comparar(esperado, atual, vazio, exemplos)
+    return relatorio
+
+
+def _comparar(esperado, atual, vazio, exemplos):
+    divergentes = [
+        chave for chave in sorted(esperado.keys() | atual.keys())
+        if esperado.get(chave, vazio) != atual.get(chave, vazio)
+    ]
+    return {
+        'verificados': len(esperado.keys() | atual.keys()),
+        'divergentes': len(divergentes),
+        'exemplos': [
+            {'id': chave, 'esperado': _texto(esperado.get(chave, vazio)), 'atual': _texto(atual.get(chave, vazio))}
+            for chave in divergentes[:exemplos]
+        ]
+    }
+
+
+def _texto(valores):
+    return None if valores is None else [str(valor) if valor is not None else None for valor in valores]
+
+
+def init_app(app):
+    """Registra a gravação do outbox junto com as vendas inseridas e removidas pelo ORM"""
+    for nome, funcao in (
+        ('before_flush', _registrar_remocoes),
+        ('after_flush', _registrar_insercoes),
+    ):
+        if not event.contains(Session, nome, funcao):
+            event.listen(Session, nome, funcao)
@@ -0,0 +1,165 @@
+import threading
+import time
+
+import sqlalchemy as sa
+from flask import current_app, g, has_request_context, request, session as sessao_flask
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+# Roteamento de leitura/escrita entre o banco principal e uma réplica.
+#
+# Views marcadas com @somente_leitura consultam o bind 'leitura'
+# (SQLALCHEMY_BINDS, via DATABASE_URL_LEITURA); o restante, os flushes e as
+# instruções INSERT/UPDATE/DELETE vão para o principal. Depois que um
+# cliente grava algo, as leituras dele voltam ao principal por
+# ROTEAMENTO_JANELA_ESCRITA segundos, para que veja a própria escrita mesmo
+# com atraso de replicação. Sem o bind 'leitura', tudo vai ao principal.
+
+BIND_LEITURA = 'leitura'
+CHAVE_SESSAO = '_primario_ate'
+
+
+def somente_leitura(view):
+    """Marca a view como elegível para a réplica de leitura"""
+    view.somente_leitura = True
+    return view
+
+
+class SessaoRoteada(Session):
+    """Sessão do Flask-SQLAlchemy que escolhe a engine pela requisição atual"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and not self.info.get('escreveu')
+            and has_request_context()
+            and g.get('usar_leitura')
+            and not getattr(clause, 'is_dml', False)
+        ):
+            engine = self._db.engines.get(BIND_LEITURA)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+class PoolMedido(QueuePool):
+    """QueuePool que registra quanto tempo as requisições esperam por uma conexão"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock_metricas = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        tempo_esgotado = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            tempo_esgotado = True
+            raise
+        finally:
+            espera = time.perf_counter() - inicio
+            with self._lock_metricas:
+                self.checkouts += 1
+                self.timeouts += tempo_esgotado
+                self.espera_total += espera
+                self.espera_max = max(self.espera_max, espera)
+
+    def metricas(self):
+        with self._lock_metricas:
+            return {
+                'tamanho': self.size(),
+                'em_uso': self.checkedout(),
+                'excedentes': self.overflow(),
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'espera_total_ms': round(self.espera_total * 1000, 3),
+                'espera_media_ms': round(self.espera_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                'espera_max_ms': round(self.espera_max * 1000, 3),
+            }
+
+
+def configurar_engines(app):
+    """Aplica as opções de pool ao principal e aos binds (antes de db.init_app).
+
+    O Flask-SQLAlchemy só usa SQLALCHEMY_ENGINE_OPTIONS no principal; binds
+    informados como URL são convertidos em dicionários com as mesmas opções.
+    """
+    config = app.config
+    pool = {'pool_pre_ping': config['BANCO_POOL_PRE_PING']}
+    urls = [config['SQLALCHEMY_DATABASE_URI']]
+    urls += [bind if isinstance(bind, str) else bind.get('url') for bind in config['SQLALCHEMY_BINDS'].values()]
+    # SQLite em memória usa StaticPool (imposto pelo Flask-SQLAlchemy), sem opções de fila
+    if not any(url and sa.make_url(url).database in (None, '', ':memory:') for url in urls):
+        pool.update(
+            poolclass=PoolMedido,
+            pool_size=config['BANCO_POOL_TAMANHO'],
+            max_overflow=config['BANCO_POOL_EXCEDENTE'],
+            pool_timeout=config['BANCO_POOL_ESPERA'],
+            pool_recycle=config['BANCO_POOL_RECICLAR'],
+        )
+
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = {**pool, **config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+    config['SQLALCHEMY_BINDS'] = {
+        chave: {**pool, 'url': bind} if isinstance(bind, str) else {**pool, **bind}
+        for chave, bind in config['SQLALCHEMY_BINDS'].items()
+    }
+
+
+def metricas_pool():
+    """Métricas de pool de cada engine: {'principal': {...}, 'leitura': {...}}"""
+    db = current_app.extensions['sqlalchemy']
+    metricas = {}
+    for chave, engine in db.engines.items():
+        pool = engine.pool
+        nome = chave or 'principal'
+        metricas[nome] = pool.metricas() if isinstance(pool, PoolMedido) else {'status': pool.status()}
+    return metricas
+
+
+def _escolher_bind():
+    view = current_app.view_functions.get(request.endpoint)
+    if not getattr(view, 'somente_leitura', False):
+        return
+    # Leitura após escrita recente do mesmo cliente: mantém no principal
+    if sessao_flask.get(CHAVE_SESSAO, 0) > time.time():
+        return
+    g.usar_leitura = True
+
+
+def _marcar_escrita_orm(session, contexto, instancias):
+    if session.new or session.dirty or session.deleted:
+        session.info['escreveu'] = True
+
+
+def _marcar_escrita_core(estado):
+    if estado.is_insert or estado.is_update or estado.is_delete:
+        estado.session.info['escreveu'] = True
+
+
+def _registrar_commit(session):
+    if session.info.pop('escreveu', False) and has_request_context():
+        sessao_flask[CHAVE_SESSAO] = time.time() + current_app.config['ROTEAMENTO_JANELA_ESCRITA']
+
+
+def _limpar_rollback(session):
+    session.info.pop('escreveu', None)
+
+
+def init_app(app):
+    """Registra a escolha de bind por requisição e o rastreio de escritas"""
+    app.before_request(_escolher_bind)
+    for nome, funcao in (
+        ('before_flush', _marcar_escrita_orm),
+        ('do_orm_execute', _marcar_escrita_core),
+        ('after_commit', _registrar_commit),
+        ('after_rollback', _limpar_rollback),
+    ):
+        if not event.contains(Session, nome, funcao):
+            event.listen(Session, nome, funcao)
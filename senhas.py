@@ -0,0 +1,82 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Geração e verificação de hashes de senha em um pool limitado de threads.
+#
+# O scrypt/PBKDF2 do hashlib libera o GIL, então o cálculo roda em paralelo
+# com as demais requisições; o limite de SENHAS_WORKERS impede que uma
+# rajada de logins ocupe todos os núcleos. Requisições que não conseguem
+# vaga em SENHAS_ESPERA segundos recebem SenhasOcupadas.
+
+METODO_PADRAO = 'scrypt:32768:8:1'  # Padrão do Werkzeug, na forma completa gravada no hash
+
+
+class SenhasOcupadas(RuntimeError):
+    """Pool de senhas sem vaga dentro do tempo de espera"""
+
+
+class PoolSenhas:
+    """Executor com no máximo `workers` hashes simultâneos e `fila_max` em espera"""
+
+    def __init__(self, workers, fila_max):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='senhas')
+        self._vagas = threading.BoundedSemaphore(workers + fila_max)
+
+    def executar(self, funcao, *args, espera=None):
+        if not self._vagas.acquire(timeout=espera):
+            raise SenhasOcupadas('Muitas verificações de senha em andamento')
+        try:
+            futuro = self._executor.submit(funcao, *args)
+        except BaseException:
+            self._vagas.release()
+            raise
+        futuro.add_done_callback(lambda _: self._vagas.release())
+        return futuro.result()
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _obter_pool(config):
+    """Pool do processo atual, criado sob demanda (também após o fork dos workers)"""
+    global _pool, _pool_pid
+    if _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool_pid != os.getpid():
+                _pool = PoolSenhas(config['SENHAS_WORKERS'], config['SENHAS_FILA_MAX'])
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def _executar(funcao, *args):
+    # Fora de uma aplicação (scripts) ou com SENHAS_WORKERS = 0, calcula na própria thread
+    if not has_app_context() or not current_app.config['SENHAS_WORKERS']:
+        return funcao(*args)
+    config = current_app.config
+    return _obter_pool(config).executar(funcao, *args, espera=config['SENHAS_ESPERA'])
+
+
+def _metodo():
+    return current_app.config['SENHA_METODO'] if has_app_context() else METODO_PADRAO
+
+
+def gerar_hash(senha):
+    """Hash da senha com o método configurado em SENHA_METODO"""
+    salt = current_app.config['SENHA_SALT_TAMANHO'] if has_app_context() else 16
+    return _executar(generate_password_hash, senha, _metodo(), salt)
+
+
+def verificar_senha(password_hash, senha):
+    return _executar(check_password_hash, password_hash, senha)
+
+
+def precisa_rehash(password_hash):
+    """True se o hash foi gerado com parâmetros diferentes de SENHA_METODO"""
+    return password_hash.split('$', 1)[0] != _metodo()
@@ -0,0 +1,83 @@
+from flask import current_app
+
+from models import db, Autor, Livro, Cliente
+
+# Sugestões para os campos de autocompletar dos formulários.
+#
+# A busca por prefixo usa lower(coluna) LIKE 'termo%', atendida pelos
+# índices funcionais declarados em models.py (varchar_pattern_ops no
+# PostgreSQL). Se o prefixo não preencher o limite, completa com busca por
+# trecho (LIKE '%termo%'), que no PostgreSQL usa os índices trigram de base.sql.
+
+
+def _escapar_like(termo):
+    return termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _limite(limite):
+    maximo = current_app.config['SUGESTOES_LIMITE_MAX']
+    return max(1, min(limite or 10, maximo))
+
+
+def _buscar(coluna_id, coluna_texto, termo, limite, colunas_extra=(), excluir=()):
+    termo = (termo or '').strip().lower()
+    if not termo:
+        return []
+
+    padrao = _escapar_like(termo)
+    campo = db.func.lower(coluna_texto)
+    consulta = db.select(coluna_id, coluna_texto, *colunas_extra).order_by(campo).limit(limite)
+
+    prefixo = consulta.where(campo.like(padrao + '%', escape='\\'))
+    if excluir:
+        prefixo = prefixo.where(coluna_id.not_in(excluir))
+    linhas = db.session.execute(prefixo).all()
+
+    if len(linhas) < limite and len(termo) >= current_app.config['SUGESTOES_MIN_TRECHO']:
+        vistos = [linha[0] for linha in linhas] + list(excluir)
+        trecho = consulta.where(campo.like('%' + padrao + '%', escape='\\'))
+        if vistos:
+            trecho = trecho.where(coluna_id.not_in(vistos))
+        linhas += db.session.execute(trecho.limit(limite - len(linhas))).all()
+    return linhas
+
+
+def sugerir_autores(termo, limite=None):
+    limite = _limite(limite)
+    return [
+        {'id': autor_id, 'texto': nome}
+        for autor_id, nome in _buscar(Autor.autor_id, Autor.nome, termo, limite)
+    ]
+
+
+def sugerir_clientes(termo, limite=None):
+    limite = _limite(limite)
+    return [
+        {'id': cliente_id, 'texto': f'{nome} <{email}>'}
+        for cliente_id, nome, email in _buscar(
+            Cliente.cliente_id, Cliente.nome, termo, limite, colunas_extra=(Cliente.email,)
+        )
+    ]
+
+
+def sugerir_livros(termo, limite=None):
+    """Livros por título; um termo numérico também é procurado como ISBN exato"""
+    limite = _limite(limite)
+    termo = (termo or '').strip()
+    resultados = []
+    if termo.isdigit():
+        livro = db.session.execute(
+            db.select(Livro.livro_id, Livro.titulo, Livro.isbn).where(Livro.isbn == termo)
+        ).first()
+        if livro:
+            resultados.append(livro)
+
+    if len(resultados) < limite:
+        resultados += _buscar(
+            Livro.livro_id, Livro.titulo, termo, limite - len(resultados),
+            colunas_extra=(Livro.isbn,), excluir=[livro[0] for livro in resultados]
+        )
+    return [
+        {'id': livro_id, 'texto': f'{titulo} ({isbn})'}
+        for livro_id, titulo, isbn in resultados
+    ]
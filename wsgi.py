@@ -0,0 +1,8 @@
+"""Ponto de entrada dos servidores WSGI (ex.: gunicorn wsgi:app).
+
+Cada worker só importa os módulos e cria a aplicação; o banco é preparado
+antes do deploy com `flask criar-tabelas` e `flask criar-usuarios-iniciais`.
+"""
+from app import create_app
+
+app = create_app()